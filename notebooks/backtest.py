@@ -0,0 +1,283 @@
+# import libraries
+import hashlib
+import json
+import os
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from nyc311.model_registry import window_hash
+from nyc311.parallel_helpers import get_n_jobs, pool_map, time_limit
+
+
+# models every series is scored with unless told otherwise
+DEFAULT_MODELS = {'naive': {'kind': 'naive'},
+                  'seasonal_naive': {'kind': 'seasonal_naive', 'm': 7},
+                  'sarima': {'kind': 'sarima', 'order': (1, 1, 1), 's_order': (0, 1, 1, 7),
+                             'trend': 'n', 'refit_every': 1}}
+
+
+############################
+# ROLLING ORIGIN FUNCTIONS #
+############################
+
+def rolling_origins(n_obs, horizon, initial=None, step=None, window=None, max_folds=None):
+    """takes the length of a series and the forecast 'horizon' and returns a list of
+       (train_start, origin, test_end) positions. Training starts with 'initial' observations
+       (default = half the series, rounded up to a multiple of 'step' so the origins stay on the
+       same dates as the series grows) and the origin moves forward 'step' observations
+       (default = horizon) per fold. With 'window' the training set slides (only the last
+       'window' observations before the origin), otherwise it expands. 'max_folds' keeps the
+       latest folds."""
+    step = horizon if step is None else step
+    initial = -(-(n_obs // 2) // step) * step if initial is None else initial
+
+    folds = []
+    for origin in range(initial, n_obs - horizon + 1, step):
+        train_start = 0 if window is None else max(0, origin - window)
+        folds.append((train_start, origin, origin + horizon))
+    return folds[-max_folds:] if max_folds else folds
+
+
+def forecast_errors(actual, predicted):
+    """returns the RMSE, MAE and MAPE (in %, over non-zero actual values) of a forecast"""
+    actual = np.asarray(actual, dtype='float64')
+    error = np.asarray(predicted, dtype='float64') - actual
+    nonzero = actual != 0
+    return {'rmse': float(np.sqrt(np.mean(error ** 2))),
+            'mae': float(np.mean(np.abs(error))),
+            'mape': float(np.mean(np.abs(error[nonzero] / actual[nonzero])) * 100) if nonzero.any() else np.nan}
+
+
+#############################
+# BACKTEST WORKER FUNCTIONS #
+#############################
+
+def _baseline_forecast(train, horizon, spec):
+    """forecasts of the baseline models"""
+    if spec['kind'] == 'naive':
+        return np.repeat(train[-1], horizon)
+    if spec['kind'] == 'seasonal_naive':
+        m = spec.get('m', 7)
+        return np.resize(train[-m:], horizon)
+    if spec['kind'] == 'mean':
+        return np.repeat(train.mean(), horizon)
+    raise ValueError(f"unknown model kind {spec['kind']!r}")
+
+
+def _backtest_series(task):
+    """worker function: runs every fold of one series for every model and returns a list of rows.
+       SARIMA folds run in order so each fit starts from the parameters of the previous fold (or
+       reuses them without refitting between every 'refit_every' folds)."""
+
+    # imported here so a worker only loads statsmodels when it is given work
+    from nyc311.timeseries import SARIMA_modeler
+
+    ts = task['ts']
+    values = ts.to_numpy(dtype='float64')
+    rows = []
+
+    for name, spec in task['models'].items():
+        previous = None
+        warm_params = task['warm_params'].get(name)
+
+        for i, (fold_key, (train_start, origin, test_end)) in enumerate(task['folds']):
+            row = {'series': task['key'], 'model': name, 'origin': ts.index[origin],
+                   'train_obs': origin - train_start, 'fold_key': fold_key,
+                   'warm_start': False, 'refit': True, 'params': None, 'failure': None}
+            start = time.perf_counter()
+            train = ts.iloc[train_start:origin]
+            horizon = test_end - origin
+
+            try:
+                with warnings.catch_warnings(), time_limit(task['timeout']):
+                    warnings.simplefilter('ignore')
+                    if spec['kind'] != 'sarima':
+                        predicted = _baseline_forecast(train.to_numpy(dtype='float64'), horizon, spec)
+                    else:
+                        refit = previous is None or i % spec.get('refit_every', 1) == 0
+                        if refit:
+                            model = SARIMA_modeler(train, spec['order'], spec['s_order'], spec['trend'],
+                                                   start_params=warm_params)
+                        else:
+                            # same parameters, new data: one filter pass
+                            model = previous.apply(train, refit=False)
+                        row.update(warm_start=warm_params is not None, refit=refit)
+                        predicted = np.asarray(model.forecast(steps=horizon))
+                        previous = model
+                        warm_params = np.asarray(model.params)
+                        row['params'] = json.dumps(warm_params.tolist())
+
+                row.update(forecast_errors(values[origin:test_end], predicted))
+            except Exception as e:
+                row['failure'] = f'{type(e).__name__}: {e}'
+
+            row['fit_time'] = time.perf_counter() - start
+            rows.append(row)
+
+    return rows
+
+
+def _lstm_fold_keys(series, dates, fold, spec):
+    """fold key of every series with training data in a GlobalLSTM fold. The network learns from
+       every series, so each key covers the fold's data of all of them."""
+    train_start, origin, test_end = fold
+    first, last = dates[train_start], dates[test_end - 1]
+    windows = {key: ts[(ts.index >= first) & (ts.index <= last)] for key, ts in series.items()}
+    shared = hashlib.sha1((''.join(f'{key}{window_hash(w)}' for key, w in windows.items())
+                           + json.dumps(spec, sort_keys=True, default=str)).encode()).hexdigest()
+    return {key: hashlib.sha1(f'{key}{shared}'.encode()).hexdigest()[:24]
+            for key, w in windows.items() if (w.index < dates[origin]).any()}
+
+
+def _lstm_folds(series, dates, folds, spec, done=()):
+    """runs GlobalLSTM over every fold: one network per fold trained on every series at once. The
+       folds are positions in 'dates' (every date of any series), so every series is cut at the
+       same training start and origin dates whatever its length, and each forecast is scored on the
+       series' values at the forecast dates. Folds whose keys are all in 'done' are skipped.
+       Returns the rows and the fold keys that were skipped."""
+    from nyc311.global_lstm import GlobalLSTM
+
+    rows, reused = [], []
+    for fold in folds:
+        train_start, origin, test_end = fold
+        keys = _lstm_fold_keys(series, dates, fold, spec)
+        if not keys:
+            continue
+        if all(k in done for k in keys.values()):
+            reused += list(keys.values())
+            continue
+
+        first, cutoff = dates[train_start], dates[origin]
+        train = {key: series[key][(series[key].index >= first) & (series[key].index < cutoff)]
+                 for key in keys}
+
+        start = time.perf_counter()
+        model = GlobalLSTM(window=spec.get('window', 28), horizon=test_end - origin,
+                           units=spec.get('units', 64), seed=spec.get('seed', 0))
+        forecast = model.fit(train, epochs=spec.get('epochs', 10)).forecast()
+        fit_time = (time.perf_counter() - start) / len(train)
+
+        for key, predicted in forecast.groupby('series', sort=False):
+            actual = series[key].reindex(pd.DatetimeIndex(predicted['date'])).to_numpy(dtype='float64')
+            scored = ~np.isnan(actual)
+            row = {'series': key, 'model': spec.get('name', 'lstm'), 'origin': cutoff,
+                   'train_obs': len(train[key]), 'fold_key': keys[key], 'warm_start': False,
+                   'refit': True, 'params': None, 'failure': None, 'fit_time': fit_time}
+            if scored.any():
+                row.update(forecast_errors(actual[scored], predicted['forecast'].to_numpy()[scored]))
+            else:
+                row['failure'] = 'no values on the forecast dates'
+            rows.append(row)
+    return rows, reused
+
+
+######################
+# BACKTEST FUNCTIONS #
+######################
+
+def _fold_key(key, ts, fold, model_spec):
+    """hash of a fold's series, data and model, so a rerun can reuse results for unchanged folds"""
+    train_start, origin, test_end = fold
+    spec = json.dumps([str(key), model_spec], sort_keys=True, default=str)
+    return window_hash(ts.iloc[train_start:test_end]) + hashlib.sha1(spec.encode()).hexdigest()[:8]
+
+
+def backtest(series, models=DEFAULT_MODELS, horizon=7, initial=None, step=None, window=None,
+             max_folds=None, n_jobs=None, timeout=None, cache_path=None, lstm=None, show=True):
+    """takes a dictionary of time series (ex. from series_from_long or cube_series) and evaluates
+       every model in 'models' (name: spec, see DEFAULT_MODELS) on rolling-origin folds (see
+       rolling_origins) of every series, over a pool of 'n_jobs' processes, one series per task.
+       'lstm' (ex. {'window': 28, 'epochs': 10}) also scores a GlobalLSTM trained on all series per
+       fold. With 'cache_path' (a parquet file) fold results are kept between runs and only folds
+       whose data changed (ex. the new week's) are computed; SARIMA picks up from the cached
+       parameters of its latest fold. Returns one row per series, model and fold of this run
+       (computed or reused); cached folds of these series and models that are no longer part of
+       the run are dropped from the cache."""
+
+    cached = pd.read_parquet(cache_path) if cache_path and os.path.exists(cache_path) else None
+    if cached is not None:
+        cached = cached.drop_duplicates('fold_key', keep='last')
+    done = set(cached['fold_key']) if cached is not None else set()
+
+    tasks, reused = [], []
+    for key, ts in series.items():
+        folds = rolling_origins(len(ts), horizon, initial=initial, step=step, window=window,
+                                max_folds=max_folds)
+        for name, spec in models.items():
+            keyed = [(_fold_key(key, ts, fold, spec), fold) for fold in folds]
+            reused += [k for k, _ in keyed if k in done]
+            todo = [(k, fold) for k, fold in keyed if k not in done]
+            if not todo:
+                continue
+
+            # warm start from the last cached fit of this series and model
+            warm_params = {}
+            if cached is not None and spec['kind'] == 'sarima':
+                previous = cached[(cached['model'] == name) & (cached['series'].astype(str) == str(key))
+                                  & cached['params'].notna()]
+                if len(previous):
+                    warm_params[name] = np.array(json.loads(previous.sort_values('origin')['params'].iloc[-1]))
+
+            tasks.append({'key': key, 'ts': ts, 'folds': todo, 'models': {name: spec},
+                          'warm_params': warm_params, 'timeout': timeout})
+
+    # the slowest tasks (most SARIMA folds) go first so workers finish together
+    tasks.sort(key=lambda t: -len(t['folds']) * (next(iter(t['models'].values()))['kind'] == 'sarima'))
+
+    start = time.perf_counter()
+    rows = [row for result in pool_map(_backtest_series, tasks, n_jobs=min(get_n_jobs(n_jobs), max(len(tasks), 1)))
+            for row in result]
+    if lstm is not None:
+        # folds by date over every series' dates, so series of different lengths line up
+        dates = pd.DatetimeIndex(sorted(set().union(*(ts.index for ts in series.values()))))
+        folds = rolling_origins(len(dates), horizon, initial=initial, step=step, window=window,
+                                max_folds=max_folds)
+        lstm_rows, lstm_reused = _lstm_folds(series, dates, folds, lstm, done=done)
+        rows += lstm_rows
+        reused += lstm_reused
+    elapsed = time.perf_counter() - start
+
+    results = pd.DataFrame(rows)
+    if cache_path:
+        # cached series keys are stored as text
+        if len(results):
+            results['series'] = results['series'].astype(str)
+        kept = cached
+        if cached is not None:
+            # the reused folds join the new ones; folds of the series and models run here that are
+            # not part of this run (ex. whose data changed) are replaced, the rest are kept as is
+            results = pd.concat([cached[cached['fold_key'].isin(reused)], results], ignore_index=True)
+            names = list(models) + ([lstm.get('name', 'lstm')] if lstm is not None else [])
+            ran = pd.MultiIndex.from_product([[str(key) for key in series], names])
+            kept = cached[~pd.MultiIndex.from_arrays([cached['series'].astype(str), cached['model']]).isin(ran)]
+        pd.concat([kept, results], ignore_index=True).to_parquet(cache_path, index=False)
+
+    if show == True:
+        print(f'Backtested {len(rows)} folds in {round(elapsed, 1)}s '
+              f'({len(reused)} reused from cache)')
+
+    return results
+
+
+def leaderboard(results, metric='rmse'):
+    """takes backtest results and returns the mean RMSE, MAE and MAPE, number of folds and failures
+       of every model on every series, ranked within each series by 'metric'"""
+    board = (results.groupby(['series', 'model'])
+                    .agg(rmse=('rmse', 'mean'), mae=('mae', 'mean'), mape=('mape', 'mean'),
+                         folds=('origin', 'size'), failures=('failure', 'count'),
+                         fit_time=('fit_time', 'mean')))
+    board['rank'] = board.groupby(level='series')[metric].rank(method='min')
+    return board.sort_values(['series', 'rank'])
+
+
+def best_models(board):
+    """takes a leaderboard and returns the best model of each series and its margin over the
+       runner up"""
+    ranked = board.reset_index().sort_values(['series', 'rank'])
+    best = ranked.groupby('series').head(1).set_index('series')
+    second = ranked.groupby('series').nth(1).set_index('series')
+    best['margin'] = second['rmse'] - best['rmse']
+    return best[['model', 'rmse', 'mape', 'margin']]
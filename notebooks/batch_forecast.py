@@ -0,0 +1,127 @@
+# import libraries
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from nyc311.parallel_helpers import get_n_jobs, pool_map, time_limit
+
+
+##############################
+# BATCH FORECASTING FUNCTIONS #
+##############################
+
+def series_from_long(df, keys, date_col='date', value_col='value', freq=None):
+    """takes a long-format dataframe with one row per key(s) and date and returns a dictionary
+       with each key (a tuple when 'keys' is a list) as keys and a time series as values.
+       'freq' (ex. 'D' or 'MS') sets a regular frequency on each series, filling gaps with 0."""
+
+    series = {}
+    for key, group in df.groupby(keys, sort=False, observed=True):
+        # groupby on a one item list still returns tuple keys
+        if isinstance(key, tuple) and len(key) == 1:
+            key = key[0]
+        ts = group.set_index(date_col)[value_col].sort_index()
+        if freq is not None:
+            ts = ts.asfreq(freq, fill_value=0)
+        series[key] = ts
+
+    return series
+
+
+def series_from_dict(ts_dict, variable='value', freq=None):
+    """takes a dictionary of time series dataframes like the one get_time_series returns
+       and returns a dictionary with the same keys and the chosen variable (default 'value')
+       as a series"""
+
+    series = {}
+    for key, df in ts_dict.items():
+        ts = df[variable]
+        if freq is not None:
+            ts = ts.asfreq(freq)
+        series[key] = ts
+
+    return series
+
+
+def _forecast_batch(task):
+    """worker function: fits and forecasts each (key, series) pair in task['series'] and returns
+       a list of forecast frames and a list of status rows. A failure in one series is recorded
+       in its status row and does not stop the rest of the batch."""
+
+    # imported here so a worker only loads statsmodels when it is given work
+    from nyc311.timeseries import SARIMA_modeler
+
+    frames, status = [], []
+    for key, ts in task['series']:
+        start = time.perf_counter()
+        failure = None
+        try:
+            with warnings.catch_warnings(), time_limit(task['timeout']):
+                warnings.simplefilter('ignore')
+                model = SARIMA_modeler(ts, task['order'], task['s_order'], task['trend'])
+                prediction = model.get_forecast(steps=task['steps'])
+                ci = prediction.conf_int(alpha=task['alpha'])
+
+            frames.append(pd.DataFrame({'series': [key] * task['steps'],
+                                        'date': prediction.predicted_mean.index,
+                                        'forecast': np.asarray(prediction.predicted_mean),
+                                        'lower': ci.iloc[:, 0].values,
+                                        'upper': ci.iloc[:, 1].values}))
+        except Exception as e:
+            failure = f'{type(e).__name__}: {e}'
+
+        status.append({'series': key, 'n_obs': len(ts),
+                       'fit_time': time.perf_counter() - start, 'failure': failure})
+
+    return frames, status
+
+
+def batch_forecast(data, keys=None, date_col='date', value_col='value', freq=None,
+                   order=(1, 1, 1), s_order=(0, 1, 1, 7), trend='n', steps=7, alpha=.05,
+                   n_jobs=None, batch_size=16, timeout=None, show=True):
+    """takes either a long-format dataframe (with 'keys', 'date_col' and 'value_col' columns) or a
+       dictionary of time series dataframes like the one get_time_series returns, fits a SARIMAX
+       model to every series with SARIMA_modeler in a pool of 'n_jobs' processes and forecasts
+       'steps' periods ahead. Default orders are for daily data with weekly seasonality.
+       Returns a tidy dataframe of 'series', 'date', 'forecast', 'lower' and 'upper' (the
+       confidence interval for level 'alpha') and a status dataframe with the size, fit time
+       and failure reason of each series. 'batch_size' series are sent to a worker at a time,
+       'timeout' limits the seconds spent on one series and 'show' prints the throughput."""
+
+    # normalize the input into a dictionary of series
+    if isinstance(data, dict):
+        series = series_from_dict(data, variable=value_col, freq=freq)
+    else:
+        series = series_from_long(data, keys, date_col=date_col, value_col=value_col, freq=freq)
+
+    # split the series into batches so each worker call amortizes its start up cost
+    items = list(series.items())
+    tasks = [{'series': items[i:i + batch_size], 'order': order, 's_order': s_order,
+              'trend': trend, 'steps': steps, 'alpha': alpha, 'timeout': timeout}
+             for i in range(0, len(items), batch_size)]
+
+    start = time.perf_counter()
+    results = pool_map(_forecast_batch, tasks, n_jobs=n_jobs)
+    wall_time = time.perf_counter() - start
+
+    # combine the results from every batch
+    frames = [f for batch_frames, _ in results for f in batch_frames]
+    status = pd.DataFrame([s for _, batch_status in results for s in batch_status],
+                          columns=['series', 'n_obs', 'fit_time', 'failure'])
+    forecasts = (pd.concat(frames, ignore_index=True) if frames else
+                 pd.DataFrame(columns=['series', 'date', 'forecast', 'lower', 'upper']))
+
+    # record throughput on the status table
+    throughput = len(items) / wall_time if wall_time > 0 else np.nan
+    status.attrs['wall_time'] = wall_time
+    status.attrs['series_per_second'] = throughput
+
+    if show == True:
+        n_failed = status['failure'].notna().sum()
+        print(f'Forecasted {len(items) - n_failed} of {len(items)} series in {round(wall_time, 2)}s '
+              f'on {min(get_n_jobs(n_jobs), max(len(tasks), 1))} workers '
+              f'({round(throughput, 1)} series per second)')
+
+    return forecasts, status
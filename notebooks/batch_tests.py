@@ -0,0 +1,139 @@
+# import libraries
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from nyc311._lazy import lazy_module
+
+# scipy and statsmodels are only imported when a test is first run
+stats = lazy_module('scipy.stats')
+multitest = lazy_module('statsmodels.stats.multitest')
+
+
+# shapiro's p-value is not reliable above this many values, larger groups are subsampled
+SHAPIRO_MAX_N = 5000
+
+
+#################################
+# BATCH HYPOTHESIS TEST FUNCTIONS #
+#################################
+
+def group_summary(df, group_col, value_col, alpha=.05, seed=0):
+    """takes a dataframe, the column that defines groups (ex. 'Incident Zip') and the column to
+       compare (ex. 'response_time') and returns a dataframe with one row per group: size, mean,
+       standard deviation, the Shapiro-Wilk p-value and whether the group is normal at 'alpha',
+       plus the mean absolute deviation from the median used by the pairwise Levene tests"""
+
+    grouped = df.groupby(group_col, observed=True)[value_col]
+
+    # size, mean and std of every group in one pass
+    summary = grouped.agg(['count', 'mean', 'std', 'median'])
+    summary = summary.rename(columns={'count': 'n'})
+
+    # Levene's test works on absolute deviations from each group's median
+    abs_dev = (df[value_col] - grouped.transform('median')).abs()
+    dev_grouped = abs_dev.groupby(df[group_col], observed=True)
+    summary['dev_mean'] = dev_grouped.mean()
+    summary['dev_ss'] = dev_grouped.var(ddof=0) * summary['n']
+
+    # shapiro has no vectorized form, so test each group (large groups on a fixed size subsample)
+    rng = np.random.default_rng(seed)
+    shapiro_p = {}
+    for key, values in grouped:
+        values = values.dropna().to_numpy()
+        if len(values) > SHAPIRO_MAX_N:
+            values = rng.choice(values, size=SHAPIRO_MAX_N, replace=False)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            shapiro_p[key] = stats.shapiro(values)[1] if len(values) >= 3 else np.nan
+    summary['shapiro_p'] = pd.Series(shapiro_p)
+    summary['normal'] = summary['shapiro_p'] >= alpha
+
+    return summary
+
+
+def pairwise_tests(summary, alpha=.05, correction='fdr_bh'):
+    """takes a group summary from group_summary and returns a dataframe with one row per pair of
+       groups with both groups' size and mean, Cohen's d, Welch's t-test, Levene's test for equal
+       variance and the t-test p-value corrected across every pair with 'correction'
+       ('bonferroni' or 'fdr_bh' for Benjamini-Hochberg). Every pair is computed at once with
+       array math on the group summaries."""
+
+    # indices of every pair of groups
+    i, j = np.triu_indices(len(summary), k=1)
+    s = {c: summary[c].to_numpy(dtype='float64') for c in ['n', 'mean', 'std', 'dev_mean', 'dev_ss']}
+    n_a, n_b = s['n'][i], s['n'][j]
+    var_a, var_b = s['std'][i] ** 2, s['std'][j] ** 2
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Cohen's d with the pooled population variance, as in cohen_d
+        pooled_var = ((n_a - 1) * var_a + (n_b - 1) * var_b) / (n_a + n_b)
+        cohen_d = np.abs(s['mean'][i] - s['mean'][j]) / np.sqrt(pooled_var)
+
+        # Welch's t-test
+        se2_a, se2_b = var_a / n_a, var_b / n_b
+        t = (s['mean'][i] - s['mean'][j]) / np.sqrt(se2_a + se2_b)
+        dof = (se2_a + se2_b) ** 2 / (se2_a ** 2 / (n_a - 1) + se2_b ** 2 / (n_b - 1))
+        t_p = 2 * stats.t.sf(np.abs(t), dof)
+
+        # Levene's test for two groups is a one way ANOVA on the absolute deviations
+        n = n_a + n_b
+        grand = (n_a * s['dev_mean'][i] + n_b * s['dev_mean'][j]) / n
+        between = n_a * (s['dev_mean'][i] - grand) ** 2 + n_b * (s['dev_mean'][j] - grand) ** 2
+        within = s['dev_ss'][i] + s['dev_ss'][j]
+        levene_f = (n - 2) * between / within
+        levene_p = stats.f.sf(levene_f, 1, n - 2)
+
+    pairs = pd.DataFrame({'group_a': summary.index[i], 'group_b': summary.index[j],
+                          'n_a': n_a, 'n_b': n_b,
+                          'mean_a': s['mean'][i], 'mean_b': s['mean'][j],
+                          'cohen_d': cohen_d, 't': t, 'p': t_p,
+                          'levene_f': levene_f, 'levene_p': levene_p,
+                          'equal_var': levene_p >= alpha})
+
+    # correct the p-values across the whole family of tests
+    pairs['p_adj'] = np.nan
+    pairs['reject'] = False
+    tested = pairs['p'].notna().to_numpy()
+    if tested.any():
+        reject, p_adj = multitest.multipletests(pairs.loc[tested, 'p'], alpha=alpha, method=correction)[:2]
+        pairs.loc[tested, 'p_adj'] = p_adj
+        pairs.loc[tested, 'reject'] = reject
+
+    return pairs
+
+
+def batch_compare(df, group_col, value_col, by=None, alpha=.05, correction='fdr_bh'):
+    """takes a dataframe, the column that defines groups (ex. 'Incident Zip'), the column to compare
+       (ex. 'response_time') and optional columns 'by' to run separate sweeps in (ex.
+       'Complaint Type') and returns one dataframe of every pairwise comparison (see
+       pairwise_tests) with each group's Shapiro-Wilk p-value added. Corrections with 'correction'
+       are applied across every test in the result, so the family is the whole sweep."""
+
+    by = [by] if isinstance(by, str) else (by or [])
+    sweeps = df.groupby(by, observed=True) if by else [((), df)]
+
+    results = []
+    for key, sweep in sweeps:
+        summary = group_summary(sweep, group_col, value_col, alpha=alpha)
+        pairs = pairwise_tests(summary, alpha=alpha, correction=correction)
+        pairs['shapiro_p_a'] = summary['shapiro_p'].reindex(pairs['group_a']).to_numpy()
+        pairs['shapiro_p_b'] = summary['shapiro_p'].reindex(pairs['group_b']).to_numpy()
+
+        # label the rows with the sweep they came from
+        key = key if isinstance(key, tuple) else (key,)
+        for position, (col, value) in enumerate(zip(by, key)):
+            pairs.insert(position, col, value)
+        results.append(pairs)
+
+    results = pd.concat(results, ignore_index=True)
+
+    # correct across every sweep, not just within each one
+    tested = results['p'].notna().to_numpy()
+    if tested.any():
+        reject, p_adj = multitest.multipletests(results.loc[tested, 'p'], alpha=alpha, method=correction)[:2]
+        results.loc[tested, 'p_adj'] = p_adj
+        results.loc[tested, 'reject'] = reject
+
+    return results
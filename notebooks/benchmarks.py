@@ -0,0 +1,307 @@
+"""Benchmark suite for the 311 helpers on synthetic data (see synthetic_311.py), with stored
+baselines so any optimization can be compared before and after with one command.
+
+    python benchmarks.py --rows 1000000 --save before
+    python benchmarks.py --rows 1000000 --compare before
+    python benchmarks.py --imports
+"""
+
+# import libraries
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from synthetic_311 import generate_311, write_311_csv
+
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baselines')
+
+# modules whose import cost every notebook, script and pool worker pays
+IMPORT_MODULES = ['nyc311', 'nyc311.cleaning', 'nyc311.stats', 'nyc311.timeseries', 'nyc311.plots',
+                  'ryans_ts_helper', 'nyc311.sarima_search', 'nyc311.stationarity_screen', 'backtest']
+
+# heavy libraries that should only load when a function needs them
+HEAVY_MODULES = ['matplotlib', 'seaborn', 'statsmodels', 'scipy', 'sklearn', 'tensorflow']
+
+
+#######################
+# BENCHMARK FUNCTIONS #
+#######################
+# each benchmark takes the shared context and returns the number of rows (or series) it processed
+
+def bench_ingest(ctx):
+    """streaming csv parse and clean (ingest_311_csv)"""
+    from ingest_helpers import ingest_311_csv
+    return len(ingest_311_csv(ctx['csv']))
+
+
+def bench_clean(ctx):
+    """drop_empty_cols and optimize_memory on the raw records"""
+    from nyc311.cleaning import drop_empty_cols, optimize_memory
+    df = ctx['df'].astype({'Agency': str, 'Complaint Type': str, 'Borough': str})
+    optimize_memory(drop_empty_cols(df), show=False)
+    return len(df)
+
+
+def bench_get_time_series(ctx):
+    """get_time_series on the monthly zip x complaint type counts"""
+    from nyc311.timeseries import get_time_series
+    return len(get_time_series(ctx['wide']))
+
+
+def bench_stationarity(ctx):
+    """screen_stationarity of every borough x agency monthly series"""
+    from nyc311.stationarity_screen import clear_adf_cache, screen_stationarity
+    clear_adf_cache()
+    return len(screen_stationarity(ctx['monthly'], n_jobs=ctx['n_jobs']))
+
+
+def bench_sarima(ctx):
+    """SARIMA_modeler fit of every borough daily series"""
+    from nyc311.timeseries import SARIMA_modeler
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for ts in ctx['daily'].values():
+            SARIMA_modeler(ts, (1, 1, 1), (0, 1, 1, 7), 'n')
+    return len(ctx['daily'])
+
+
+def bench_stat_tests(ctx):
+    """batch_compare of response times between zips, within each borough"""
+    from batch_tests import batch_compare
+    batch_compare(ctx['response'], 'Incident Zip', 'response_time', by='Borough')
+    return len(ctx['response'])
+
+
+def bench_geo_join(ctx):
+    """fill_missing_zips of the records without a zip"""
+    from zip_geocoder import fill_missing_zips
+    df = ctx['df'][['Incident Zip', 'Latitude', 'Longitude']].copy()
+    df.loc[::10, 'Incident Zip'] = np.nan
+    return fill_missing_zips(df, index=ctx['zcta_index'], show=False)[1]
+
+
+def bench_rollup(ctx):
+    """cube_cells of the records"""
+    from rollup_cube import cube_cells
+    cube_cells(ctx['df'])
+    return len(ctx['df'])
+
+
+BENCHMARKS = {'ingest': bench_ingest, 'clean': bench_clean, 'get_time_series': bench_get_time_series,
+              'stationarity': bench_stationarity, 'sarima': bench_sarima, 'stat_tests': bench_stat_tests,
+              'geo_join': bench_geo_join, 'rollup': bench_rollup}
+
+
+#############################
+# BENCHMARK SUITE FUNCTIONS #
+#############################
+
+def make_context(n_rows=1000000, csv_rows=500000, seed=0, n_jobs=None, tmp_dir=None):
+    """generates the synthetic records and the inputs every benchmark shares (not timed). Without
+       'tmp_dir' the benchmark CSV goes to a temporary folder that is deleted by close_context (or
+       when the context is garbage collected)."""
+    from zip_geocoder import load_zcta_index
+
+    df = generate_311(n_rows, seed=seed)
+    ctx = {'df': df, 'n_jobs': n_jobs, 'n_rows': n_rows, 'seed': seed, 'tmp': None}
+    if tmp_dir is None:
+        ctx['tmp'] = tempfile.TemporaryDirectory(prefix='bench311_')
+        tmp_dir = ctx['tmp'].name
+    ctx['csv'] = write_311_csv(os.path.join(tmp_dir, 'synthetic_311.csv'), min(n_rows, csv_rows), seed=seed)
+
+    # monthly counts per zip x complaint type, wide, in the layout get_time_series takes
+    month = df['Created Date'].dt.to_period('M').dt.strftime('%Y-%m')
+    wide = df.groupby([df['Incident Zip'], df['Complaint Type'], month], observed=True).size().unstack(fill_value=0)
+    wide.index = [f'{z} {t}' for z, t in wide.index]
+    ctx['wide'] = wide.rename_axis('city_zipcode').reset_index()
+
+    # monthly borough x agency series and daily borough series
+    by_month = df.groupby(['Borough', 'Agency', pd.Grouper(key='Created Date', freq='MS')], observed=True).size()
+    ctx['monthly'] = {key: ts.droplevel([0, 1]).asfreq('MS', fill_value=0)
+                      for key, ts in by_month.groupby(level=[0, 1])}
+    by_day = df.groupby(['Borough', pd.Grouper(key='Created Date', freq='D')], observed=True).size()
+    ctx['daily'] = {key: ts.droplevel(0).asfreq('D', fill_value=0).iloc[-730:]
+                    for key, ts in by_day.groupby(level=0)}
+
+    closed = df.dropna(subset=['Closed Date', 'Incident Zip'])
+    ctx['response'] = pd.DataFrame({'Borough': closed['Borough'], 'Incident Zip': closed['Incident Zip'],
+                                    'response_time': (closed['Closed Date'] - closed['Created Date'])
+                                    / pd.Timedelta(days=1)})
+    ctx['zcta_index'] = load_zcta_index()
+    return ctx
+
+
+def close_context(ctx):
+    """deletes the temporary folder make_context created for the benchmark CSV, if any"""
+    if ctx.get('tmp') is not None:
+        ctx['tmp'].cleanup()
+        ctx['tmp'] = None
+
+
+def run_benchmarks(n_rows=1000000, names=None, repeat=3, seed=0, n_jobs=None, ctx=None, show=True):
+    """generates 'n_rows' synthetic records and times every benchmark in 'names' (default = all of
+       BENCHMARKS) 'repeat' times. Returns a dataframe with the best and median seconds and the
+       rows processed per second of each. A context from make_context can be passed as 'ctx'
+       (it is left open); one made here is closed when the benchmarks finish."""
+    own_ctx = ctx is None
+    ctx = make_context(n_rows, seed=seed, n_jobs=n_jobs) if own_ctx else ctx
+
+    rows = []
+    try:
+        for name in names or list(BENCHMARKS):
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                processed = BENCHMARKS[name](ctx)
+                times.append(time.perf_counter() - start)
+            rows.append({'benchmark': name, 'best_s': min(times), 'median_s': float(np.median(times)),
+                         'processed': processed, 'per_s': processed / min(times)})
+            if show == True:
+                print(f'{name:>16}: {min(times):8.3f}s best of {repeat}')
+    finally:
+        if own_ctx:
+            close_context(ctx)
+
+    results = pd.DataFrame(rows).set_index('benchmark')
+    results.attrs.update(n_rows=ctx['n_rows'], seed=ctx['seed'], repeat=repeat)
+    return results
+
+
+def _environment():
+    """the machine and versions a baseline was recorded on"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+    return {'commit': commit or None, 'python': platform.python_version(), 'pandas': pd.__version__,
+            'numpy': np.__version__, 'machine': platform.machine(), 'cpus': os.cpu_count(),
+            'recorded': pd.Timestamp.now().isoformat(timespec='seconds')}
+
+
+def save_baseline(results, name, root=BASELINE_DIR):
+    """writes benchmark results to 'root'/'name'.json with the environment they were recorded in"""
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, f'{name}.json')
+    with open(path, 'w') as f:
+        json.dump({'settings': results.attrs, 'environment': _environment(),
+                   'results': json.loads(results.to_json(orient='index'))}, f, indent=1)
+    return path
+
+
+def load_baseline(name, root=BASELINE_DIR):
+    """returns the results stored by save_baseline"""
+    with open(os.path.join(root, f'{name}.json')) as f:
+        saved = json.load(f)
+    results = pd.DataFrame.from_dict(saved['results'], orient='index').rename_axis('benchmark')
+    results.attrs.update(saved['settings'])
+    return results
+
+
+def compare_to_baseline(results, name, root=BASELINE_DIR, tolerance=.1):
+    """takes benchmark results and the name of a baseline and returns each benchmark's best time
+       in both, the speedup (baseline / current) and whether it regressed by more than
+       'tolerance' (ex. .1 = 10% slower)"""
+    baseline = load_baseline(name, root=root)
+    if baseline.attrs.get('n_rows') != results.attrs.get('n_rows'):
+        warnings.warn(f"baseline {name!r} was recorded with {baseline.attrs.get('n_rows')} rows, "
+                      f"not {results.attrs.get('n_rows')}")
+    comparison = pd.DataFrame({'baseline_s': baseline['best_s'], 'current_s': results['best_s']}).dropna()
+    comparison['speedup'] = comparison['baseline_s'] / comparison['current_s']
+    comparison['regressed'] = comparison['current_s'] > comparison['baseline_s'] * (1 + tolerance)
+    return comparison
+
+
+##########################
+# IMPORT TIMING FUNCTIONS #
+##########################
+
+_IMPORT_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, [m for m in {heavy!r} if m in sys.modules]]))
+'''
+
+
+def import_times(modules=IMPORT_MODULES, repeat=3, show=True):
+    """imports every module in 'modules' in a fresh interpreter 'repeat' times and returns a dataframe
+       with the best seconds of a cold import and the heavy libraries (HEAVY_MODULES) it loaded.
+       This is the start-up cost of every script and pool worker that imports the module."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [here, os.environ.get('PYTHONPATH')])))
+
+    rows = []
+    for module in modules:
+        script = _IMPORT_SCRIPT.format(module=module, heavy=HEAVY_MODULES)
+        times = []
+        for _ in range(repeat):
+            out = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True,
+                                 cwd=here, env=env, check=True).stdout
+            elapsed, loaded = json.loads(out.strip().splitlines()[-1])
+            times.append(elapsed)
+        rows.append({'module': module, 'import_s': min(times), 'loads': ', '.join(loaded)})
+        if show == True:
+            print(f'{module:>28}: {min(times):7.3f}s  {", ".join(loaded)}')
+    return pd.DataFrame(rows).set_index('module')
+
+
+def _import_in_worker(module):
+    start = time.perf_counter()
+    __import__(module)
+    return time.perf_counter() - start
+
+
+def worker_spawn_time(module='nyc311.timeseries', n_jobs=2):
+    """returns the seconds until 'n_jobs' freshly spawned pool workers have each imported 'module',
+       the fixed cost a parallel helper pays before its first task"""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=n_jobs, mp_context=multiprocessing.get_context('spawn')) as pool:
+        list(pool.map(_import_in_worker, [module] * n_jobs))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the 311 helpers on synthetic data.')
+    parser.add_argument('--rows', type=int, default=1000000, help='synthetic records (1M to 20M)')
+    parser.add_argument('--only', nargs='*', choices=list(BENCHMARKS), help='benchmarks to run')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--jobs', type=int, default=None, help='worker processes where used')
+    parser.add_argument('--save', metavar='NAME', help='store the results as baseline NAME')
+    parser.add_argument('--compare', metavar='NAME', help='compare the results to baseline NAME')
+    parser.add_argument('--imports', action='store_true', help='time cold imports of the helper modules')
+    args = parser.parse_args()
+
+    if args.imports:
+        import_times(repeat=args.repeat)
+        print(f'{"spawned workers":>28}: {worker_spawn_time(n_jobs=args.jobs or 2):7.3f}s')
+        return
+
+    results = run_benchmarks(args.rows, names=args.only, repeat=args.repeat, seed=args.seed,
+                             n_jobs=args.jobs)
+    if args.save:
+        print(f'Saved baseline to {save_baseline(results, args.save)}')
+    if args.compare:
+        comparison = compare_to_baseline(results, args.compare)
+        print(comparison.round(3).to_string())
+        if comparison['regressed'].any():
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+# import libraries
+import uuid
+
+import pandas as pd
+
+
+# columns the cleaned store is partitioned by, in directory order
+PARTITION_COLS = ['year', 'month', 'Agency']
+
+
+def _arrow():
+    """imports pyarrow (needed for the parquet store) on first use and returns the
+       (pyarrow, pyarrow.dataset, pyarrow.fs) modules"""
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.fs as fs
+    except ImportError as e:
+        raise ImportError('the cleaned 311 store needs pyarrow: pip install pyarrow') from e
+    return pa, ds, fs
+
+
+############################
+# CLEANED STORE FUNCTIONS #
+############################
+
+def write_311_store(df, root, date_col='Created Date', partition_cols=PARTITION_COLS):
+    """takes a cleaned 311 dataframe (or one chunk from stream_311_csv) and appends it to a parquet
+       store at 'root', partitioned by the year and month of 'date_col' and by agency
+       (ex. root/year=2019/month=1/Agency=HPD/). New files never overwrite existing ones,
+       so the function can be used as the 'sink' of ingest_311_csv."""
+
+    pa, ds, fs = _arrow()
+
+    # add the partition keys derived from the created date
+    df = df.assign(year=df[date_col].dt.year.astype('int16'),
+                   month=df[date_col].dt.month.astype('int8'))
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    partitioning = ds.partitioning(table.select(partition_cols).schema, flavor='hive')
+
+    # a unique file name per call lets chunks be appended to the same partitions
+    ds.write_dataset(table, root, format='parquet', partitioning=partitioning,
+                     basename_template=f'part-{uuid.uuid4().hex}-{{i}}.parquet',
+                     existing_data_behavior='overwrite_or_ignore')
+
+
+def open_311_store(root):
+    """takes the root of a parquet store written by write_311_store and returns a memory mapped
+       pyarrow dataset over it"""
+    pa, ds, fs = _arrow()
+    schema = pa.schema([('year', pa.int16()), ('month', pa.int8()), ('Agency', pa.string())])
+    return ds.dataset(root, format='parquet',
+                      partitioning=ds.partitioning(schema, flavor='hive'),
+                      filesystem=fs.LocalFileSystem(use_mmap=True))
+
+
+def store_filter(agency=None, complaint_type=None, borough=None, start=None, end=None,
+                 date_col='Created Date'):
+    """takes optional values for agency, complaint type and borough (a value or list of values)
+       and a 'start' and 'end' (exclusive) date and returns a pyarrow filter expression. Agency,
+       year and month select partitions, so only matching directories are opened; complaint type,
+       borough and the exact dates are then filtered row by row."""
+
+    pa, ds, fs = _arrow()
+    conditions = []
+
+    # agency is a partition filter: whole directories are skipped when it does not match;
+    # complaint type and borough are ordinary columns, filtered as the files are read
+    for col, value in [('Agency', agency), ('Complaint Type', complaint_type), ('Borough', borough)]:
+        if value is not None:
+            values = [value] if isinstance(value, str) else list(value)
+            conditions.append(ds.field(col).isin(values))
+
+    # the year and month keys prune partitions, the timestamp comparison trims the edges
+    year, month = ds.field('year'), ds.field('month')
+    if start is not None:
+        start = pd.Timestamp(start)
+        conditions.append((year > start.year) | ((year == start.year) & (month >= start.month)))
+        conditions.append(ds.field(date_col) >= pa.scalar(start.to_pydatetime()))
+    if end is not None:
+        end = pd.Timestamp(end)
+        # the last month with dates before the (exclusive) end
+        last = end - pd.Timedelta(1, 'ns')
+        conditions.append((year < last.year) | ((year == last.year) & (month <= last.month)))
+        conditions.append(ds.field(date_col) < pa.scalar(end.to_pydatetime()))
+
+    expression = None
+    for c in conditions:
+        expression = c if expression is None else expression & c
+    return expression
+
+
+def load_311_store(root, columns=None, agency=None, complaint_type=None, borough=None,
+                   start=None, end=None):
+    """takes the root of a parquet store and returns a dataframe with only the requested 'columns'
+       (default = every column) of the rows matching the filters (see store_filter). Only the
+       matching partitions and columns are read from disk. ex. HPD heat/hot water in 2019:
+       load_311_store(root, columns=['Created Date', 'Incident Zip'], agency='HPD',
+                      complaint_type='HEAT/HOT WATER', start='2019-01-01', end='2020-01-01')"""
+
+    dataset = open_311_store(root)
+    table = dataset.to_table(columns=columns,
+                             filter=store_filter(agency=agency, complaint_type=complaint_type,
+                                                 borough=borough, start=start, end=end))
+    df = table.to_pandas()
+
+    # the agency comes back from the directory names as plain strings
+    if 'Agency' in df.columns:
+        df['Agency'] = df['Agency'].astype('category')
+    return df
+
+
+def load_time_series(root, by=None, freq='D', date_col='Created Date', **filters):
+    """takes the root of a parquet store, optional columns to split by (ex. ['Borough']) and a
+       frequency (default = daily) and returns the number of requests per period for the rows
+       matching 'filters' (see load_311_store). Without 'by' returns a single time series ready
+       for SARIMA_modeler, otherwise a dictionary like the one get_time_series returns, with each
+       group as a key and a dataframe with a 'value' column as the value."""
+
+    # read only the columns needed to count requests
+    by = [by] if isinstance(by, str) else (by or [])
+    df = load_311_store(root, columns=[date_col] + by, **filters)
+
+    if not by:
+        return df.set_index(date_col).resample(freq).size().rename('value')
+
+    # count every group's requests in one pass and give each series a regular frequency
+    counts = df.groupby(by + [pd.Grouper(key=date_col, freq=freq)], observed=True).size()
+    time_series_dict = {}
+    for key, ts in counts.groupby(level=by, observed=True):
+        ts = ts.droplevel(by).asfreq(freq, fill_value=0)
+        time_series_dict[key[0] if len(by) == 1 else key] = ts.to_frame('value')
+
+    return time_series_dict
@@ -0,0 +1,198 @@
+# import libraries
+import os
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from cleaned_store import load_311_store, write_311_store
+
+
+#############################
+# DAILY AGGREGATE FUNCTIONS #
+#############################
+
+def _month_path(agg_root, period):
+    """returns the file holding the daily aggregates of one month"""
+    return os.path.join(agg_root, f'daily_{period}.parquet')
+
+
+def daily_counts(df, by, date_col='Created Date'):
+    """takes 311 records and the columns to group by (ex. ['Agency', 'Borough']) and returns a
+       long dataframe with one row per group and day and the number of requests in 'value'"""
+    counts = (df.groupby(by + [df[date_col].dt.floor('D').rename('date')], observed=True)
+                .size()
+                .rename('value')
+                .reset_index())
+    # keep the group columns as plain values so months written separately line up
+    for col in by:
+        counts[col] = counts[col].astype(str)
+    return counts
+
+
+def update_daily_aggregates(new_df, agg_root, by, date_col='Created Date'):
+    """takes the new day's 311 records and adds their daily counts to the aggregates stored under
+       'agg_root' (one parquet file per month). Only the months present in the new records are
+       read and rewritten, and late records for earlier days are added to the existing counts.
+       Returns the daily counts of the new records."""
+
+    os.makedirs(agg_root, exist_ok=True)
+    new_counts = daily_counts(new_df, by, date_col=date_col)
+
+    # merge the new counts into each month they touch
+    for period, month_counts in new_counts.groupby(new_counts['date'].dt.to_period('M')):
+        path = _month_path(agg_root, period)
+        if os.path.exists(path):
+            month_counts = pd.concat([pd.read_parquet(path), month_counts], ignore_index=True)
+        month_counts = month_counts.groupby(by + ['date'], as_index=False)['value'].sum()
+        month_counts.to_parquet(path, index=False)
+
+    return new_counts
+
+
+def load_daily_aggregates(agg_root, start=None, end=None):
+    """takes the root of the daily aggregates and an optional 'start' and 'end' date and returns
+       the long dataframe of daily counts, reading only the months in that range"""
+
+    paths = []
+    for name in sorted(os.listdir(agg_root)):
+        if not (name.startswith('daily_') and name.endswith('.parquet')):
+            continue
+        period = pd.Period(name[len('daily_'):-len('.parquet')], freq='M')
+        if start is not None and period.end_time < pd.Timestamp(start):
+            continue
+        if end is not None and period.start_time > pd.Timestamp(end):
+            continue
+        paths.append(os.path.join(agg_root, name))
+
+    if not paths:
+        return pd.DataFrame()
+    return pd.concat([pd.read_parquet(p) for p in paths], ignore_index=True)
+
+
+##########################
+# MODEL REFRESH FUNCTIONS #
+##########################
+
+def drift_score(model, last_n=None):
+    """takes a fitted SARIMAX results object and returns the root mean square of its standardized
+       one-step-ahead forecast errors, over the last 'last_n' observations (default = all).
+       A well specified model scores close to 1."""
+    errors = np.asarray(model.filter_results.standardized_forecasts_error[0])
+    if last_n is not None:
+        errors = errors[-last_n:]
+    errors = errors[np.isfinite(errors)]
+    return np.sqrt(np.mean(errors ** 2)) if len(errors) else np.nan
+
+
+def refresh_model(model, new_obs, drift_threshold=2.0, freq='D'):
+    """takes a fitted SARIMAX results object and a series of new observations that follow the end
+       of its sample. The new observations are appended to the model's state without refitting
+       the parameters. If the standardized forecast errors on the new observations score above
+       'drift_threshold' (see drift_score) the model is refit on the full sample, starting from its
+       old parameters. Returns the refreshed model and True if it was refit."""
+
+    # only observations after the model's last date can be appended
+    last = model.data.row_labels[-1]
+    new_obs = new_obs[new_obs.index > last]
+    if len(new_obs) == 0:
+        return model, False
+    new_obs = new_obs.reindex(pd.date_range(last + pd.tseries.frequencies.to_offset(freq),
+                                            new_obs.index.max(), freq=freq), fill_value=0)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        # extend the state with the new observations using the existing parameters
+        updated = model.append(new_obs, refit=False)
+
+        # score only the errors made on the new observations
+        if not drift_score(updated, last_n=len(new_obs)) > drift_threshold:
+            return updated, False
+
+        # drift: refit on the whole sample, warm started from the old parameters
+        refit = updated.model.fit(start_params=model.params, disp=False)
+
+    return refit, True
+
+
+def _unseen_records(new_df, store_root, agg_root, date_col='Created Date'):
+    """drops the records that were already loaded, so running the same day twice adds nothing:
+       by 'Unique Key' against the store when the records have one, otherwise every record of a
+       day the daily aggregates already hold"""
+    if not len(new_df):
+        return new_df
+
+    if 'Unique Key' in new_df.columns:
+        if not os.path.isdir(store_root) or not os.listdir(store_root):
+            return new_df
+        # only the partitions of the days being loaded are read
+        stored = load_311_store(store_root, columns=['Unique Key'], start=new_df[date_col].min(),
+                                end=new_df[date_col].max() + pd.Timedelta(seconds=1))
+        return new_df[~new_df['Unique Key'].isin(stored['Unique Key'])]
+
+    days = new_df[date_col].dt.floor('D')
+    if not os.path.isdir(agg_root):
+        return new_df
+    loaded = load_daily_aggregates(agg_root, start=days.min(), end=days.max())
+    if not len(loaded):
+        return new_df
+    seen = days.isin(loaded['date'])
+    if seen.any():
+        warnings.warn(f'skipped {int(seen.sum())} records of days already in the daily aggregates '
+                      f'(no Unique Key to tell new records apart)')
+    return new_df[~seen]
+
+
+def _slice_key(key):
+    """a slice key as the daily aggregates store it (every value as text)"""
+    return tuple(map(str, key)) if isinstance(key, tuple) else str(key)
+
+
+def run_daily_update(new_df, store_root, agg_root, models, by, date_col='Created Date',
+                     drift_threshold=2.0, show=True):
+    """takes the new day's cleaned 311 records, the roots of the cleaned store and the daily
+       aggregates, a dictionary of fitted SARIMAX models keyed by slice (a tuple of values of the
+       'by' columns, or a single value when 'by' has one column, ex. an int zip code) and the
+       columns that define a slice. Appends the records not already loaded to the store (see
+       _unseen_records, so rerunning a day is harmless), updates the daily aggregates and
+       refreshes every model with its full counts for the days after its sample (see
+       refresh_model). Work is proportional to the new records, not the history. Returns the
+       dictionary of refreshed models and a dataframe reporting for each slice the observations
+       added, whether it was refit and the time taken."""
+
+    start = time.perf_counter()
+
+    # store the raw records and fold them into the daily aggregates, once
+    n_received = len(new_df)
+    new_df = _unseen_records(new_df, store_root, agg_root, date_col=date_col)
+    report = []
+    if len(new_df):
+        write_311_store(new_df, store_root, date_col=date_col)
+        new_counts = update_daily_aggregates(new_df, agg_root, by, date_col=date_col)
+
+        # models see each touched day's total (earlier records of the day included)
+        days = new_counts['date'].unique()
+        totals = load_daily_aggregates(agg_root, start=days.min(), end=days.max())
+        totals = totals[totals['date'].isin(days)]
+
+        # the aggregates hold the slice values as text, the models may be keyed by ints
+        model_keys = {_slice_key(key): key for key in models}
+        for key, slice_counts in totals.groupby(by):
+            key = model_keys.get(_slice_key(key[0] if len(by) == 1 else key))
+            if key is None:
+                continue
+
+            model_start = time.perf_counter()
+            new_obs = slice_counts.set_index('date')['value'].sort_index().astype(float)
+            models[key], refit = refresh_model(models[key], new_obs, drift_threshold=drift_threshold)
+            report.append({'slice': key, 'new_obs': len(new_obs), 'refit': refit,
+                           'time': time.perf_counter() - model_start})
+
+    report = pd.DataFrame(report, columns=['slice', 'new_obs', 'refit', 'time'])
+
+    if show == True:
+        print(f'Added {len(new_df)} of {n_received} records, refreshed {len(report)} models '
+              f'({int(report["refit"].sum())} refit) in {round(time.perf_counter() - start, 2)}s')
+
+    return models, report
@@ -0,0 +1,102 @@
+"""Load test for forecast_server.py: opens concurrent keep-alive connections to a running server,
+sends forecast queries for its slices and reports throughput and p50/p99 latency.
+
+    python forecast_load_test.py --port 8311 --requests 5000 --concurrency 32
+"""
+
+# import libraries
+import argparse
+import asyncio
+import json
+import random
+import time
+from urllib.parse import urlencode
+
+import numpy as np
+
+
+async def _request(reader, writer, path):
+    """sends one GET on an open connection and returns (status, body)"""
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode())
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def _client(host, port, paths, latencies, failures):
+    """one connection sending its share of the requests back to back"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for path in paths:
+            start = time.perf_counter()
+            status, _ = await _request(reader, writer, path)
+            latencies.append(time.perf_counter() - start)
+            failures += [path] if status != 200 else []
+    finally:
+        writer.close()
+
+
+async def load_test(host='127.0.0.1', port=8311, n_requests=5000, concurrency=32, steps=(7, 14, 30),
+                    alphas=(.05, .2), seed=0):
+    """sends 'n_requests' forecast queries (random slices, steps and alphas) over 'concurrency'
+       connections and returns a dictionary with requests per second and latency percentiles in
+       milliseconds, alongside the server's own /metrics"""
+
+    reader, writer = await asyncio.open_connection(host, port)
+    _, body = await _request(reader, writer, '/slices')
+    slices = body['slices']
+    if not slices:
+        raise RuntimeError('the server has no models loaded')
+
+    rng = random.Random(seed)
+    # slice names hold spaces, '&' and '/' (ex. "('QUEENS', 'Noise - Street/Sidewalk')"), so the
+    # query is encoded
+    paths = ['/forecast?' + urlencode({'slice': rng.choice(slices), 'steps': rng.choice(steps),
+                                       'alpha': rng.choice(alphas)})
+             for _ in range(n_requests)]
+
+    latencies, failures = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*[_client(host, port, paths[i::concurrency], latencies, failures)
+                           for i in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    _, server_metrics = await _request(reader, writer, '/metrics')
+    writer.close()
+
+    latencies = np.array(latencies) * 1000
+    return {'requests': n_requests, 'failures': len(failures), 'concurrency': concurrency,
+            'seconds': round(elapsed, 3), 'requests_per_s': round(n_requests / elapsed, 1),
+            'p50_ms': round(float(np.percentile(latencies, 50)), 3),
+            'p99_ms': round(float(np.percentile(latencies, 99)), 3),
+            'max_ms': round(float(latencies.max()), 3),
+            'server': server_metrics}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test a running forecast server.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8311)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    args = parser.parse_args()
+
+    result = asyncio.run(load_test(args.host, args.port, args.requests, args.concurrency))
+    server = result.pop('server')
+    print(f"{result['requests']} requests ({result['failures']} failed) over {result['concurrency']} "
+          f"connections in {result['seconds']}s: {result['requests_per_s']} requests/s")
+    print(f"client latency p50 {result['p50_ms']}ms, p99 {result['p99_ms']}ms, max {result['max_ms']}ms")
+    print(f"server latency p50 {server['p50_ms']}ms, p99 {server['p99_ms']}ms, "
+          f"mean batch size {server['mean_batch_size']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,320 @@
+"""Local forecast server: loads the newest fitted model of every slice in a ModelRegistry at startup
+(SARIMAX results, or the slices of a GlobalLSTM) and answers forecast and confidence interval
+queries from memory over HTTP, micro-batching concurrent requests.
+
+    python forecast_server.py --registry ../models --port 8311
+
+    GET /forecast?slice=BROOKLYN/HPD&steps=7&alpha=.05
+    GET /slices
+    GET /metrics
+    GET /health
+
+'slice' is a slice name as the registry stores it, str(slice_key) (ex. "('BROOKLYN', 'HPD')",
+listed by /slices), or the parts of a tuple key joined with '/' (ex. BROOKLYN/HPD) when that is
+not ambiguous. Query values must be URL encoded.
+"""
+
+# import libraries
+import argparse
+import ast
+import asyncio
+import collections
+import json
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from nyc311.global_lstm import LSTMSlice, lstm_slice_forecast
+from nyc311.model_registry import (ForecastCache, ModelRegistry, cached_forecast, forecast_key,
+                                   sarimax_forecast)
+
+
+# forecast function for each kind of saved model; other kinds (ex. single series keras models, which
+# need their own input windows) can be added at startup
+FORECASTERS = {'sarimax': sarimax_forecast, 'global_lstm': lstm_slice_forecast}
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            500: 'Internal Server Error'}
+
+
+class ServerMetrics:
+    """request, error and batch counts and the latency of the last 'window' requests"""
+
+    def __init__(self, window=10000):
+        self.started = time.monotonic()
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.latencies = collections.deque(maxlen=window)
+
+    def record(self, latency, error=False):
+        self.requests += 1
+        self.errors += int(error)
+        self.latencies.append(latency)
+
+    def summary(self, cache=None):
+        """returns the metrics as a dictionary (latencies in milliseconds)"""
+        uptime = time.monotonic() - self.started
+        latencies = np.array(self.latencies) * 1000
+        p50, p99 = np.percentile(latencies, [50, 99]) if len(latencies) else (np.nan, np.nan)
+        row = {'uptime_s': round(uptime, 1), 'requests': self.requests, 'errors': self.errors,
+               'requests_per_s': round(self.requests / uptime, 1) if uptime else None,
+               'p50_ms': round(float(p50), 3), 'p99_ms': round(float(p99), 3),
+               'batches': self.batches,
+               'mean_batch_size': round(self.batched_requests / self.batches, 2) if self.batches else None}
+        if cache is not None:
+            row.update({'cache_size': len(cache), 'cache_hits': cache.hits, 'cache_misses': cache.misses})
+        return row
+
+
+class ForecastServer:
+    """holds the newest model of every slice in the registry at 'registry_root' and serves forecasts.
+       Forecast requests wait at most 'max_wait' seconds to be gathered into a micro-batch of up to
+       'max_batch' requests; a batch computes each distinct (slice, alpha) once, over at least
+       'horizon' steps, off the event loop, and every request is answered from that forecast."""
+
+    def __init__(self, registry_root, horizon=36, max_batch=64, max_wait=.002, forecasters=None,
+                 cache_size=1024, cache_ttl=3600):
+        self.registry = ModelRegistry(registry_root)
+        self.horizon = horizon
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.forecasters = dict(FORECASTERS, **(forecasters or {}))
+        self.cache = ForecastCache(max_size=cache_size, ttl=cache_ttl)
+        self.metrics = ServerMetrics()
+        self.models = {}
+        self.aliases = {}
+        self._queue = None
+        self._lists = {}
+
+    def load_models(self, warm=True):
+        """loads the newest model of every slice the server has a forecaster for (a GlobalLSTM
+           serves each of the slices it was trained on) and, with 'warm', computes its default
+           forecast so the first queries are answered from memory. Entries of other kinds are
+           reported and skipped."""
+        catalog = self.registry.catalog
+        skipped = collections.Counter(entry['kind'] for entry in catalog.values()
+                                      if entry['kind'] not in self.forecasters)
+        if skipped:
+            print('Skipped models without a forecaster: '
+                  + ', '.join(f'{n} {kind}' for kind, n in sorted(skipped.items())))
+
+        # the newest entry of every slice, without loading the models it replaces
+        newest = {}
+        for key in sorted((k for k in catalog if catalog[k]['kind'] in self.forecasters),
+                          key=lambda k: catalog[k]['saved']):
+            entry = catalog[key]
+            for name in entry.get('slices', [entry['slice']]):
+                newest[name] = key
+
+        for name, key in newest.items():
+            model, kind = self.registry.load(key), catalog[key]['kind']
+            if kind == 'global_lstm':
+                model = LSTMSlice(model, next(k for k in model.keys if str(k) == name))
+            self.models[name] = (model, self.forecasters[kind])
+
+        # BOROUGH/AGENCY style names for tuple slices, unless two slices would share one
+        aliases = collections.defaultdict(list)
+        for name in self.models:
+            try:
+                parts = ast.literal_eval(name)
+            except (ValueError, SyntaxError):
+                continue
+            if isinstance(parts, tuple):
+                aliases['/'.join(map(str, parts))].append(name)
+        self.aliases = {alias: names[0] for alias, names in aliases.items()
+                        if len(names) == 1 and alias not in self.models}
+
+        if warm:
+            for model, forecaster in self.models.values():
+                cached_forecast(model, self.horizon, .05, forecaster=forecaster, cache=self.cache)
+        return self.models
+
+    def _forecast_batch(self, jobs):
+        """computes the forecast of each distinct (slice, horizon, alpha) in a batch (run in a thread)"""
+        results = {}
+        for job in jobs:
+            slice_key, horizon, alpha = job
+            model, forecaster = self.models[slice_key]
+            try:
+                results[job] = cached_forecast(model, horizon, alpha, forecaster=forecaster, cache=self.cache)
+            except Exception as e:
+                results[job] = e
+        return results
+
+    async def _batcher(self):
+        """gathers queued requests into micro-batches and resolves their futures"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            self.metrics.batches += 1
+            self.metrics.batched_requests += len(batch)
+
+            try:
+                # every job already in the cache is answered without leaving the event loop
+                jobs = {job for job, _ in batch}
+                results = {}
+                for job in jobs:
+                    model, forecaster = self.models[job[0]]
+                    cached = self.cache.get(forecast_key(model, job[1], job[2], forecaster))
+                    if cached is not None:
+                        self.cache.hits += 1
+                        results[job] = cached
+                missing = [job for job in jobs if job not in results]
+                if missing:
+                    results.update(await loop.run_in_executor(None, self._forecast_batch, missing))
+            except Exception as e:
+                results = {job: e for job, _ in batch}
+
+            for job, future in batch:
+                if not future.done():
+                    future.set_result(self._as_lists(job, results[job]))
+
+    def _as_lists(self, job, forecast):
+        """returns a forecast as rounded lists, converted once per forecast and sliced per request"""
+        if isinstance(forecast, Exception):
+            return forecast
+        cached = self._lists.get(job)
+        if cached is None or cached[0] is not forecast:
+            cached = (forecast, {'date': [str(d) for d in forecast.index],
+                                 'mean': forecast['mean'].round(4).tolist(),
+                                 'lower': forecast['lower'].round(4).tolist(),
+                                 'upper': forecast['upper'].round(4).tolist()})
+            if len(self._lists) >= self.cache.max_size:
+                self._lists.clear()
+            self._lists[job] = cached
+        return cached[1]
+
+    async def forecast(self, slice_key, steps=7, alpha=.05):
+        """returns the forecast of a slice as a dictionary of date, mean, lower and upper lists"""
+        slice_key = self.aliases.get(slice_key, slice_key)
+        if slice_key not in self.models:
+            raise KeyError(slice_key)
+        job = (slice_key, max(int(steps), self.horizon), float(alpha))
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((job, future))
+        result = await future
+        if isinstance(result, Exception):
+            raise result
+
+        steps = int(steps)
+        return {'slice': slice_key, 'steps': steps, 'alpha': float(alpha),
+                **{name: values[:steps] for name, values in result.items()}}
+
+    async def _route(self, method, target):
+        """returns (status, body) for one request"""
+        if method != 'GET':
+            return 405, {'error': 'only GET is supported'}
+        url = urlsplit(target)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+        if url.path == '/forecast':
+            if 'slice' not in query:
+                return 400, {'error': "missing 'slice'"}
+            try:
+                steps, alpha = int(query.get('steps', 7)), float(query.get('alpha', .05))
+            except ValueError:
+                return 400, {'error': "'steps' must be an integer and 'alpha' a number"}
+            if steps < 1 or not 0 < alpha < 1:
+                return 400, {'error': "'steps' must be positive and 'alpha' between 0 and 1"}
+            try:
+                return 200, await self.forecast(query['slice'], steps, alpha)
+            except KeyError:
+                return 404, {'error': f"no model for slice {query['slice']!r}"}
+        if url.path == '/slices':
+            return 200, {'slices': sorted(self.models)}
+        if url.path == '/metrics':
+            return 200, self.metrics.summary(cache=self.cache)
+        if url.path == '/health':
+            return 200, {'status': 'ok', 'models': len(self.models)}
+        return 404, {'error': f'unknown path {url.path}'}
+
+    async def _handle(self, reader, writer):
+        """serves the requests of one (keep-alive) connection"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                start = time.perf_counter()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                if int(headers.get('content-length', 0)):
+                    await reader.readexactly(int(headers['content-length']))
+
+                try:
+                    method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                    status, body = await self._route(method, target)
+                except ValueError:
+                    status, body = 400, {'error': 'malformed request line'}
+                except Exception as e:
+                    status, body = 500, {'error': f'{type(e).__name__}: {e}'}
+
+                payload = json.dumps(body).encode()
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                writer.write(f'HTTP/1.1 {status} {_REASONS[status]}\r\n'
+                             f'Content-Type: application/json\r\n'
+                             f'Content-Length: {len(payload)}\r\n'
+                             f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode()
+                             + payload)
+                await writer.drain()
+                self.metrics.record(time.perf_counter() - start, error=status >= 500)
+                if not keep_alive:
+                    break
+        except (ConnectionResetError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8311):
+        """loads the models and serves until cancelled"""
+        self._queue = asyncio.Queue()
+        if not self.models:
+            await asyncio.get_running_loop().run_in_executor(None, self.load_models)
+        batcher = asyncio.create_task(self._batcher())
+        server = await asyncio.start_server(self._handle, host, port)
+        print(f'Serving {len(self.models)} models on http://{host}:{port}')
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve forecasts from a model registry.')
+    parser.add_argument('--registry', required=True, help='root folder of the ModelRegistry')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8311)
+    parser.add_argument('--horizon', type=int, default=36, help='steps computed per forecast')
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--max-wait-ms', type=float, default=2)
+    args = parser.parse_args()
+
+    server = ForecastServer(args.registry, horizon=args.horizon, max_batch=args.max_batch,
+                            max_wait=args.max_wait_ms / 1000)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
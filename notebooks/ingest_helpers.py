@@ -0,0 +1,184 @@
+# import libraries
+import sys
+import time
+
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from nyc311.cleaning import DATE_FORMAT
+
+
+# columns from the 311 export stored as categoricals
+CATEGORY_COLS = ['Agency', 'Complaint Type', 'Borough', 'Incident Zip']
+
+# columns parsed as datetimes with DATE_FORMAT
+DATE_COLS = ['Created Date', 'Closed Date']
+
+# columns parsed as numbers
+NUMERIC_COLS = ['Latitude', 'Longitude']
+
+
+#############################
+# STREAMING INGEST FUNCTIONS #
+#############################
+
+def clean_zip(zips):
+    """takes a series of raw incident zips and returns them as 5 digit strings,
+       with anything that is not a 5 digit zip (ex. 'N/A', '0', '1000') set to NaN"""
+    zips = zips.astype('string').str.strip().str[:5]
+    return zips.where(zips.str.fullmatch(r'\d{5}').fillna(False).astype(bool))
+
+
+def clean_chunk(chunk, category_cols=CATEGORY_COLS, date_cols=DATE_COLS):
+    """takes a raw chunk of the 311 export and parses the date columns with DATE_FORMAT and the
+       coordinates as numbers, cleans the incident zip, drops rows without a created date or with
+       a closed date before the created date (when those columns were read) and converts
+       'category_cols' to categoricals. Returns the cleaned chunk."""
+
+    # parse dates with the fixed export format, anything unparseable becomes NaT
+    for col in date_cols:
+        if col in chunk.columns:
+            chunk[col] = pd.to_datetime(chunk[col], format=DATE_FORMAT, errors='coerce')
+
+    for col in NUMERIC_COLS:
+        if col in chunk.columns:
+            chunk[col] = pd.to_numeric(chunk[col], errors='coerce')
+
+    # drop rows that can not be placed in time or that closed before they were created
+    # (only when the created date was read, ex. not with a 'usecols' that leaves it out)
+    if 'Created Date' in chunk.columns:
+        valid = chunk['Created Date'].notna()
+        if 'Closed Date' in chunk.columns:
+            valid &= ~(chunk['Closed Date'] < chunk['Created Date'])
+        chunk = chunk[valid].copy()
+
+    if 'Incident Zip' in chunk.columns:
+        chunk = chunk.assign(**{'Incident Zip': clean_zip(chunk['Incident Zip'])})
+
+    # store repeated strings once per chunk
+    for col in category_cols:
+        if col in chunk.columns:
+            chunk[col] = chunk[col].astype('category')
+
+    return chunk
+
+
+def _unify_categories(chunk, categories):
+    """takes a cleaned chunk and a dictionary of category lists seen so far, appends any new
+       values to the lists and recodes the chunk against them so every chunk shares one set of
+       categories and can be concatenated without falling back to object strings"""
+    for col, seen in categories.items():
+        if col in chunk.columns:
+            new = chunk[col].cat.categories.difference(seen, sort=False)
+            seen.extend(new)
+            chunk[col] = chunk[col].cat.set_categories(seen)
+    return chunk
+
+
+def stream_311_csv(path, chunksize=500000, usecols=None, category_cols=CATEGORY_COLS):
+    """takes the path to a 311 csv export and yields cleaned chunks of at most 'chunksize' rows
+       (see clean_chunk). Only 'usecols' (default = every column) are read. Every chunk shares
+       the same categories, which only grow as new values are seen, so chunks can be
+       concatenated or written out as they arrive while memory stays bounded by one chunk."""
+
+    # read everything as strings so no column needs type inference across chunks
+    reader = pd.read_csv(path, chunksize=chunksize, usecols=usecols, dtype=str)
+    categories = {col: [] for col in category_cols}
+
+    for chunk in reader:
+        chunk = clean_chunk(chunk, category_cols=category_cols)
+        yield _unify_categories(chunk, categories)
+
+
+def ingest_311_csv(path, chunksize=500000, usecols=None, sink=None, show=False):
+    """takes the path to a 311 csv export and streams it through stream_311_csv. If 'sink' is a
+       function each cleaned chunk is passed to it and discarded, keeping memory bounded by one
+       chunk, and the number of rows kept is returned. Otherwise the chunks are combined and the
+       cleaned dataframe is returned. 'show' prints progress after each chunk."""
+
+    chunks = []
+    n_rows = 0
+    start = time.perf_counter()
+
+    for i, chunk in enumerate(stream_311_csv(path, chunksize=chunksize, usecols=usecols)):
+        n_rows += len(chunk)
+        if sink is not None:
+            sink(chunk)
+        else:
+            chunks.append(chunk)
+        if show == True:
+            print(f'chunk {i + 1}: {n_rows} rows kept after {round(time.perf_counter() - start, 1)}s')
+
+    if sink is not None:
+        return n_rows
+
+    # recode every chunk against the final categories so concat keeps them categorical
+    if not chunks:
+        return pd.DataFrame()
+    for col in CATEGORY_COLS:
+        if col in chunks[-1].columns:
+            final = chunks[-1][col].cat.categories
+            for c in chunks:
+                c[col] = c[col].cat.set_categories(final)
+    return pd.concat(chunks, ignore_index=True)
+
+
+#####################
+# INGEST BENCHMARKS #
+#####################
+
+def _peak_rss_mb():
+    """returns the peak resident memory of this process in MB (None when it can not be measured)"""
+    try:
+        # unix only
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        # windows reports the peak working set in bytes
+        return getattr(psutil.Process().memory_info(), 'peak_wset', 0) / 1024 ** 2 or None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macOS reports bytes
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def _full_load(path, usecols=None):
+    """worker function: loads and converts the whole export at once the way the cleaning notebook
+       does, returning (rows, wall time, peak rss in MB)"""
+    start = time.perf_counter()
+    df = pd.read_csv(path, usecols=usecols, low_memory=False)
+    for col in DATE_COLS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], format=DATE_FORMAT, errors='coerce')
+    return len(df), time.perf_counter() - start, _peak_rss_mb()
+
+
+def _streaming_load(path, chunksize=500000, usecols=None):
+    """worker function: streams the export through ingest_311_csv without keeping the chunks,
+       returning (rows, wall time, peak rss in MB)"""
+    start = time.perf_counter()
+    n_rows = ingest_311_csv(path, chunksize=chunksize, usecols=usecols, sink=lambda chunk: None)
+    return n_rows, time.perf_counter() - start, _peak_rss_mb()
+
+
+def benchmark_ingest(path, chunksize=500000, usecols=None):
+    """takes the path to a 311 csv export and compares a full load against the streaming ingest.
+       Each method runs in its own fresh process so peak memory is measured independently.
+       Returns a dataframe of 'method', 'rows', 'wall_time' and 'peak_rss_mb'."""
+
+    results = []
+    runs = [('full load', _full_load, (path, usecols)),
+            ('streaming', _streaming_load, (path, chunksize, usecols))]
+
+    for name, func, args in runs:
+        # a new spawned process per run so one run's peak does not hide the other's
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+            rows, wall_time, peak = pool.submit(func, *args).result()
+        results.append({'method': name, 'rows': rows, 'wall_time': wall_time, 'peak_rss_mb': peak})
+
+    return pd.DataFrame(results)
@@ -0,0 +1,290 @@
+# import libraries
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from zip_geocoder import ZCTA_PATH, require_shapely
+
+
+# simplification tolerance (in degrees) for each zoom level, and the map zoom each level starts at
+ZOOM_LEVELS = {'low': {'tolerance': .001, 'min_zoom': 0},
+               'mid': {'tolerance': .0003, 'min_zoom': 11},
+               'high': {'tolerance': .0001, 'min_zoom': 13}}
+
+# coordinates are snapped to a grid of this many steps across the bounds of the polygons
+QUANTIZATION = 100000
+
+
+##############################
+# TOPOLOGY BUILD FUNCTIONS #
+##############################
+
+def _rings(geometry):
+    """yields (polygon index, ring) pairs of a GeoJSON Polygon or MultiPolygon, where each ring is
+       an open list of coordinates (the closing point dropped)"""
+    polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+    for p, polygon in enumerate(polygons):
+        for ring in polygon:
+            yield p, [tuple(c) for c in ring[:-1]]
+
+
+def _quantize(ring, x0, y0, kx, ky):
+    """snaps a ring to the integer grid and drops repeated points"""
+    snapped = [(int(round((x - x0) / kx)), int(round((y - y0) / ky))) for x, y in ring]
+    return [pt for i, pt in enumerate(snapped) if pt != snapped[i - 1]] or snapped[:1]
+
+
+def _junctions(rings):
+    """returns the points where borders meet: points whose neighbours are not the same in every
+       ring that uses them"""
+    neighbours = {}
+    for ring in rings:
+        n = len(ring)
+        for i, pt in enumerate(ring):
+            pair = frozenset((ring[i - 1], ring[(i + 1) % n]))
+            neighbours.setdefault(pt, set()).add(pair)
+    return {pt for pt, pairs in neighbours.items() if len(pairs) > 1}
+
+
+def _cut_ring(ring, junctions):
+    """splits a ring into arcs that start and end at junctions. A ring without junctions is one
+       closed arc, rotated to start at its smallest point so identical rings match."""
+    cuts = [i for i, pt in enumerate(ring) if pt in junctions]
+    if not cuts:
+        start = ring.index(min(ring))
+        ring = ring[start:] + ring[:start]
+        return [ring + [ring[0]]]
+
+    ring = ring[cuts[0]:] + ring[:cuts[0]]
+    cuts = [c - cuts[0] for c in cuts] + [len(ring)]
+    closed = ring + [ring[0]]
+    return [closed[a:b + 1] for a, b in zip(cuts[:-1], cuts[1:])]
+
+
+def build_topology(path=ZCTA_PATH, quantization=QUANTIZATION):
+    """takes the path to the ZCTA GeoJSON and returns its topology: the quantized arcs shared
+       between neighbouring polygons (each border stored once), each polygon as lists of signed
+       arc indices (~i for arc i reversed), the quantization transform and each feature's
+       properties"""
+
+    with open(path) as f:
+        features = json.load(f)['features']
+
+    # quantization transform over the bounds of every coordinate
+    coords = np.array([c for feature in features for _, ring in _rings(feature['geometry'])
+                       for c in ring])
+    x0, y0 = coords.min(axis=0)
+    kx, ky = (coords.max(axis=0) - coords.min(axis=0)) / (quantization - 1)
+
+    # quantized rings of every feature, grouped by polygon
+    feature_rings = []
+    for feature in features:
+        rings = [(p, _quantize(ring, x0, y0, kx, ky)) for p, ring in _rings(feature['geometry'])]
+        feature_rings.append([(p, ring) for p, ring in rings if len(ring) >= 3])
+
+    junctions = _junctions([ring for rings in feature_rings for _, ring in rings])
+
+    # cut every ring into arcs and keep each distinct arc once
+    arcs, arc_ids = [], {}
+    geometries = []
+    for feature, rings in zip(features, feature_rings):
+        polygons = {}
+        for p, ring in rings:
+            ring_arcs = []
+            for arc in _cut_ring(ring, junctions):
+                key, reverse_key = tuple(arc), tuple(reversed(arc))
+                if key in arc_ids:
+                    ring_arcs.append(arc_ids[key])
+                elif reverse_key in arc_ids:
+                    ring_arcs.append(~arc_ids[reverse_key])
+                else:
+                    arc_ids[key] = len(arcs)
+                    arcs.append(np.array(arc))
+                    ring_arcs.append(arc_ids[key])
+            polygons.setdefault(p, []).append(ring_arcs)
+        geometries.append({'type': 'MultiPolygon', 'arcs': [polygons[p] for p in sorted(polygons)],
+                           'properties': feature['properties']})
+
+    return {'arcs': arcs, 'geometries': geometries,
+            'transform': {'scale': [kx, ky], 'translate': [x0, y0]}}
+
+
+def _ring_coords(arcs, arc_ids):
+    """joins signed arc indices into the coordinates of one ring"""
+    parts = [arcs[i] if i >= 0 else arcs[~i][::-1] for i in arc_ids]
+    return np.concatenate([parts[0]] + [part[1:] for part in parts[1:]])
+
+
+def _polygons(topology, arcs):
+    """returns every geometry of a topology as a shapely MultiPolygon built from 'arcs'"""
+    shapely = require_shapely()
+    return np.array([shapely.MultiPolygon([shapely.Polygon(_ring_coords(arcs, rings[0]),
+                                                           [_ring_coords(arcs, r) for r in rings[1:]])
+                                           for rings in g['arcs']])
+                     for g in topology['geometries']])
+
+
+def simplify_arcs(topology, tolerance, max_repairs=5):
+    """takes a topology from build_topology and a tolerance in degrees and returns its arcs
+       simplified with Douglas-Peucker. Arc end points (junctions) never move and each shared border
+       is simplified once, so neighbouring polygons stay gap and overlap free. The arcs of any polygon
+       the simplification made invalid are put back at full detail (up to 'max_repairs' passes)."""
+    shapely = require_shapely()
+    kx, ky = topology['transform']['scale']
+
+    # simplify every arc at once, in grid units scaled to the tolerance
+    lines = np.array([shapely.linestrings(arc * [kx / ky, 1]) for arc in topology['arcs']])
+    simplified = shapely.simplify(lines, tolerance / ky, preserve_topology=False)
+
+    arcs = []
+    for arc, line in zip(topology['arcs'], simplified):
+        points = shapely.get_coordinates(line) / [kx / ky, 1]
+        points = np.round(points).astype('int64')
+        # closed arcs need enough points to stay a ring
+        if np.array_equal(arc[0], arc[-1]) and len(points) < 4:
+            points = arc[np.linspace(0, len(arc) - 1, min(len(arc), 4)).astype(int)]
+        arcs.append(points)
+
+    # restore the borders of polygons that now cross themselves or a hole
+    for _ in range(max_repairs):
+        invalid = np.flatnonzero(~shapely.is_valid(_polygons(topology, arcs)))
+        if len(invalid) == 0:
+            break
+        for g in invalid:
+            for rings in topology['geometries'][g]['arcs']:
+                for arc_ids in rings:
+                    for i in arc_ids:
+                        i = i if i >= 0 else ~i
+                        arcs[i] = topology['arcs'][i]
+    return arcs
+
+
+def to_topojson(topology, arcs, object_name='zcta', properties=['postalcode', 'po_name', 'borough']):
+    """takes a topology, its (simplified) arcs and the feature properties to keep and returns a
+       compact TopoJSON dictionary with delta encoded arcs"""
+    return {'type': 'Topology',
+            'transform': topology['transform'],
+            'objects': {object_name: {'type': 'GeometryCollection',
+                                      'geometries': [{'type': g['type'], 'arcs': g['arcs'],
+                                                      'properties': {k: g['properties'].get(k)
+                                                                     for k in properties}}
+                                                     for g in topology['geometries']]}},
+            'arcs': [np.concatenate([arc[:1], np.diff(arc, axis=0)]).tolist() for arc in arcs]}
+
+
+def build_zoom_tiles(path=ZCTA_PATH, cache_dir=None, levels=ZOOM_LEVELS):
+    """takes the path to the ZCTA GeoJSON and writes one simplified TopoJSON file per zoom level
+       (ex. 'zcta_low.topojson') to 'cache_dir' (default = a 'map_cache' folder next to the GeoJSON).
+       Files newer than the GeoJSON are reused, so the geometry is only processed once.
+       Returns a dictionary of level: file path."""
+
+    cache_dir = os.path.join(os.path.dirname(path), 'map_cache') if cache_dir is None else cache_dir
+    os.makedirs(cache_dir, exist_ok=True)
+    paths = {level: os.path.join(cache_dir, f'zcta_{level}.topojson') for level in levels}
+
+    # rebuild only when a level is missing or older than the source
+    source_mtime = os.path.getmtime(path)
+    if all(os.path.exists(p) and os.path.getmtime(p) >= source_mtime for p in paths.values()):
+        return paths
+
+    topology = build_topology(path)
+    for level, settings in levels.items():
+        arcs = simplify_arcs(topology, settings['tolerance'])
+        with open(paths[level], 'w') as f:
+            json.dump(to_topojson(topology, arcs), f, separators=(',', ':'))
+
+    return paths
+
+
+###############################
+# CHOROPLETH RENDER FUNCTIONS #
+###############################
+
+# categorical colors (the palette of the original top complaint map) and a sequential ramp
+CATEGORY_COLORS = ['#8dd3c7', '#ffffb3', '#bebada', '#fb8072', '#80b1d3', '#fdb462',
+                   '#b3de69', '#fccde5', '#d9d9d9', '#bc80bd', '#ccebc5', '#ffed6f']
+SEQUENTIAL_COLORS = ['#ffffcc', '#c7e9b4', '#7fcdbb', '#41b6c4', '#2c7fb8', '#253494']
+
+_HTML = '''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/leaflet@1.5.1/dist/leaflet.css"/>
+<script src="https://cdn.jsdelivr.net/npm/leaflet@1.5.1/dist/leaflet.js"></script>
+<script src="https://cdn.jsdelivr.net/npm/topojson-client@3"></script>
+<style>html,body,#map{{width:100%;height:100%;margin:0}}
+.legend{{background:#fff;padding:6px;font:12px sans-serif}}.legend i{{display:inline-block;width:12px;height:12px;margin-right:4px}}</style>
+</head><body><div id="map"></div><script>
+var levels={levels},metric={metric},colors={colors},name={name};
+var map=L.map('map').setView([40.7,-73.95],10),layer=null,current=null,cache={{}};
+L.tileLayer('https://{{s}}.tile.openstreetmap.org/{{z}}/{{x}}/{{y}}.png',{{attribution:'&copy; OpenStreetMap'}}).addTo(map);
+function color(v){{return v in colors?colors[v]:(v==null?'#eeeeee':colors._ramp(v));}}
+colors._ramp=function(v){{var b=colors._breaks,c=colors._seq;for(var i=0;i<b.length;i++)if(v<=b[i])return c[i];return c[c.length-1];}};
+function draw(topo){{var fc=topojson.feature(topo,topo.objects.zcta);
+ if(layer)map.removeLayer(layer);
+ layer=L.geoJson(fc,{{style:function(f){{return{{fillColor:color(metric[f.properties.postalcode]),weight:.5,color:'#555',fillOpacity:.7}};}},
+  onEachFeature:function(f,l){{l.bindTooltip(f.properties.postalcode+': '+metric[f.properties.postalcode]);}}}}).addTo(map);}}
+function level(){{var z=map.getZoom(),best=null;for(var k in levels)if(z>=levels[k].min_zoom&&(!best||levels[k].min_zoom>=levels[best].min_zoom))best=k;return best;}}
+function update(){{var k=level();if(k===current)return;current=k;var src=levels[k].src;
+ if(typeof src!=='string'){{draw(src);return;}}
+ if(cache[k]){{draw(cache[k]);return;}}
+ fetch(src).then(function(r){{return r.json();}}).then(function(t){{cache[k]=t;if(current===k)draw(t);}});}}
+map.on('zoomend',update);update();
+var legend=L.control({{position:'bottomright'}});legend.onAdd=function(){{var d=L.DomUtil.create('div','legend');d.innerHTML='<b>'+name+'</b><br>'+{legend}.join('<br>');return d;}};legend.addTo(map);
+</script></body></html>'''
+
+
+def render_choropleth(metric, out_path, title=None, embed=True, level='mid', tile_paths=None):
+    """takes a per zip metric (a series indexed by zip code, numeric like call volume or categorical
+       like the top complaint type) and writes a Leaflet choropleth to 'out_path'. The cached zoom
+       tiles from build_zoom_tiles are joined to the metric in the browser, so a new metric map never
+       reprocesses the geometry. With 'embed' the TopoJSON of one zoom 'level' is written into the
+       page so it opens on its own; otherwise the page loads the level that fits the current zoom
+       from the tile files (relative to the page), keeping the HTML to the size of the metric.
+       Browsers block those loads from pages opened as file://, so an unembedded map has to be
+       served over HTTP (ex. python -m http.server from a folder that holds the page and tiles)."""
+
+    tile_paths = build_zoom_tiles() if tile_paths is None else tile_paths
+    metric = metric.dropna()
+    name = title or metric.name or 'value'
+
+    # categorical metrics get a palette, numeric ones a quantile ramp
+    if pd.api.types.is_numeric_dtype(metric):
+        breaks = list(np.quantile(metric, np.linspace(0, 1, len(SEQUENTIAL_COLORS) + 1)[1:]))
+        colors = {'_seq': SEQUENTIAL_COLORS, '_breaks': breaks}
+        legend = [f'<i style="background:{c}"></i>&le; {b:,.4g}' for c, b in zip(SEQUENTIAL_COLORS, breaks)]
+        values = {str(k): float(v) for k, v in metric.items()}
+    else:
+        categories = list(metric.value_counts().index)
+        colors = {c: CATEGORY_COLORS[i % len(CATEGORY_COLORS)] for i, c in enumerate(categories)}
+        colors.update({'_seq': SEQUENTIAL_COLORS, '_breaks': []})
+        legend = [f'<i style="background:{colors[c]}"></i>{c}' for c in categories]
+        values = {str(k): str(v) for k, v in metric.items()}
+
+    levels = {}
+    for key, settings in ZOOM_LEVELS.items():
+        if embed and key != level:
+            continue
+        if embed:
+            with open(tile_paths[key]) as f:
+                src = json.load(f)
+        else:
+            src = os.path.relpath(tile_paths[key], os.path.dirname(os.path.abspath(out_path)))
+        levels[key] = {'min_zoom': 0 if embed else settings['min_zoom'], 'src': src}
+
+    dumps = lambda obj: json.dumps(obj, separators=(',', ':'))
+    with open(out_path, 'w') as f:
+        f.write(_HTML.format(title=name, levels=dumps(levels), metric=dumps(values),
+                             colors=dumps(colors), name=dumps(name), legend=dumps(legend)))
+
+    return out_path
+
+
+def top_complaint_map(cube, out_path='top_complaint.html', where=None, **kwargs):
+    """takes rollup cube cells and writes the top complaint type by zip choropleth from the cached
+       zoom tiles (see render_choropleth for the keyword arguments)"""
+    from rollup_cube import top_by
+
+    top = top_by(cube, group='Incident Zip', item='Complaint Type', n=1, where=where)
+    metric = top.set_index('Incident Zip')['Complaint Type'].rename('Top Complaint')
+    return render_choropleth(metric, out_path, **kwargs)
@@ -0,0 +1,68 @@
+"""NYC 311 analysis helpers.
+
+    nyc311.cleaning     dataframe cleaning, profiling and memory helpers
+    nyc311.stats        hypothesis testing helpers
+    nyc311.timeseries   reshaping, stationarity and SARIMA modeling (no plotting)
+    nyc311.growth       vectorized growth rates and top-k ranking of wide or long frames
+    nyc311.plots        charts of the above
+    nyc311.report       headless batch rendering of per-series charts to files with an index page
+
+and the shared infrastructure the helpers and scripts are built on:
+
+    nyc311.instrumentation       per-call timing, peak memory and profiling
+    nyc311.parallel_helpers      process pools with per-task time limits
+    nyc311.model_registry        saved SARIMAX, keras and GlobalLSTM models and the forecast cache
+    nyc311.global_lstm           one LSTM trained on and forecasting many series at once
+    nyc311.sarima_search         parallel SARIMA grid search
+    nyc311.stationarity_screen   parallel, cached ADF screening of many series
+    nyc311.bootstrap_helpers     parallel bootstrap distributions
+    nyc311.data_access           SQLite reads and writes of the 311 table
+
+Submodules and the helpers below are imported on first use (ex. nyc311.get_time_series or
+nyc311.plots.plot_model), so 'import nyc311' is cheap and matplotlib, statsmodels and scipy are
+only loaded by the functions that need them.
+"""
+
+# import libraries
+import importlib
+
+_SUBMODULES = ['cleaning', 'stats', 'growth', 'timeseries', 'plots', 'report', 'instrumentation',
+               'parallel_helpers', 'model_registry', 'sarima_search', 'stationarity_screen',
+               'bootstrap_helpers', 'data_access', 'global_lstm']
+
+# helpers available as nyc311.<name>, by the submodule that defines them
+_HELPERS = {
+    'cleaning': ['DATE_FORMAT', 'null_rates', 'mostly_nan', 'drop_empty_cols', 'check_na',
+                 'datetime_converter', 'ColumnProfiler', 'profile_columns', 'column_plan',
+                 'apply_plan', 'memory_mb', 'downcast_columns', 'optimize_memory',
+                 'dependent_columns', 'split_dimension', 'join_dimension'],
+    'stats': ['get_table', 'inspect_dataframe', 'compare_2', 'compare_many', 'test_normality',
+              'test_variance', 'random_sample', 'cohen_d', 'check_null_hypothesis',
+              'bonferroni_alpha'],
+    'growth': ['GROWTH_HORIZONS', 'date_columns', 'to_matrix', 'growth_matrix', 'growth_table',
+               'top_k_positions', 'rank_growth', 'average_change'],
+    'timeseries': ['growth_rates', 'top_growth_cities', 'melt_data', 'YoY_change',
+                   'YoY_rate_o_change', 'melt_all', 'get_time_series', 'avg_YoY_change',
+                   'subtract_rollmean', 'subtract_w_rollmean', 'adf_test',
+                   'stationarity_transformer', 'all_stationarity', 'SARIMA_iterator',
+                   'SARIMA_modeler', 'expected_growth', 'ROI_calculator'],
+    'plots': ['plot_acf', 'plot_pacf', 'stacked_growth', 'graph_growth', 'plot_time_series',
+              'plot_time_series2', 'plot_avg_YoY', 'plot_rolling_stats', 'stationarity_check',
+              'model_details', 'plot_model', 'plot_forcast_model'],
+    'report': ['GROWTH_COLUMNS', 'report_charts', 'render_report'],
+}
+_HELPER_MODULES = {name: submodule for submodule, names in _HELPERS.items() for name in names}
+
+
+def __getattr__(name):
+    """imports a submodule, or the submodule that defines a helper, on first access. Any other
+       name raises AttributeError without importing anything."""
+    if name in _SUBMODULES:
+        return importlib.import_module(f'{__name__}.{name}')
+    if name in _HELPER_MODULES:
+        return getattr(importlib.import_module(f'{__name__}.{_HELPER_MODULES[name]}'), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(list(globals()) + _SUBMODULES + list(_HELPER_MODULES))
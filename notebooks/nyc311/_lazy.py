@@ -0,0 +1,52 @@
+# import libraries
+import importlib
+import os
+import sys
+
+
+class LazyModule:
+    """stands in for a heavy module (ex. statsmodels.api) and imports it on first attribute access,
+       so importing a helper module does not pay for dependencies the caller never uses.
+       'loader' replaces the plain import (ex. to pick a matplotlib backend first)."""
+
+    def __init__(self, name, loader=None):
+        self._name = name
+        self._loader = loader
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = self._loader() if self._loader else importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f'<lazy module {self._name!r} ({state})>'
+
+
+def lazy_module(name, loader=None):
+    """returns the module if it is already imported, otherwise a LazyModule for it"""
+    return sys.modules[name] if name in sys.modules else LazyModule(name, loader=loader)
+
+
+def is_headless():
+    """True when figures can not be shown on screen: no display on Linux and not running inside
+       IPython/Jupyter, and no backend chosen with MPLBACKEND"""
+    if os.environ.get('MPLBACKEND'):
+        return False
+    if 'IPython' in sys.modules and getattr(sys.modules['IPython'], 'get_ipython', lambda: None)() is not None:
+        return False
+    return sys.platform.startswith('linux') and not (os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+
+
+def pyplot():
+    """imports and returns matplotlib.pyplot, switching to the non-interactive Agg backend first
+       when running headless (ex. in a batch job or a worker process)"""
+    if 'matplotlib.pyplot' not in sys.modules and is_headless():
+        import matplotlib
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
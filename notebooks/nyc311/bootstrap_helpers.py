@@ -0,0 +1,114 @@
+# import libraries
+import time
+
+import numpy as np
+import pandas as pd
+
+from nyc311.parallel_helpers import pool_map
+
+
+# the most values held in memory for one block of resamples (~128MB of float64)
+MAX_BLOCK_ELEMENTS = 2 ** 24
+
+
+##############################
+# VECTORIZED BOOTSTRAP ENGINE #
+##############################
+
+def _resample_block(task):
+    """worker function: draws task['rows'] resamples of task['resample_size'] values with replacement
+       as one matrix and returns a dictionary with the mean and/or median of each resample"""
+    rng = np.random.default_rng(task['seed'])
+    data = task['data']
+
+    # one index matrix per block: every row is a resample
+    sample = data[rng.integers(0, len(data), size=(task['rows'], task['resample_size']))]
+
+    stats = {}
+    if 'mean' in task['stats']:
+        stats['mean'] = sample.mean(axis=1)
+    if 'median' in task['stats']:
+        stats['median'] = np.median(sample, axis=1)
+    return stats
+
+
+def bootstrap_distribution(data, n_resamples=10000, resample_size=None, stats=['mean', 'median'],
+                           seed=None, n_jobs=1, max_block_elements=MAX_BLOCK_ELEMENTS):
+    """takes an array of data and returns a dictionary with the sampling distribution (an array of
+       'n_resamples' values) of each statistic in 'stats'. Each resample draws 'resample_size' values
+       with replacement (default = the size of the data). Resamples are drawn as index matrices in
+       blocks of at most 'max_block_elements' values so memory stays bounded. Each block has its own
+       seed spawned from 'seed', so results are the same for any number of workers 'n_jobs'."""
+
+    data = np.asarray(data, dtype='float64')
+    data = data[~np.isnan(data)]
+    resample_size = len(data) if resample_size is None else int(resample_size)
+
+    # split the resamples into blocks that fit the memory budget
+    rows_per_block = max(1, max_block_elements // resample_size)
+    n_blocks = -(-int(n_resamples) // rows_per_block)
+    seeds = np.random.SeedSequence(seed).spawn(n_blocks)
+
+    tasks = []
+    for i in range(n_blocks):
+        rows = min(rows_per_block, int(n_resamples) - i * rows_per_block)
+        tasks.append({'data': data, 'rows': rows, 'resample_size': resample_size,
+                      'stats': stats, 'seed': seeds[i]})
+
+    blocks = pool_map(_resample_block, tasks, n_jobs=n_jobs)
+    return {s: np.concatenate([b[s] for b in blocks]) for s in stats}
+
+
+def bootstrap(data, n_resamples=10000, resample_size=None, stats=['mean', 'median'], ci=.95,
+              seed=None, n_jobs=1):
+    """takes an array of data and returns a dataframe with one row per statistic in 'stats' and the
+       statistic of the data, the mean and standard error of its bootstrap distribution and the
+       percentile confidence interval at level 'ci' (default = .95).
+       See bootstrap_distribution for the other arguments."""
+
+    distributions = bootstrap_distribution(data, n_resamples=n_resamples, resample_size=resample_size,
+                                           stats=stats, seed=seed, n_jobs=n_jobs)
+
+    data = np.asarray(data, dtype='float64')
+    tail = (1 - ci) / 2 * 100
+    rows = []
+    for s, dist in distributions.items():
+        lower, upper = np.percentile(dist, [tail, 100 - tail])
+        rows.append({'statistic': s,
+                     'observed': getattr(np, 'nan' + s)(data),
+                     'boot_mean': dist.mean(),
+                     'std_error': dist.std(ddof=1),
+                     'ci_lower': lower,
+                     'ci_upper': upper})
+
+    return pd.DataFrame(rows).set_index('statistic')
+
+
+def benchmark_bootstrap(data, n_resamples=[10 ** 4, 10 ** 5, 10 ** 6], resample_size=30,
+                        n_jobs=None, loop_limit=10 ** 5):
+    """takes an array of data and times the Python loop used by the old random_sample against the
+       vectorized engine (in one process and in 'n_jobs' processes) for each number of resamples.
+       The loop is skipped above 'loop_limit' resamples. Returns a dataframe of wall times."""
+
+    data = np.asarray(data, dtype='float64')
+    timings = []
+    for n in n_resamples:
+        row = {'n_resamples': n, 'loop': np.nan}
+
+        # the loop random_sample used to run
+        if n <= loop_limit:
+            start = time.perf_counter()
+            [np.random.choice(data, size=resample_size).mean() for i in range(n)]
+            row['loop'] = time.perf_counter() - start
+
+        for name, jobs in [('vectorized', 1), ('parallel', n_jobs)]:
+            start = time.perf_counter()
+            bootstrap_distribution(data, n_resamples=n, resample_size=resample_size,
+                                   stats=['mean'], seed=0, n_jobs=jobs)
+            row[name] = time.perf_counter() - start
+
+        timings.append(row)
+
+    bench = pd.DataFrame(timings)
+    bench['speedup'] = bench['loop'] / bench['vectorized']
+    return bench
@@ -0,0 +1,230 @@
+# import libraries
+import pandas as pd
+
+from nyc311.instrumentation import instrument_module
+
+# timestamp format used by the NYC 311 export
+DATE_FORMAT = '%m/%d/%Y %I:%M:%S %p'
+
+
+def null_rates(df):
+    """returns the share of missing values in every column, computed in one pass"""
+    return df.isna().mean()
+
+
+def mostly_nan(df):
+    rates = null_rates(df)
+    return list(rates[rates > .5].index)
+
+
+def drop_empty_cols(df, percent_nan=.75):
+    rates = null_rates(df)
+    mostly_nans = list(rates[rates > percent_nan].index)
+
+    df.drop(columns=mostly_nans, inplace=True)
+
+    return df
+
+def check_na(df):
+    rates = null_rates(df)
+    for col in df.columns:
+        proportion = pd.Series({True: rates[col], False: 1 - rates[col]}, name='proportion')
+        print(col, ': \n', proportion[proportion > 0].sort_values(ascending=False))
+        print('-----'*5, '\n')
+
+
+def datetime_converter(df, col):
+    df[col] = pd.to_datetime(df[col], format=DATE_FORMAT)
+
+    return df
+
+
+###########################
+# COLUMN PROFILE FUNCTIONS #
+###########################
+
+class ColumnProfiler:
+    """accumulates a profile of every column over one or more chunks (ex. from stream_311_csv):
+       rows, missing values, distinct values (tracked up to 'max_distinct' per column, after
+       which the column is marked high cardinality), dtype and memory footprint"""
+
+    def __init__(self, max_distinct=1000):
+        self.max_distinct = max_distinct
+        self.rows = 0
+        self.nulls = None
+        self.memory = None
+        self.dtypes = {}
+        self.distinct = {}
+
+    def update(self, chunk):
+        """adds a chunk to the profile"""
+
+        # null counts and memory for every column at once
+        nulls = chunk.isna().sum()
+        memory = chunk.memory_usage(index=False, deep=True)
+        self.nulls = nulls if self.nulls is None else self.nulls.add(nulls, fill_value=0)
+        self.memory = memory if self.memory is None else self.memory.add(memory, fill_value=0)
+        self.rows += len(chunk)
+
+        for col in chunk.columns:
+            self.dtypes[col] = chunk[col].dtype
+
+            # stop tracking distinct values once a column has too many to be a category. A chunk
+            # is checked before its values are stored, so the set never holds more than twice
+            # 'max_distinct' values, however many a high cardinality column has.
+            seen = self.distinct.setdefault(col, set())
+            if seen is None:
+                continue
+            values = chunk[col].dropna().unique()
+            if len(values) > self.max_distinct:
+                self.distinct[col] = None
+                continue
+            seen.update(values)
+            if len(seen) > self.max_distinct:
+                self.distinct[col] = None
+
+        return self
+
+    def profile(self):
+        """returns a dataframe with one row per column: 'dtype', 'rows', 'null_rate',
+           'cardinality' (NaN when above max_distinct) and 'memory_mb'"""
+        cols = list(self.dtypes)
+        return pd.DataFrame({'dtype': [str(self.dtypes[c]) for c in cols],
+                             'rows': self.rows,
+                             'null_rate': [self.nulls[c] / self.rows if self.rows else float('nan')
+                                           for c in cols],
+                             'cardinality': [len(self.distinct[c]) if self.distinct[c] is not None
+                                             else float('nan') for c in cols],
+                             'memory_mb': [self.memory[c] / 1024 ** 2 for c in cols]},
+                            index=pd.Index(cols, name='column'))
+
+
+def profile_columns(df, max_distinct=1000):
+    """returns the ColumnProfiler profile of a whole dataframe"""
+    return ColumnProfiler(max_distinct=max_distinct).update(df).profile()
+
+
+def column_plan(profile, percent_nan=.75, max_categories=1000, max_category_ratio=.5):
+    """takes a column profile and returns a plan: a dictionary with the columns to 'drop'
+       (more than 'percent_nan' missing) and the text columns to convert to 'category'
+       (at most 'max_categories' distinct values, and no more than 'max_category_ratio'
+       distinct values per row)"""
+
+    drop = profile.index[profile['null_rate'] > percent_nan]
+    kept = profile.drop(index=drop)
+
+    is_text = kept['dtype'].isin(['object', 'string', 'str']) | kept['dtype'].str.startswith('string')
+    few_values = (kept['cardinality'] <= max_categories) & \
+                 (kept['cardinality'] <= max_category_ratio * kept['rows'])
+    category = kept.index[is_text & few_values]
+
+    return {'drop': list(drop), 'category': list(category)}
+
+
+def apply_plan(df, plan):
+    """applies a plan from column_plan to a dataframe in place: drops the 'drop' columns and
+       converts the 'category' columns one at a time, without copying the rest of the frame"""
+
+    df.drop(columns=[c for c in plan.get('drop', []) if c in df.columns], inplace=True)
+    for col in plan.get('category', []):
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+
+    return df
+
+
+#############################
+# MEMORY OPTIMIZER FUNCTIONS #
+#############################
+
+def memory_mb(df):
+    """returns the memory footprint of a dataframe in MB, counting the contents of strings"""
+    return df.memory_usage(index=True, deep=True).sum() / 1024 ** 2
+
+
+def downcast_columns(df):
+    """downcasts every integer column to the smallest type that holds its values and float
+       columns to float32 when no value changes, in place, one column at a time. Datetime columns
+       are left alone: they take 8 bytes at any resolution."""
+
+    for col in df.select_dtypes(include='integer').columns:
+        df[col] = pd.to_numeric(df[col], downcast='integer' if df[col].min() < 0 else 'unsigned')
+    for col in df.select_dtypes(include='floating').columns:
+        small = pd.to_numeric(df[col], downcast='float')
+        if (small.astype(df[col].dtype) == df[col])[df[col].notna()].all():
+            df[col] = small
+
+    return df
+
+
+def optimize_memory(df, max_categories=1000, max_category_ratio=.5, show=True):
+    """takes a dataframe and reduces its memory in place: text columns with few distinct values
+       (see column_plan) become categoricals and numeric columns are downcast
+       (see downcast_columns). Returns the dataframe and a report of each column's dtype and
+       memory before and after. 'show' prints the total memory before and after."""
+
+    before_types = df.dtypes.astype(str)
+    before = df.memory_usage(index=False, deep=True)
+
+    # convert low cardinality text, then shrink the numbers
+    plan = column_plan(profile_columns(df, max_distinct=max_categories), percent_nan=1.0,
+                       max_categories=max_categories, max_category_ratio=max_category_ratio)
+    apply_plan(df, plan)
+    downcast_columns(df)
+
+    after = df.memory_usage(index=False, deep=True)
+    report = pd.DataFrame({'dtype_before': before_types,
+                           'dtype_after': df.dtypes.astype(str),
+                           'before_mb': before / 1024 ** 2,
+                           'after_mb': after / 1024 ** 2})
+
+    if show == True:
+        print(f'Memory reduced from {round(report.before_mb.sum(), 1)}MB '
+              f'to {round(report.after_mb.sum(), 1)}MB')
+
+    return df, report
+
+
+def dependent_columns(df, key):
+    """returns the columns that only ever take one value for each value of 'key' (ex. the census
+       attributes of a zip code), found with one grouped count of distinct values"""
+    counts = df.groupby(key, observed=True).nunique(dropna=False)
+    return list(counts.columns[(counts <= 1).all()])
+
+
+def split_dimension(df, key, columns=None, code_col=None):
+    """takes a dataframe, a 'key' column (ex. 'Incident Zip') and the columns that depend only on it
+       (default = dependent_columns) and moves those columns into a dimension table with one row
+       per key. The dataframe keeps a small integer code for its key in 'code_col'
+       (default = key + '_code') in place of the repeated values. Returns the slimmed dataframe
+       and the dimension table indexed by code; join_dimension puts them back together."""
+
+    columns = dependent_columns(df, key) if columns is None else list(columns)
+    code_col = key + '_code' if code_col is None else code_col
+
+    # one integer code per key value, NaN keys get -1
+    codes, uniques = pd.factorize(df[key])
+
+    dim = (df[[key] + columns]
+           .assign(**{code_col: codes})
+           .drop_duplicates(code_col)
+           .query(f'`{code_col}` >= 0')
+           .set_index(code_col)
+           .sort_index())
+
+    fact = df.drop(columns=[key] + columns)
+    fact[code_col] = pd.to_numeric(codes, downcast='integer')
+
+    return fact, dim
+
+
+def join_dimension(fact, dim, code_col=None, columns=None):
+    """takes a dataframe and dimension table from split_dimension and returns the dataframe with the
+       dimension 'columns' (default = all) joined back on by integer code"""
+    code_col = dim.index.name if code_col is None else code_col
+    columns = list(dim.columns) if columns is None else columns
+    return fact.join(dim[columns], on=code_col)
+
+
+# record every helper's calls while instrumentation is enabled
+instrument_module(globals())
@@ -0,0 +1,213 @@
+# import libraries
+import queue
+import sqlite3
+import threading
+
+from contextlib import contextmanager
+
+import pandas as pd
+
+
+# operators allowed in 'where' conditions
+OPERATORS = {'=', '!=', '<', '<=', '>', '>=', 'in', 'not in', 'like'}
+
+
+##############################
+# CONNECTION POOL FUNCTIONS #
+##############################
+
+def _connect(path):
+    """opens a SQLite connection to 'path'. pandas' read_sql and to_sql only take SQLite
+       connections (or SQLAlchemy ones), so other databases are not supported here."""
+    # connections are handed between threads by the pool but only used by one at a time
+    return sqlite3.connect(str(path), check_same_thread=False)
+
+
+class ConnectionPool:
+    """a thread safe pool of up to 'max_size' connections to one database. Connections are only
+       opened when first needed, so creating a pool never touches the disk."""
+
+    def __init__(self, path, max_size=4):
+        self.path = path
+        self.max_size = max_size
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """context manager that checks a connection out of the pool, opening a new one if none are
+           idle and the pool is not full, and returns it to the pool afterwards"""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.max_size
+                if can_open:
+                    self._opened += 1
+            if can_open:
+                try:
+                    conn = _connect(self.path)
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                # wait for another thread to return a connection
+                conn = self._idle.get(timeout=timeout)
+
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        """closes every idle connection"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+
+# one pool per database path, created on first use
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(path, max_size=4):
+    """takes the path to a database and returns its shared ConnectionPool"""
+    with _POOLS_LOCK:
+        if path not in _POOLS:
+            _POOLS[path] = ConnectionPool(path, max_size=max_size)
+        return _POOLS[path]
+
+
+#########################
+# QUERY BUILD FUNCTIONS #
+#########################
+
+def quote_identifier(name):
+    """takes a table or column name and returns it quoted for use in SQL"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def build_select(table, columns=None, where=None, order_by=None, limit=None):
+    """takes a table name, optional list of 'columns' (default = every column), 'where' conditions,
+       'order_by' column(s) and 'limit', and returns a (sql, params) pair. Identifiers are quoted
+       and values are passed as parameters, never formatted into the SQL. 'where' is a dictionary
+       of column: value (equality, or membership when value is a list) or
+       column: (operator, value) ex. {'Agency': 'HPD', 'Created Date': ('>=', '2019-01-01')}"""
+
+    cols = '*' if not columns else ', '.join(quote_identifier(c) for c in columns)
+    sql = f'SELECT {cols} FROM {quote_identifier(table)}'
+    params = []
+
+    # push each predicate down to the database
+    clauses = []
+    for col, condition in (where or {}).items():
+        if isinstance(condition, tuple):
+            op, value = condition
+        elif isinstance(condition, (list, set)):
+            op, value = 'in', condition
+        else:
+            op, value = '=', condition
+
+        op = op.lower()
+        if op not in OPERATORS:
+            raise ValueError(f'unsupported operator {op!r}, use one of {sorted(OPERATORS)}')
+
+        if op in ('in', 'not in'):
+            value = list(value)
+            clauses.append(f'{quote_identifier(col)} {op.upper()} ({", ".join("?" * len(value))})')
+            params.extend(value)
+        else:
+            clauses.append(f'{quote_identifier(col)} {op.upper()} ?')
+            params.append(value)
+
+    if clauses:
+        sql += ' WHERE ' + ' AND '.join(clauses)
+    if order_by:
+        order_by = [order_by] if isinstance(order_by, str) else order_by
+        sql += ' ORDER BY ' + ', '.join(quote_identifier(c) for c in order_by)
+    if limit is not None:
+        sql += ' LIMIT ?'
+        params.append(int(limit))
+
+    return sql, params
+
+
+########################
+# DATA ACCESS FUNCTIONS #
+########################
+
+def read_query(sql, params=None, path='Northwind_small.sqlite', chunksize=None, parse_dates=None):
+    """takes a parameterized SQL query and its params and returns a dataframe of the results from
+       the database at 'path'. With 'chunksize' returns an iterator of dataframes instead, which
+       holds its pooled connection until it is exhausted, so large tables can be streamed."""
+
+    pool = get_pool(path)
+
+    if chunksize is None:
+        with pool.connection() as conn:
+            return pd.read_sql(sql, conn, params=params, parse_dates=parse_dates)
+
+    def _chunks():
+        with pool.connection() as conn:
+            for chunk in pd.read_sql(sql, conn, params=params, parse_dates=parse_dates,
+                                     chunksize=chunksize):
+                yield chunk
+
+    return _chunks()
+
+
+def read_table(table, columns=None, where=None, order_by=None, limit=None,
+               path='Northwind_small.sqlite', chunksize=None, parse_dates=None):
+    """takes a table name and returns only the requested 'columns' of the rows that match 'where'
+       (see build_select) as a dataframe, or as an iterator of dataframes when 'chunksize' is set"""
+    sql, params = build_select(table, columns=columns, where=where, order_by=order_by, limit=limit)
+    return read_query(sql, params=params, path=path, chunksize=chunksize, parse_dates=parse_dates)
+
+
+##########################
+# LOCAL 311 SQL FUNCTIONS #
+##########################
+
+def write_311_sql(chunks, path='nyc311.sqlite', table='requests',
+                  index_cols=['Created Date', 'Agency', 'Complaint Type', 'Incident Zip']):
+    """takes a cleaned 311 dataframe or an iterable of chunks (ex. from stream_311_csv) and appends
+       them to 'table' in a local SQLite database, then
+       indexes 'index_cols' so filtered reads do not scan the whole table. Returns the rows written."""
+
+    if isinstance(chunks, pd.DataFrame):
+        chunks = [chunks]
+
+    n_rows = 0
+    with get_pool(path).connection() as conn:
+        for chunk in chunks:
+            # categoricals are written as their values
+            chunk = chunk.astype({c: 'object' for c in chunk.columns
+                                  if isinstance(chunk[c].dtype, pd.CategoricalDtype)})
+            chunk.to_sql(table, conn, if_exists='append', index=False)
+            n_rows += len(chunk)
+
+        for col in index_cols:
+            name = quote_identifier(f'idx_{table}_{col}'.replace(' ', '_'))
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {name} '
+                         f'ON {quote_identifier(table)} ({quote_identifier(col)})')
+        conn.commit()
+
+    return n_rows
+
+
+def read_311_sql(path='nyc311.sqlite', table='requests', columns=None, where=None, chunksize=None):
+    """takes the path to a local 311 database and returns the requested 'columns' of the rows that
+       match 'where' (see build_select), with the date columns parsed. ex. HPD heat in 2019:
+       read_311_sql(where={'Agency': 'HPD', 'Complaint Type': 'HEAT/HOT WATER',
+                           'Created Date': ('>=', '2019-01-01')})"""
+    dates = [c for c in ['Created Date', 'Closed Date'] if columns is None or c in columns]
+    return read_table(table, columns=columns, where=where, path=path, chunksize=chunksize,
+                      parse_dates=dates)
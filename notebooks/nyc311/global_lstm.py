@@ -0,0 +1,329 @@
+# import libraries
+import os
+import pickle
+import time
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def _keras():
+    """imports keras (from tensorflow) on first use"""
+    try:
+        from tensorflow import keras
+    except ImportError as e:
+        raise ImportError('the LSTM models need tensorflow: pip install tensorflow') from e
+    return keras
+
+
+##########################
+# WINDOWED DATA FUNCTIONS #
+##########################
+
+def series_matrix(series, freq=None):
+    """takes a dictionary of time series (ex. from series_from_long or cube_series, one per
+       complaint type x borough) and returns a (series x time) float32 array aligned on one date
+       index (NaN where a series has no value), the list of keys and the date index"""
+    keys = list(series)
+    frame = pd.concat([series[key].rename(i) for i, key in enumerate(keys)], axis=1).sort_index()
+    if freq is not None:
+        frame = frame.asfreq(freq)
+    return frame.to_numpy(dtype='float32').T, keys, frame.index
+
+
+def scale_series(values):
+    """standardizes every row of a (series x time) array by its own mean and standard deviation,
+       so large and small slices train together. Returns the scaled array, means and stds."""
+    mean = np.nanmean(values, axis=1, keepdims=True)
+    std = np.nanstd(values, axis=1, keepdims=True)
+    std[~(std > 0)] = 1
+    return ((values - mean) / std).astype('float32'), mean, std
+
+
+class WindowLoader:
+    """batches of (input window, slice id) -> next 'horizon' values drawn from a (series x time)
+       array. The windows are a strided view of the array (sliding_window_view), so no window is
+       copied until it is put in a batch; only the (series, start) pairs of windows without NaN are
+       stored."""
+
+    def __init__(self, values, window, horizon, batch_size=256, shuffle=True, seed=None):
+        self.window = window
+        self.horizon = horizon
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.rng = np.random.default_rng(seed)
+
+        # (series, start, window + horizon) view over the same memory as 'values'
+        self.windows = sliding_window_view(values, window + horizon, axis=1)
+
+        # a window is usable when it holds no NaN: count NaNs with a cumulative sum
+        nan_count = np.concatenate([np.zeros((len(values), 1), dtype='int32'),
+                                    np.cumsum(np.isnan(values), axis=1, dtype='int32')], axis=1)
+        span = window + horizon
+        usable = (nan_count[:, span:] - nan_count[:, :-span]) == 0
+        self.series_idx, self.start_idx = np.nonzero(usable)
+
+    def __len__(self):
+        return int(np.ceil(len(self.series_idx) / self.batch_size))
+
+    def batch(self, rows):
+        """returns ((inputs, slice ids), targets) for the given window rows"""
+        block = self.windows[self.series_idx[rows], self.start_idx[rows]]
+        return ((block[:, :self.window, None], self.series_idx[rows].astype('int32')),
+                block[:, self.window:])
+
+    def batches(self):
+        """yields the batches of one pass (epoch) over every window, shuffled when 'shuffle'"""
+        order = self.rng.permutation(len(self.series_idx)) if self.shuffle else np.arange(len(self.series_idx))
+        for start in range(0, len(order), self.batch_size):
+            yield self.batch(order[start:start + self.batch_size])
+
+    def repeat(self):
+        """yields batches forever, for keras fit with steps_per_epoch=len(loader)"""
+        while True:
+            yield from self.batches()
+
+
+def check_windows(loader, values, n_checks=1000, seed=0):
+    """takes a WindowLoader and the (series x time) array it was built on and checks, with numpy
+       only (no tensorflow needed), that random batch rows hold the 'window' values starting at
+       their (series, start) pair as input, the following 'horizon' values as target and the
+       series as slice id, and that no usable window was missed. Raises a ValueError on the first
+       mismatch and returns the number of rows checked."""
+    values = np.asarray(values)
+    span = loader.window + loader.horizon
+    expected = sum(int(np.sum(~np.isnan(sliding_window_view(row, span)).any(axis=1)))
+                   for row in values) if values.shape[1] >= span else 0
+    if len(loader.series_idx) != expected:
+        raise ValueError(f'{len(loader.series_idx)} usable windows found, expected {expected}')
+
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(loader.series_idx), size=min(n_checks, len(loader.series_idx)), replace=False)
+    (inputs, slice_ids), targets = loader.batch(rows)
+    for i, row in enumerate(rows):
+        series, start = loader.series_idx[row], loader.start_idx[row]
+        if not np.array_equal(inputs[i, :, 0], values[series, start:start + loader.window]):
+            raise ValueError(f'input of window {row} (series {series}, start {start}) is misaligned')
+        if not np.array_equal(targets[i], values[series, start + loader.window:start + span]):
+            raise ValueError(f'target of window {row} (series {series}, start {start}) is misaligned')
+        if slice_ids[i] != series:
+            raise ValueError(f'slice id of window {row} is {slice_ids[i]}, expected {series}')
+    return len(rows)
+
+
+def last_windows(values, window):
+    """returns the last 'window' values of every series (forward filled over gaps) and the slice
+       ids, the input of a single batched forecast of every series"""
+    recent = pd.DataFrame(values[:, -window:].T).ffill().bfill().to_numpy(dtype='float32').T
+    return recent[:, :, None], np.arange(len(values), dtype='int32')
+
+
+######################
+# LSTM MODEL FUNCTIONS #
+######################
+
+def build_global_lstm(n_series, window, horizon, units=64, embed_dim=8, learning_rate=.001):
+    """returns a compiled keras model that reads a window of values and a slice id and predicts the
+       next 'horizon' values at once. The slice id is embedded and fed with every time step, so one
+       network learns the shared patterns while still telling slices apart."""
+    keras = _keras()
+    layers = keras.layers
+
+    values_in = keras.Input(shape=(window, 1), name='values')
+    slice_in = keras.Input(shape=(), dtype='int32', name='slice')
+    embedded = layers.Embedding(n_series, embed_dim)(slice_in)
+    embedded = layers.RepeatVector(window)(embedded)
+    hidden = layers.LSTM(units)(layers.Concatenate()([values_in, embedded]))
+    outputs = layers.Dense(horizon)(hidden)
+
+    model = keras.Model([values_in, slice_in], outputs)
+    model.compile(optimizer=keras.optimizers.Adam(learning_rate), loss='mse')
+    return model
+
+
+def build_series_lstm(window, horizon, units=64, learning_rate=.001):
+    """returns a compiled keras model for one series (the per-series approach)"""
+    keras = _keras()
+    model = keras.Sequential([keras.Input(shape=(window, 1)),
+                              keras.layers.LSTM(units),
+                              keras.layers.Dense(horizon)])
+    model.compile(optimizer=keras.optimizers.Adam(learning_rate), loss='mse')
+    return model
+
+
+class GlobalLSTM:
+    """one LSTM forecaster for every series in a dictionary (ex. every complaint type x borough),
+       trained on the windows of all of them together and forecasting all of them in one batched
+       predict call"""
+
+    # one model for many slices, so a ModelRegistry (one model per slice) does not take it
+    multi_series = True
+
+    def __init__(self, window=28, horizon=7, units=64, embed_dim=8, batch_size=256, seed=None):
+        self.window = window
+        self.horizon = horizon
+        self.units = units
+        self.embed_dim = embed_dim
+        self.batch_size = batch_size
+        self.seed = seed
+        self.model = None
+
+    def fit(self, series, epochs=10, freq=None, verbose=0):
+        """takes a dictionary of time series and trains the model on all of them"""
+        values, self.keys, self.index = series_matrix(series, freq=freq)
+        self.values, self.mean, self.std = scale_series(values)
+
+        loader = WindowLoader(self.values, self.window, self.horizon, batch_size=self.batch_size,
+                              seed=self.seed)
+        if self.seed is not None:
+            _keras().utils.set_random_seed(self.seed)
+        self.model = build_global_lstm(len(self.keys), self.window, self.horizon,
+                                       units=self.units, embed_dim=self.embed_dim)
+        self.history = self.model.fit(loader.repeat(), steps_per_epoch=len(loader), epochs=epochs,
+                                      verbose=verbose)
+        self._residual_rmse = self._served = None
+        return self
+
+    def forecast(self):
+        """returns a dataframe with the next 'horizon' values of every series (columns 'series',
+           'date' and 'forecast'), from one batched predict call"""
+        inputs = last_windows(self.values, self.window)
+        scaled = self.model.predict(inputs, batch_size=max(len(self.keys), 1), verbose=0)
+        predicted = scaled * self.std + self.mean
+
+        dates = pd.date_range(self.index[-1], periods=self.horizon + 1, freq=self.index.freq or
+                              pd.infer_freq(self.index))[1:]
+        # a series of the keys keeps tuple keys whole (np.array would split them into columns)
+        return pd.DataFrame({'series': pd.Series(self.keys, dtype=object).repeat(self.horizon).to_numpy(),
+                             'date': np.tile(dates, len(self.keys)),
+                             'forecast': predicted.ravel()})
+
+    def residual_rmse(self):
+        """returns a (series x horizon) array with the root mean squared error of every series and
+           step ahead over its training windows, in the series' own units (NaN for a series without
+           a full window). Computed with one batched predict the first time it is asked for."""
+        if getattr(self, '_residual_rmse', None) is None:
+            loader = WindowLoader(self.values, self.window, self.horizon, shuffle=False)
+            (inputs, ids), targets = loader.batch(np.arange(len(loader.series_idx)))
+            predicted = self.model.predict((inputs, ids), batch_size=self.batch_size, verbose=0)
+            errors = (predicted - targets) * self.std[ids]
+
+            # sum the squared errors of every series' windows at once
+            squared = np.zeros((len(self.keys), self.horizon))
+            np.add.at(squared, ids, errors ** 2)
+            counts = np.bincount(ids, minlength=len(self.keys))[:, None]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                self._residual_rmse = np.sqrt(squared / counts)
+        return self._residual_rmse
+
+    def save(self, path):
+        """saves the fitted model to the folder 'path': the keras network (model.keras) and the
+           settings, keys, dates, scaled values and scaling it forecasts from (state.pkl)"""
+        if self.model is None:
+            raise ValueError('the model has not been fitted yet')
+        os.makedirs(path, exist_ok=True)
+        self.model.save(os.path.join(path, 'model.keras'))
+        state = {'settings': {'window': self.window, 'horizon': self.horizon, 'units': self.units,
+                              'embed_dim': self.embed_dim, 'batch_size': self.batch_size,
+                              'seed': self.seed},
+                 'keys': self.keys, 'index': self.index, 'values': self.values, 'mean': self.mean,
+                 'std': self.std}
+        with open(os.path.join(path, 'state.pkl'), 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """returns the GlobalLSTM saved to the folder 'path', ready to forecast"""
+        with open(os.path.join(path, 'state.pkl'), 'rb') as f:
+            state = pickle.load(f)
+        lstm = cls(**state['settings'])
+        lstm.keys, lstm.index = state['keys'], state['index']
+        lstm.values, lstm.mean, lstm.std = state['values'], state['mean'], state['std']
+        lstm.model = _keras().models.load_model(os.path.join(path, 'model.keras'))
+        return lstm
+
+
+class LSTMSlice:
+    """one series of a fitted GlobalLSTM, served like a single series model (ex. by
+       forecast_server) with lstm_slice_forecast"""
+
+    def __init__(self, lstm, key):
+        self.lstm = lstm
+        self.key = key
+        self.position = lstm.keys.index(key)
+
+
+def lstm_slice_forecast(model, steps, alpha):
+    """takes an LSTMSlice and returns a dataframe with the 'mean', 'lower' and 'upper' forecast of
+       its series, like sarimax_forecast. Every series comes from one batched forecast of the
+       GlobalLSTM, made once. The interval is normal, with the series' training RMSE of each step
+       ahead as the spread. Covers at most the model's horizon, whatever 'steps'."""
+    lstm = model.lstm
+    if getattr(lstm, '_served', None) is None:
+        lstm._served = lstm.forecast()
+
+    rows = slice(model.position * lstm.horizon, (model.position + 1) * lstm.horizon)
+    mean = lstm._served['forecast'].to_numpy()[rows]
+    spread = NormalDist().inv_cdf(1 - alpha / 2) * lstm.residual_rmse()[model.position]
+    forecast = pd.DataFrame({'mean': mean, 'lower': mean - spread, 'upper': mean + spread},
+                            index=pd.DatetimeIndex(lstm._served['date'].to_numpy()[rows]))
+    return forecast.iloc[:steps]
+
+
+def fit_series_lstms(series, window=28, horizon=7, units=64, epochs=10, batch_size=32, freq=None,
+                     verbose=0):
+    """trains one LSTM per series (the notebook's approach) on the same windows as GlobalLSTM and
+       returns a dictionary of key: (model, mean, std)"""
+    values, keys, _ = series_matrix(series, freq=freq)
+    values, mean, std = scale_series(values)
+
+    models = {}
+    for i, key in enumerate(keys):
+        loader = WindowLoader(values[i:i + 1], window, horizon, batch_size=batch_size)
+        model = build_series_lstm(window, horizon, units=units)
+        model.fit(loader.repeat(), steps_per_epoch=len(loader), epochs=epochs, verbose=verbose)
+        models[key] = (model, mean[i, 0], std[i, 0])
+    return models
+
+
+def benchmark_global_lstm(series, window=28, horizon=7, units=64, epochs=10, freq=None, seed=0):
+    """takes a dictionary of time series, holds out the last 'horizon' values of each and compares
+       one GlobalLSTM with one LSTM per series. Returns a dataframe with the number of models,
+       training and inference seconds and holdout RMSE (in the series' own units) of each."""
+
+    values, keys, index = series_matrix(series, freq=freq)
+    train = {key: pd.Series(values[i, :-horizon], index=index[:-horizon]) for i, key in enumerate(keys)}
+    actual = values[:, -horizon:]
+
+    start = time.perf_counter()
+    global_model = GlobalLSTM(window=window, horizon=horizon, units=units, seed=seed).fit(train, epochs=epochs)
+    train_time = time.perf_counter() - start
+    start = time.perf_counter()
+    forecast = global_model.forecast()
+    predict_time = time.perf_counter() - start
+    predicted = forecast['forecast'].to_numpy().reshape(len(keys), horizon)
+
+    rows = [{'approach': 'global', 'models': 1, 'train_seconds': train_time,
+             'inference_seconds': predict_time,
+             'rmse': float(np.sqrt(np.nanmean((predicted - actual) ** 2)))}]
+
+    start = time.perf_counter()
+    per_series = fit_series_lstms(train, window=window, horizon=horizon, units=units, epochs=epochs)
+    train_time = time.perf_counter() - start
+
+    # the per-series models need one predict call each
+    start = time.perf_counter()
+    train_values = np.stack([train[key].to_numpy(dtype='float32') for key in keys])
+    inputs, _ = last_windows(train_values, window)
+    predicted = np.stack([model.predict((inputs[i:i + 1] - mean) / std, verbose=0)[0] * std + mean
+                          for i, (model, mean, std) in enumerate(per_series[key] for key in keys)])
+    predict_time = time.perf_counter() - start
+
+    rows.append({'approach': 'per series', 'models': len(keys), 'train_seconds': train_time,
+                 'inference_seconds': predict_time,
+                 'rmse': float(np.sqrt(np.nanmean((predicted - actual) ** 2)))})
+
+    return pd.DataFrame(rows).set_index('approach')
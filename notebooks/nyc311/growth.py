@@ -0,0 +1,240 @@
+# import libraries
+import re
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+
+from nyc311.instrumentation import instrument_module
+
+
+# growth rate columns growth_rates adds: name and number of periods (months) back from the last
+# date, None for growth since the first date
+GROWTH_HORIZONS = {'total_growth': None, '5yr_growth': 60, '3yr_growth': 36, '1yr_growth': 12}
+
+# column labels of wide frames that hold values (ex. '2018-04' or '2018-04-01')
+_DATE_LABEL = re.compile(r'^\d{4}-\d{2}(-\d{2})?$')
+
+
+###########################
+# GROWTH MATRIX FUNCTIONS #
+###########################
+
+def date_columns(df):
+    """returns the columns of a wide dataframe whose labels are dates (ex. '2018-04'), in order"""
+    return [c for c in df.columns
+            if isinstance(c, pd.Timestamp) or (isinstance(c, str) and _DATE_LABEL.match(c))]
+
+
+def to_matrix(data, keys=None, date_col='date', value_col='value', freq=None):
+    """takes a wide dataframe (one row per key and one column per date, ex. the Zillow style
+       frame get_time_series takes) or, when 'keys' is given, a long dataframe with 'keys',
+       'date_col' and 'value_col' columns (ex. daily counts per zip x complaint type) and returns
+       a dataframe of the key (id) columns, the sorted dates and a (keys x dates) float array.
+       For long data 'freq' (ex. 'D' or 'MS') fills missing dates with 0; without it a key's
+       missing dates are NaN."""
+    if keys is None:
+        value_cols = date_columns(data)
+        if not value_cols:
+            raise ValueError('no date columns (ex. "2018-04") found in the wide dataframe')
+        times = pd.DatetimeIndex(pd.to_datetime(pd.Index(value_cols), format='ISO8601'))
+        values = data[value_cols].to_numpy(dtype='float64')
+        if not times.is_monotonic_increasing:
+            order = np.argsort(times.values, kind='stable')
+            times, values = times[order], values[:, order]
+        ids = data[[c for c in data.columns if c not in value_cols]]
+        return ids, times, values
+
+    keys = [keys] if isinstance(keys, str) else list(keys)
+    dates = pd.to_datetime(data[date_col], format='ISO8601')
+    wide = data.groupby(keys + [dates], observed=True)[value_col].sum().unstack(date_col)
+    if freq is not None:
+        dates = pd.date_range(wide.columns.min(), wide.columns.max(), freq=freq)
+        wide = wide.reindex(columns=dates).fillna(0)
+    return wide.index.to_frame(index=False), pd.DatetimeIndex(wide.columns), wide.to_numpy(dtype='float64')
+
+
+def _horizon_dict(horizons):
+    """horizons as a dictionary of name: periods (a list of periods is named 'growth_<periods>')"""
+    if isinstance(horizons, dict):
+        return horizons
+    return {f'growth_{h}': h for h in horizons}
+
+
+def _end_position(times, end):
+    """position of the last date at or before 'end' (default = the last date)"""
+    if end is None:
+        return len(times) - 1
+    position = times.searchsorted(pd.Timestamp(end), side='right') - 1
+    if position < 0:
+        raise ValueError(f'no dates at or before {end}')
+    return position
+
+
+def _date_offset(times):
+    """the calendar step of a date index: its inferred frequency, or for dates with gaps month
+       starts or ends when every date is one, else the smallest step between dates"""
+    freq = pd.infer_freq(times) if len(times) >= 3 else None
+    if freq is not None:
+        return to_offset(freq)
+    if (times.day == 1).all():
+        return pd.offsets.MonthBegin()
+    if times.is_month_end.all():
+        return pd.offsets.MonthEnd()
+    if len(times) < 2:
+        raise ValueError('can not tell the frequency of a single date, pass freq')
+    return to_offset(pd.Timedelta(np.diff(times.values).min()))
+
+
+def growth_matrix(values, horizons=GROWTH_HORIZONS, end=None, times=None, min_base=None, freq=None):
+    """takes a (keys x dates) array and returns a (keys x horizons) array of growth rates
+       (last - base) / base of every key and horizon, computed in one array operation. The last
+       value is at 'end' (a position, or a date when 'times' is given; default = the last
+       column) and the base 'periods' earlier (or the first column for None). With 'times' the
+       periods are calendar steps of 'freq' (ex. 'MS' or 'D', default = inferred from the dates),
+       so the base of 12 monthly periods back is the date one year before the last even when
+       months are missing, and the rates of a base date that is missing are NaN. Without 'times'
+       periods are columns. Also returns the base and last values. Rates from a base below
+       'min_base' (ex. 1, to skip series that grew from nothing) are NaN."""
+    horizons = _horizon_dict(horizons)
+    values = np.asarray(values, dtype='float64')
+
+    # column of the base value of every horizon (-1 when its date is missing)
+    if times is not None:
+        times = pd.DatetimeIndex(times)
+        end = _end_position(times, end)
+        offset = _date_offset(times) if freq is None else to_offset(freq)
+        base_dates = [times[0] if h is None else times[end] - h * offset for h in horizons.values()]
+        short = [name for name, date in zip(horizons, base_dates) if date < times[0]]
+        base_cols = times.get_indexer(base_dates)
+    else:
+        end = values.shape[1] - 1 if end is None else end
+        base_cols = np.array([0 if h is None else end - h for h in horizons.values()])
+        short = [name for name, col in zip(horizons, base_cols) if col < 0]
+    if short:
+        raise ValueError(f'not enough periods before the end for horizons {short}')
+
+    # gathered for every key at once
+    missing = base_cols < 0
+    last = values[:, end]
+    base = values[:, np.where(missing, 0, base_cols)]
+    base[:, missing] = np.nan
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rates = (last[:, None] - base) / base
+    if min_base is not None:
+        rates[~(base >= min_base)] = np.nan
+    return rates, base, last
+
+
+def growth_table(data, horizons=GROWTH_HORIZONS, keys=None, date_col='date', value_col='value',
+                 freq=None, end=None, min_base=None):
+    """takes a wide or long dataframe (see to_matrix) and returns its key columns with one growth
+       rate column per horizon (see growth_matrix). With the default horizons and a monthly wide
+       frame the columns are the ones growth_rates adds."""
+    ids, times, values = to_matrix(data, keys=keys, date_col=date_col, value_col=value_col, freq=freq)
+    rates, _, _ = growth_matrix(values, horizons, end=end, times=times, min_base=min_base, freq=freq)
+
+    table = ids.copy()
+    for i, name in enumerate(_horizon_dict(horizons)):
+        table[name] = rates[:, i]
+    return table
+
+
+############################
+# GROWTH RANKING FUNCTIONS #
+############################
+
+def top_k_positions(values, k):
+    """takes a (rows x columns) array and returns a (k x columns) array with the row positions of
+       the 'k' largest values of every column, largest first. The top k are found with a partial
+       selection (argpartition), so only those k are ever sorted. NaN values are never picked; a
+       column with fewer than k values is padded with -1."""
+    values = np.asarray(values, dtype='float64')
+    if values.ndim == 1:
+        values = values[:, None]
+    n_rows = len(values)
+    k = min(k, n_rows)
+    if k <= 0:
+        return np.empty((0, values.shape[1]), dtype='int64')
+
+    # NaN sorts last
+    filled = np.where(np.isnan(values), -np.inf, values)
+    if k < n_rows:
+        candidates = np.argpartition(-filled, k - 1, axis=0)[:k]
+    else:
+        candidates = np.broadcast_to(np.arange(n_rows)[:, None], filled.shape).copy()
+
+    order = np.argsort(-np.take_along_axis(filled, candidates, axis=0), axis=0, kind='stable')
+    positions = np.take_along_axis(candidates, order, axis=0)
+    positions[np.isnan(np.take_along_axis(values, positions, axis=0))] = -1
+    return positions
+
+
+def rank_growth(data, horizons=GROWTH_HORIZONS, k=5, by=None, keys=None, date_col='date',
+                value_col='value', freq=None, end=None, min_base=1):
+    """takes a wide or long dataframe (see to_matrix) and returns the 'k' fastest growing keys for
+       every horizon, or within every group of the 'by' key column(s) (ex. the top 5 zips of
+       each complaint type). Growth rates come from growth_matrix and the top k from
+       top_k_positions, without sorting every key. Keys with a base value below 'min_base' are
+       skipped. Returns one row per group, horizon and rank with the key columns, 'growth',
+       'base' and 'last'."""
+    horizons = _horizon_dict(horizons)
+    ids, times, values = to_matrix(data, keys=keys, date_col=date_col, value_col=value_col, freq=freq)
+    rates, base, last = growth_matrix(values, horizons, end=end, times=times, min_base=min_base,
+                                      freq=freq)
+
+    if by is None:
+        groups = [np.arange(len(ids))]
+    else:
+        by = [by] if isinstance(by, str) else list(by)
+        groups = ids.groupby(by, observed=True).indices.values()
+
+    # top k positions of every group, horizon by horizon
+    picked, horizon, rank = [], [], []
+    for rows in groups:
+        top = top_k_positions(rates[rows], k)
+        h, r = np.nonzero(top.T >= 0)
+        picked.append(rows[top[r, h]])
+        horizon.append(h)
+        rank.append(r + 1)
+
+    picked = np.concatenate(picked) if picked else np.empty(0, dtype='int64')
+    horizon = np.concatenate(horizon) if horizon else np.empty(0, dtype='int64')
+
+    ranked = ids.iloc[picked].reset_index(drop=True)
+    ranked.insert(0, 'rank', np.concatenate(rank) if rank else np.empty(0, dtype='int64'))
+    ranked.insert(0, 'horizon', pd.Categorical.from_codes(horizon, categories=list(horizons)))
+    ranked['growth'] = rates[picked, horizon]
+    ranked['base'] = base[picked, horizon]
+    ranked['last'] = last[picked]
+
+    # group columns first
+    group_cols = by or []
+    return ranked[group_cols + [c for c in ranked.columns if c not in group_cols]]
+
+
+def average_change(data, column='YoY_change', key='city_zipcode'):
+    """takes a dictionary of time series dataframes like the one get_time_series returns (or the
+       long frame of get_time_series(columnar=True), grouped by 'key') and returns the mean of
+       'column' (ignoring NaN) of every series as a series, computed over all values at once"""
+    if isinstance(data, pd.DataFrame):
+        return data.groupby(key, sort=False, observed=True)[column].mean()
+
+    names = list(data)
+    arrays = [data[name][column].to_numpy(dtype='float64') for name in names]
+    lengths = np.array([len(a) for a in arrays])
+    if not lengths.sum():
+        return pd.Series(np.nan, index=names, dtype='float64')
+
+    # sum and count every series' values with one segmented reduction
+    values = np.concatenate(arrays)
+    valid = ~np.isnan(values)
+    segment = np.repeat(np.arange(len(names)), lengths)
+    sums = np.bincount(segment, weights=np.where(valid, values, 0), minlength=len(names))
+    counts = np.bincount(segment, weights=valid, minlength=len(names))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return pd.Series(sums / counts, index=names)
+
+
+# record every helper's calls while instrumentation is enabled
+instrument_module(globals())
@@ -0,0 +1,214 @@
+# import libraries
+import cProfile
+import functools
+import inspect
+import io
+import json
+import os
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+# switched on with enable() or by setting NYC311_INSTRUMENT=1 (NYC311_INSTRUMENT=memory also
+# tracks peak memory). 'tracing' is True while tracemalloc runs because enable() started it.
+_STATE = {'enabled': False, 'memory': False, 'tracing': False, 'depth': 0}
+RECORDS = []
+
+# running peak memory of every open stage, innermost last
+_PEAKS = []
+
+
+##############################
+# INSTRUMENTATION FUNCTIONS #
+##############################
+
+def enable(memory=False):
+    """starts recording every instrumented call. 'memory' also records each call's peak memory
+       with tracemalloc, which slows Python allocations down noticeably."""
+    _STATE['enabled'] = True
+    _STATE['memory'] = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _STATE['tracing'] = True
+
+
+def disable():
+    """stops recording (instrumented functions go back to a single flag check per call). Stops
+       tracemalloc only when enable() started it, so an outer tracer (ex. a profile block) keeps
+       running."""
+    _STATE['enabled'] = False
+    if _STATE['tracing'] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _STATE['tracing'] = False
+    _STATE['memory'] = False
+
+
+def is_enabled():
+    return _STATE['enabled']
+
+
+if os.environ.get('NYC311_INSTRUMENT', '') not in ('', '0'):
+    enable(memory=os.environ['NYC311_INSTRUMENT'] == 'memory')
+
+
+def clear():
+    """drops every record"""
+    RECORDS.clear()
+
+
+def _rows(obj):
+    """number of rows in a dataframe, series or array (or the first one in a tuple), else None"""
+    if isinstance(obj, tuple):
+        return next((r for r in map(_rows, obj) if r is not None), None)
+    shape = getattr(obj, 'shape', None)
+    return shape[0] if shape else None
+
+
+@contextmanager
+def stage(name, rows_in=None):
+    """context manager that records the wall time (and peak memory when enabled with 'memory') of
+       the wrapped block as stage 'name'. Yields the record so the block can set 'rows_out'."""
+    if not _STATE['enabled']:
+        yield {}
+        return
+
+    record = {'stage': name, 'depth': _STATE['depth'], 'started': time.time(),
+              'rows_in': rows_in, 'rows_out': None}
+    memory = _STATE['memory'] and tracemalloc.is_tracing()
+    if memory:
+        # keep the enclosing stage's peak before resetting it for this one
+        current, peak = tracemalloc.get_traced_memory()
+        if _PEAKS:
+            _PEAKS[-1] = max(_PEAKS[-1], peak)
+        tracemalloc.reset_peak()
+        _PEAKS.append(0)
+
+    _STATE['depth'] += 1
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['wall_time'] = time.perf_counter() - start
+        _STATE['depth'] -= 1
+        if memory:
+            peak = max(tracemalloc.get_traced_memory()[1], _PEAKS.pop())
+            if _PEAKS:
+                _PEAKS[-1] = max(_PEAKS[-1], peak)
+            record['peak_mb'] = (peak - current) / 1024 ** 2
+        RECORDS.append(record)
+
+
+def instrument(func, name=None):
+    """wraps a function so that, while instrumentation is enabled, every call is recorded as a
+       stage with the rows of its first argument and of its result"""
+    name = name or f'{func.__module__}.{func.__name__}'
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _STATE['enabled']:
+            return func(*args, **kwargs)
+        with stage(name, rows_in=_rows(args[0]) if args else None) as record:
+            result = func(*args, **kwargs)
+            record['rows_out'] = _rows(result)
+        return result
+
+    wrapper.__wrapped__ = func
+    return wrapper
+
+
+def instrument_module(namespace):
+    """wraps every public function defined in a module with instrument, in place. Called as
+       instrument_module(globals()) at the end of a module, so calls between its own helpers
+       are recorded too."""
+    module = namespace['__name__']
+    for name, obj in list(namespace.items()):
+        if (inspect.isfunction(obj) and obj.__module__ == module and not name.startswith('_')
+                and not hasattr(obj, '__wrapped__')):
+            namespace[name] = instrument(obj)
+
+
+##########################
+# TIMING EXPORT FUNCTIONS #
+##########################
+
+def timings():
+    """returns every record as a dataframe, one row per call"""
+    import pandas as pd
+    columns = ['stage', 'depth', 'started', 'wall_time', 'rows_in', 'rows_out', 'peak_mb']
+    return pd.DataFrame(RECORDS).reindex(columns=columns)
+
+
+def summary():
+    """returns the calls, total, mean and max wall time, rows and largest peak memory of every stage,
+       slowest first"""
+    return (timings().groupby('stage')
+                     .agg(calls=('wall_time', 'size'), total_s=('wall_time', 'sum'),
+                          mean_s=('wall_time', 'mean'), max_s=('wall_time', 'max'),
+                          rows_in=('rows_in', 'sum'), peak_mb=('peak_mb', 'max'))
+                     .sort_values('total_s', ascending=False))
+
+
+def export_timings(path, per_call=False):
+    """writes the stage summary (or every call with 'per_call') to 'path' as JSON or CSV, chosen by
+       the file extension, for comparing nightly runs"""
+    table = timings() if per_call else summary().reset_index()
+    if path.endswith('.json'):
+        with open(path, 'w') as f:
+            json.dump(json.loads(table.to_json(orient='records')), f, indent=1)
+    else:
+        table.to_csv(path, index=False)
+    return path
+
+
+#########################
+# PROFILING FUNCTIONS #
+#########################
+
+class ProfileResult:
+    """the output of a profile block: a pstats.Stats of the calls and the lines that allocated
+       the most memory"""
+
+    def __init__(self):
+        self.stats = None
+        self.allocations = []
+        self.peak_mb = None
+
+    def report(self, sort='cumulative', top=25):
+        """returns the top 'top' functions by 'sort' as text"""
+        out = io.StringIO()
+        self.stats.stream = out
+        self.stats.sort_stats(sort).print_stats(top)
+        return out.getvalue()
+
+
+@contextmanager
+def profile(path=None, memory=True, top_allocations=10):
+    """context manager that runs the wrapped block under cProfile (and tracemalloc with 'memory')
+       and yields a ProfileResult, filled in when the block ends. 'path' also saves the raw profile
+       (ex. 'sarima.prof') for snakeviz or pstats."""
+    result = ProfileResult()
+    started_tracing = memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    if memory:
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield result
+    finally:
+        profiler.disable()
+        result.stats = pstats.Stats(profiler)
+        if path is not None:
+            profiler.dump_stats(path)
+        if memory:
+            result.peak_mb = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+            diff = tracemalloc.take_snapshot().compare_to(before, 'lineno')
+            result.allocations = [(str(stat.traceback), stat.size_diff / 1024 ** 2)
+                                  for stat in diff[:top_allocations]]
+            if started_tracing:
+                tracemalloc.stop()
@@ -0,0 +1,272 @@
+# import libraries
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+import uuid
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+##########################
+# MODEL REGISTRY FUNCTIONS #
+##########################
+
+def window_hash(ts):
+    """returns a short hash of a training series' dates and values, so a model is only reused for
+       exactly the window it was trained on"""
+    hashed = pd.util.hash_pandas_object(pd.Series(np.asarray(ts, dtype='float64'), index=ts.index))
+    return hashlib.sha1(hashed.to_numpy().tobytes()).hexdigest()[:16]
+
+
+def model_key(slice_key, spec, ts):
+    """takes a series slice (ex. ('BROOKLYN', 'HPD')), a model spec (ex. the SARIMAX order,
+       seasonal order and trend) and the training series and returns the registry key"""
+    raw = json.dumps([str(slice_key), str(spec), window_hash(ts)])
+    return hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+
+def _is_sarimax(model):
+    """True for fitted statsmodels SARIMAX results"""
+    return hasattr(model, 'model') and hasattr(model.model, 'seasonal_order')
+
+
+class ModelRegistry:
+    """fitted models saved under 'root', keyed by series slice, model spec and training window hash.
+       SARIMAX results are stored compactly as their spec, training series and fitted parameters and
+       are rebuilt with one Kalman filter pass on load (no optimizer), which is much faster than
+       refitting. Keras models (the LSTM) are stored with model.save and a GlobalLSTM with its own
+       save, as a folder. A catalog.json file lists every entry, and loaded models are kept in
+       memory."""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.catalog_path = os.path.join(root, 'catalog.json')
+        self.catalog = {}
+        if os.path.exists(self.catalog_path):
+            with open(self.catalog_path) as f:
+                self.catalog = json.load(f)
+        self._loaded = {}
+
+    def _write_catalog(self):
+        tmp_path = self.catalog_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.catalog, f, indent=1)
+        os.replace(tmp_path, self.catalog_path)
+
+    def save(self, model, slice_key, ts=None, spec=None):
+        """saves a fitted model for 'slice_key' and returns its registry key. SARIMAX results carry
+           their own spec and training series; a keras model needs its training series 'ts' and a
+           'spec' describing it (ex. {'window': 24, 'units': 50}). A fitted GlobalLSTM is saved once
+           under 'slice_key' (ex. 'global') and its catalog entry lists the 'slices' it forecasts."""
+
+        if _is_sarimax(model):
+            sarimax = model.model
+            ts = pd.Series(sarimax.data.orig_endog.iloc[:, 0] if sarimax.data.orig_endog.ndim > 1
+                           else sarimax.data.orig_endog)
+            spec = {'order': list(sarimax.order), 'seasonal_order': list(sarimax.seasonal_order),
+                    'trend': sarimax.trend}
+            kind = 'sarimax'
+        elif getattr(model, 'multi_series', False):
+            if model.model is None:
+                raise ValueError('the GlobalLSTM has not been fitted yet')
+            # every series' values, so the key changes with any of them
+            ts = pd.Series(np.ravel(model.values), index=np.tile(model.index, len(model.keys)))
+            spec = {'window': model.window, 'horizon': model.horizon, 'units': model.units,
+                    'embed_dim': model.embed_dim}
+            kind = 'global_lstm'
+        elif not hasattr(model, 'save'):
+            raise TypeError(f'cannot register a {type(model).__name__}: expected SARIMAX results or a '
+                            'keras model')
+        elif ts is None:
+            raise ValueError('a keras model needs the training series "ts" it was fitted on')
+        else:
+            kind = 'keras'
+
+        key = model_key(slice_key, spec, ts)
+        path = os.path.join(self.root, key + {'sarimax': '.pkl', 'keras': '.keras', 'global_lstm': ''}[kind])
+
+        if kind == 'sarimax':
+            # the spec, series and parameters are all that is needed to rebuild the results
+            with open(path, 'wb') as f:
+                pickle.dump({'spec': spec, 'endog': ts, 'params': np.asarray(model.params),
+                             'param_names': list(model.params.index)}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+        else:
+            model.save(path)
+
+        self.catalog[key] = {'slice': str(slice_key), 'kind': kind, 'spec': spec,
+                             'window_hash': window_hash(ts), 'start': str(ts.index[0]),
+                             'end': str(ts.index[-1]), 'n_obs': len(ts), 'file': os.path.basename(path),
+                             'saved': pd.Timestamp.now().isoformat(timespec='seconds')}
+        if kind == 'global_lstm':
+            self.catalog[key].update(end=str(model.index[-1]), n_obs=len(model.index),
+                                     slices=[str(k) for k in model.keys])
+        self._write_catalog()
+        model.forecast_version = key
+        self._loaded[key] = model
+        return key
+
+    def load(self, key):
+        """returns the model saved under 'key'"""
+        if key in self._loaded:
+            return self._loaded[key]
+
+        entry = self.catalog[key]
+        path = os.path.join(self.root, entry['file'])
+        if entry['kind'] == 'sarimax':
+            import statsmodels.api as sm
+            with open(path, 'rb') as f:
+                saved = pickle.load(f)
+            spec = saved['spec']
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                sarimax = sm.tsa.statespace.SARIMAX(saved['endog'], order=tuple(spec['order']),
+                                                    seasonal_order=tuple(spec['seasonal_order']),
+                                                    trend=spec['trend'],
+                                                    enforce_stationarity=False,
+                                                    enforce_invertibility=False)
+                model = sarimax.filter(pd.Series(saved['params'], index=saved['param_names']))
+        elif entry['kind'] == 'global_lstm':
+            from nyc311.global_lstm import GlobalLSTM
+            model = GlobalLSTM.load(path)
+        else:
+            from tensorflow import keras
+            model = keras.models.load_model(path)
+
+        model.forecast_version = key
+        self._loaded[key] = model
+        return model
+
+    def find(self, slice_key, spec=None, ts=None):
+        """returns the keys saved for 'slice_key', newest first, optionally only those with a given
+           'spec' and trained on exactly 'ts'"""
+        wanted_hash = None if ts is None else window_hash(ts)
+        keys = [key for key, entry in self.catalog.items()
+                if entry['slice'] == str(slice_key)
+                and (spec is None or entry['spec'] == json.loads(json.dumps(spec)))
+                and (wanted_hash is None or entry['window_hash'] == wanted_hash)]
+        return sorted(keys, key=lambda k: self.catalog[k]['saved'], reverse=True)
+
+    def fit_or_load(self, ts, order, s_order, trend, slice_key):
+        """returns the SARIMAX model for this slice, spec and training series from the registry,
+           fitting it with SARIMA_modeler and saving it only when it is not there yet"""
+        spec = {'order': list(order), 'seasonal_order': list(s_order), 'trend': trend}
+        key = model_key(slice_key, spec, ts)
+        if key in self.catalog:
+            return self.load(key)
+
+        from nyc311.timeseries import SARIMA_modeler
+        model = SARIMA_modeler(ts, order, s_order, trend)
+        self.save(model, slice_key)
+        return model
+
+    def entries(self):
+        """returns the catalog as a dataframe, one row per saved model"""
+        return pd.DataFrame.from_dict(self.catalog, orient='index').rename_axis('key')
+
+    def remove(self, key):
+        """deletes a saved model"""
+        entry = self.catalog.pop(key)
+        self._loaded.pop(key, None)
+        path = os.path.join(self.root, entry['file'])
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+        self._write_catalog()
+
+
+###########################
+# FORECAST CACHE FUNCTIONS #
+###########################
+
+def model_version(model):
+    """returns the version forecasts of 'model' are cached under: its registry key once it was
+       saved to or loaded from a ModelRegistry, otherwise a random token given to the model on first
+       use. Unlike id(model) a version is never reused by another model, and the cache does not
+       need to keep the model alive to guarantee that."""
+    version = getattr(model, 'forecast_version', None)
+    if version is None:
+        version = uuid.uuid4().hex
+        model.forecast_version = version
+    return version
+
+
+class ForecastCache:
+    """least recently used cache of forecasts keyed by (model version, steps, alpha). Holds at
+       most 'max_size' forecasts, each for at most 'ttl' seconds (None = no expiry). Only the
+       forecasts are held, never the models."""
+
+    def __init__(self, max_size=256, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """returns the cached value for 'key' or None when missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self.ttl is not None and time.monotonic() - entry['time'] > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry['value']
+
+    def put(self, key, value):
+        self._entries[key] = {'value': value, 'time': time.monotonic()}
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+FORECAST_CACHE = ForecastCache()
+
+
+def sarimax_forecast(model, steps, alpha):
+    """returns a dataframe with the 'mean', 'lower' and 'upper' forecast of a fitted SARIMAX model"""
+    prediction = model.get_forecast(steps=steps)
+    ci = prediction.conf_int(alpha=alpha)
+    return pd.DataFrame({'mean': np.asarray(prediction.predicted_mean),
+                         'lower': ci.iloc[:, 0].to_numpy(),
+                         'upper': ci.iloc[:, 1].to_numpy()},
+                        index=prediction.predicted_mean.index)
+
+
+def forecast_key(model, steps, alpha, forecaster=sarimax_forecast):
+    """returns the ForecastCache key of a forecast"""
+    return (model_version(model), steps, alpha, getattr(forecaster, '__name__', id(forecaster)))
+
+
+def cached_forecast(model, steps=36, alpha=.05, forecaster=sarimax_forecast, cache=None):
+    """takes a fitted model, the number of 'steps' to forecast and a level 'alpha' and returns a
+       dataframe with the 'mean', 'lower' and 'upper' forecast, computed by 'forecaster' only the
+       first time this (model, steps, alpha) is asked for. Callers must not modify the result."""
+    cache = FORECAST_CACHE if cache is None else cache
+    key = forecast_key(model, steps, alpha, forecaster)
+
+    forecast = cache.get(key)
+    if forecast is not None:
+        cache.hits += 1
+        return forecast
+
+    cache.misses += 1
+    forecast = forecaster(model, steps, alpha)
+    cache.put(key, forecast)
+    return forecast
@@ -0,0 +1,84 @@
+# import libraries
+import os
+import signal
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+
+class FitTimeout(Exception):
+    """raised inside a worker when a single task runs past its time limit"""
+    pass
+
+
+def get_n_jobs(n_jobs=None):
+    """takes a requested number of workers (None or -1 for every core) and
+       returns the number of processes to actually use"""
+
+    # use every available core when no number (or -1) is given
+    cores = os.cpu_count() or 1
+    if n_jobs is None or n_jobs == -1:
+        return cores
+
+    # never use fewer than one or more than the number of cores
+    return max(1, min(int(n_jobs), cores))
+
+
+@contextmanager
+def time_limit(seconds=None):
+    """context manager that raises FitTimeout if the wrapped block takes longer
+       than 'seconds'. Uses SIGALRM, so on platforms without it (or outside the
+       main thread) the block simply runs without a limit."""
+
+    # nothing to do when no limit is set or alarms are not available
+    if not seconds or not hasattr(signal, 'SIGALRM'):
+        yield
+        return
+
+    def _raise_timeout(signum, frame):
+        raise FitTimeout(f'timed out after {seconds}s')
+
+    try:
+        previous = signal.signal(signal.SIGALRM, _raise_timeout)
+    except ValueError:
+        # signals can only be set from the main thread
+        yield
+        return
+
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def pool_map(func, tasks, n_jobs=None, chunksize=1, pool=None):
+    """takes a picklable function and a list of tasks and returns a list of
+       func(task) results in the same order as the tasks. Runs in a process pool
+       of 'n_jobs' workers, or in this process when only one worker is needed.
+       An already running executor can be passed as 'pool' to reuse its workers."""
+
+    tasks = list(tasks)
+
+    # reuse a running pool when one is given
+    if pool is not None:
+        return list(pool.map(func, tasks, chunksize=chunksize))
+
+    n_jobs = min(get_n_jobs(n_jobs), max(len(tasks), 1))
+
+    # skip the cost of spawning a pool when it would not help
+    if n_jobs == 1:
+        return [func(t) for t in tasks]
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        return list(pool.map(func, tasks, chunksize=chunksize))
+
+
+def timed_call(func, *args, **kwargs):
+    """calls func with the given arguments and returns a tuple of
+       (result, wall time in seconds)"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
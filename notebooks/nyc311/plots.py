@@ -0,0 +1,277 @@
+# import libraries
+from nyc311._lazy import lazy_module, pyplot
+from nyc311.timeseries import adf_test, avg_YoY_change
+from nyc311.model_registry import cached_forecast
+from nyc311.instrumentation import instrument_module
+
+# matplotlib is only imported when the first chart is drawn, with a non-interactive backend
+# when there is no display
+plt = lazy_module('matplotlib.pyplot', loader=pyplot)
+
+
+def _show():
+    """shows the current figure, or closes it when running headless so batch jobs do not keep
+       every figure in memory"""
+    if plt.get_backend().lower() == 'agg':
+        plt.close('all')
+    else:
+        plt.show()
+
+
+def plot_acf(*args, **kwargs):
+    """statsmodels' autocorrelation plot, imported on first use"""
+    from statsmodels.graphics.tsaplots import plot_acf
+    return plot_acf(*args, **kwargs)
+
+
+def plot_pacf(*args, **kwargs):
+    """statsmodels' partial autocorrelation plot, imported on first use"""
+    from statsmodels.graphics.tsaplots import plot_pacf
+    return plot_pacf(*args, **kwargs)
+
+
+##############################
+# EXPLORATORY PLOT FUNCTIONS #
+##############################
+
+def stacked_growth(df):
+    """Plot the growth rates of all cities in a dataframe in clustered bar chart,
+       along with the mean growth rates of all cities, ordered from left to right by 
+       1yr_growth rate."""
+    
+    # keys for columns to plot from the dataframe   
+    grow_rates = ['total_growth', '5yr_growth', '3yr_growth', '1yr_growth']
+
+    # get the mean growth rate for each time period      
+    means = [df[i].mean() for i in grow_rates]
+
+    # colors to assign horizontal lines
+    colors = ['blue', 'red', 'gold', 'green']
+
+    #plot clustered cities 
+    fig = plt.figure(figsize=(14, 8))
+
+    # sort by 1yr growth and plot clustered bar chart    
+    df.sort_values('1yr_growth').plot(x= 'city_zipcode', 
+                                      y = grow_rates, 
+                                      kind='bar', 
+                                      figsize=(14, 8))
+    
+    
+    # plot growth rate means as horizontal lines
+    plt.hlines(y= means, xmin=-1, xmax=len(df), color=colors, label=('Mean growth'))
+    
+    plt.legend()
+    plt.title('City_zipcode Growth Rates')
+    
+    _show()
+
+
+def graph_growth(df):
+    """Plot the total, 5yr, 3yr, and 1yr growth rates for each city in the data frame in 
+       individual bar charts. Plot a horixontal line that represents the mean.""" 
+    
+    
+    f = plt.figure(figsize= ( 16, 16))
+    # create space between plots
+    plt.subplots_adjust(hspace= 1)
+
+    # set the value for x to the key for the city name in the dataframe
+    x = 'city_zipcode'
+    # set the lenth of the horizintal line 
+    x_len = len(df)
+
+    # plot total growth     
+    ax1 = f.add_subplot(2,2,1)
+    df.sort_values('total_growth').plot(x=x, y='total_growth', kind='bar', ax=ax1)
+    plt.hlines(y=df.total_growth.mean(), xmin=0, xmax=x_len, label=('Mean Total Growth'))
+    plt.title('Total Growth')
+    plt.legend()
+
+    # plot 5yr growth
+    ax2 = f.add_subplot(2,2,2)
+    df.sort_values('5yr_growth').plot(x=x, y='5yr_growth', kind='bar', ax=ax2)
+    plt.hlines(y=df['5yr_growth'].mean(), xmin=0, xmax=x_len, label=('Mean 5-year Growth'))
+    plt.title('5-year Growth')
+    plt.legend()
+
+    # plot 3yr growth
+    ax3 = f.add_subplot(2,2,3)
+    df.sort_values('3yr_growth').plot(x=x, y='3yr_growth', kind='bar', ax=ax3)
+    plt.hlines(y=df['3yr_growth'].mean(), xmin=0, xmax=x_len, label=('Mean 3-year Growth'))
+    plt.title('3-year Growth')
+    plt.legend()
+
+    # plot 1yr growth
+    ax4 = f.add_subplot(2,2,4)
+    df.sort_values('1yr_growth').plot(x=x, y='1yr_growth', kind='bar', ax=ax4)
+    plt.hlines(y=df['1yr_growth'].mean(), xmin=0, xmax=x_len, label=('Mean 1-year Growth'))
+    plt.title('1-year Growth')
+    plt.legend()
+    
+    _show()
+
+
+def plot_time_series(ts, variable):
+    """takes a dictionary of time series data frames and plots a 
+        chosen variable (ex. 'value') in a series of subplots"""
+    
+    # creat figure and space between subplots
+    fig = plt.figure(figsize=(20,18))
+    plt.subplots_adjust(hspace= .5)
+    
+    # determine the number of subplots to create
+    nrows = len(ts)//3 + 1
+    ncols = 3
+    
+    # use dict keys as plot titles
+    titles = list(ts.keys())
+    
+    # iterate through dict and plot each plot in a new sub plot 
+    for i,v in enumerate(ts):
+        ax = fig.add_subplot(nrows, ncols, i+1)
+        ts[v][variable].plot(label=variable, ax=ax)
+        plt.title(titles[i])
+        plt.ylabel(variable)
+        
+    _show()
+
+
+def plot_time_series2(ts):
+    """takes a dictionary of time series dataframes and makes three plots 
+       for each key:value pair: 'value', YoY_change', and 'YoY_rate_change'"""
+    
+    # create subplot values
+    nrows = len(ts)
+    ncols = 3
+    
+    # creat figure and space between subplots
+    fig = plt.figure(figsize=(16,(nrows*3)))
+    plt.subplots_adjust(hspace= 1.2)
+    
+   
+    # use dict keys as plot titles
+    titles = list(ts.keys())
+    
+    # columns to plot from eact dataframe
+    variables = ['value', 'YoY_change', 'YoY_rate_change']
+    
+    # set base value to iterate on for axes
+    axs = 0
+    
+    # iterate through each key:value pair and each variable to plot
+    # enumerate to use as axes values
+    for i,v in enumerate(ts):
+        for x in variables:
+            axs += 1 
+            ax = fig.add_subplot(nrows, ncols, axs)
+            ts[v][x].plot(label=x, ax=ax)
+            plt.title(titles[i] + '_' + x)
+            plt.ylabel(x, fontsize= 10)
+            plt.xticks(fontsize= 10, rotation=45)
+            plt.hlines(y=0, xmin='2009-01', xmax='2018-04', colors='orange', linestyles='--')
+
+    _show()
+
+
+def plot_avg_YoY(ts_dict):
+    """take a dicitonary of time series dataframes and plot a bar chart
+       of average YoY growth"""
+    
+    # get a sorted list of average YoY changes
+    avgs = avg_YoY_change(ts_dict)
+    
+    # establish x and y values 
+    x = [i[0] for i in avgs]
+    y = [i[1] for i in avgs]
+    
+    # plot avearges in a bar chart
+    fig = plt.figure(figsize=(14,6))
+    plt.bar(x=x, height=y)
+    plt.xticks(rotation='vertical')
+    _show()
+
+
+###############################
+# STATIONARITY PLOT FUNCTIONS #
+###############################
+
+def plot_rolling_stats(ts, title=None):
+    """takes in a time series and optional title and plots 
+       values, rolling mean, and rolling std."""
+    
+    # calculate rolling mean and standard deviation over 12 periods
+    roll_mean = ts.rolling(window=12, center=False).mean()
+    roll_std = ts.rolling(window=12, center=False).std()
+    
+    # plot the value, rolling mean, and rolling std in one plot
+    fig = plt.figure(figsize=(12,4))
+    orig = plt.plot(ts, color='blue', label='Value')
+    mean = plt.plot(roll_mean, color='orange', label='Rolling Mean')
+    std = plt.plot (roll_std, color='green', label='Rolling Std')
+    plt.legend(loc='best')
+    plt.title(title + ' ' + 'Rolling Mean & Standard Deviation')
+    _show()
+
+
+def stationarity_check(ts, title=None):
+    """takes a time series and optional title and plots values, 
+       rolling mean, rolling std, and prints results of a Dickey-Fuller test"""
+    plot_rolling_stats(ts, title=title)
+    adf_test(ts)
+
+
+########################
+# MODEL PLOT FUNCTIONS #
+########################
+
+def model_details(model):
+    """takes a fitted SARIMAX model and displays coefficients, p-values, and AIC, and plots
+       diagnostic plots for heteroskedasticity, residual distribution, and correlation."""
+    
+    print('Model coefficients: ', model.params)
+    print('\n Model p_values: ', model.pvalues)
+    print('\n Model AIC: ', model.aic)
+    
+    model.plot_diagnostics(figsize=(12,12))
+
+
+def plot_model(ts, model, title=None):
+    """takes a time series and a fitted model and plots them together to observe fit."""
+    fig = plt.figure(figsize=(12,6))
+
+    plt.plot(model.predict(), label='model')
+    plt.plot(ts, label='original', alpha=.7)
+    plt.legend()
+    plt.title(title)
+    plt.xlabel('Dates')
+    plt.ylabel('Values')
+    _show()
+
+
+def plot_forcast_model(ts, model, alpha=.01, title=None):
+    """takes a time series, a fitted model, and a level alpha (default = .01)
+       and plots forecasted future values and the confidence interval."""
+    
+    # get predicted values for 36 steps going forward (reused if already forecast)
+    prediction = cached_forecast(model, steps=36, alpha=alpha)
+    
+    # get the confidence interval for predictions based on confidence level alpha
+    pred_conf = prediction[['lower', 'upper']]
+    
+    # plot original values and predicted values with confidence interval
+    ax = ts.plot(label='observed', figsize=(16, 8))
+    prediction['mean'].plot(ax=ax, label='Forecast')
+    ax.fill_between(pred_conf.index,
+                    pred_conf.iloc[:, 0],
+                    pred_conf.iloc[:, 1], color='k', alpha=.25)
+    ax.set_xlabel('Dates')
+    ax.set_ylabel('Values')
+
+    plt.legend()
+    plt.title(title)
+    _show()
+
+
+# record every helper's calls while instrumentation is enabled
+instrument_module(globals())
@@ -0,0 +1,313 @@
+# import libraries
+import html
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from nyc311.growth import GROWTH_HORIZONS
+from nyc311.parallel_helpers import get_n_jobs, pool_map
+
+
+# growth rate columns, as growth_rates adds them
+GROWTH_COLUMNS = list(GROWTH_HORIZONS)
+
+# rows, columns and size (inches) of the figure of every chart kind
+_LAYOUTS = {'series': (1, 1, (8, 3)),
+            'yoy': (1, 3, (16, 3)),
+            'growth': (1, 1, (6, 3.5)),
+            'forecast': (1, 1, (10, 4))}
+
+# one figure per chart kind in each worker process, reused for every chart it draws
+_CHARTS = {}
+
+
+##########################
+# CHART DRAWING FUNCTIONS #
+##########################
+# each drawer takes the chart of its kind, the series key and the chart's data. It creates its
+# artists (lines, bars, ...) the first time and only gives them new data afterwards, which skips
+# rebuilding the axes, ticks and legend for every series.
+
+def _chart(kind):
+    """returns the worker's chart for a kind: a dictionary with its 'fig', 'axes' and 'artists'.
+       The figure is created once, on an Agg canvas outside pyplot, so it is never shown, never
+       registered with pyplot and is reused for every chart of that kind."""
+    if kind not in _CHARTS:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        nrows, ncols, size = _LAYOUTS[kind]
+        fig = Figure(figsize=size)
+        FigureCanvasAgg(fig)
+        _CHARTS[kind] = {'fig': fig, 'axes': fig.subplots(nrows, ncols, squeeze=False).ravel(),
+                         'artists': {}, 'drawn': False}
+    return _CHARTS[kind]
+
+
+def _dates(index):
+    """index as datetimes (period and text month indexes are converted)"""
+    if isinstance(index, pd.PeriodIndex):
+        return index.to_timestamp()
+    if not isinstance(index, pd.DatetimeIndex):
+        return pd.to_datetime(index)
+    return index
+
+
+def _line(chart, name, ax, x, y, **style):
+    """creates line 'name' on the first chart and sets its data on later ones"""
+    line = chart['artists'].get(name)
+    if line is None:
+        line, = ax.plot(x, y, **style)
+        chart['artists'][name] = line
+    else:
+        line.set_data(x, y)
+    return line
+
+
+def _rescale(*axes):
+    """fits the axes limits to the current data"""
+    for ax in axes:
+        ax.relim()
+        ax.autoscale_view()
+
+
+def _draw_series(chart, key, data):
+    """one series' 'variable' over time (plot_time_series, one chart per series)"""
+    ax = chart['axes'][0]
+    _line(chart, 'value', ax, _dates(data['ts'].index), data['ts'].to_numpy(dtype='float64'))
+    _rescale(ax)
+    ax.set_title(str(key))
+    ax.set_ylabel(data['variable'])
+
+
+def _draw_yoy(chart, key, data):
+    """value, YoY change and YoY rate of change side by side (plot_time_series2, one row per series)"""
+    df = data['df']
+    dates = _dates(df.index)
+    for ax, column in zip(chart['axes'], ['value', 'YoY_change', 'YoY_rate_change']):
+        values = df[column].to_numpy(dtype='float64') if column in df else np.full(len(df), np.nan)
+        if column not in chart['artists']:
+            ax.axhline(0, color='orange', linestyle='--')
+            ax.tick_params(axis='x', labelrotation=45, labelsize=8)
+        _line(chart, column, ax, dates, values)
+        _rescale(ax)
+        ax.set_title(f'{key}_{column}', fontsize=10)
+
+
+def _draw_growth(chart, key, data):
+    """a series' growth rates next to the mean of all series (graph_growth and stacked_growth,
+       one chart per series)"""
+    ax = chart['axes'][0]
+    rates = np.nan_to_num(np.asarray(data['rates'], dtype='float64'), posinf=0, neginf=0)
+    if 'rates' not in chart['artists']:
+        x = np.arange(len(rates))
+        chart['artists']['rates'] = ax.bar(x - .2, rates, width=.4, label='growth')
+        ax.bar(x + .2, data['means'], width=.4, color='lightgray', label='mean of all series')
+        ax.axhline(0, color='black', linewidth=.8)
+        ax.set_xticks(x)
+        ax.set_xticklabels(data['labels'])
+        ax.legend(fontsize=8)
+    else:
+        for bar, rate in zip(chart['artists']['rates'], rates):
+            bar.set_height(rate)
+    _rescale(ax)
+    ax.set_title(f'{key} Growth Rates')
+
+
+def _draw_forecast(chart, key, data):
+    """observed values, forecast and its confidence interval (plot_forcast_model)"""
+    ax = chart['axes'][0]
+    forecast = data['forecast']
+    dates = _dates(forecast.index)
+    lower = forecast['lower'].to_numpy(dtype='float64')
+    upper = forecast['upper'].to_numpy(dtype='float64')
+
+    _line(chart, 'observed', ax, _dates(data['ts'].index), data['ts'].to_numpy(dtype='float64'),
+          label='observed')
+    _line(chart, 'forecast', ax, dates, forecast['forecast'].to_numpy(dtype='float64'), label='Forecast')
+    # the interval edges are lines so the limits fit them; the shading between them is redrawn
+    _line(chart, 'lower', ax, dates, lower, color='k', linewidth=.5, alpha=.4)
+    _line(chart, 'upper', ax, dates, upper, color='k', linewidth=.5, alpha=.4)
+    if 'interval' in chart['artists']:
+        chart['artists']['interval'].remove()
+    chart['artists']['interval'] = ax.fill_between(dates, lower, upper, color='k', alpha=.25)
+
+    if 'legend' not in chart['artists']:
+        ax.set_xlabel('Dates')
+        ax.set_ylabel('Values')
+        chart['artists']['legend'] = ax.legend()
+    _rescale(ax)
+    ax.set_title(str(key))
+
+
+_DRAWERS = {'series': _draw_series, 'yoy': _draw_yoy, 'growth': _draw_growth, 'forecast': _draw_forecast}
+
+
+def _render_batch(task):
+    """worker function: draws and saves every (kind, key, path, data) chart in task['charts'] and
+       returns a list of rows with the file, render time and failure reason of each. A failure in
+       one chart does not stop the rest of the batch."""
+    rows = []
+    for kind, key, path, data in task['charts']:
+        start = time.perf_counter()
+        failure = None
+        try:
+            chart = _chart(kind)
+            _DRAWERS[kind](chart, key, data)
+            # lay the figure out once; later charts of the kind keep the same layout
+            if not chart['drawn']:
+                chart['fig'].tight_layout()
+                chart['drawn'] = True
+            chart['fig'].savefig(path, dpi=task['dpi'])
+        except Exception as e:
+            failure = f'{type(e).__name__}: {e}'
+        rows.append({'series': key, 'kind': kind, 'path': path,
+                     'render_time': time.perf_counter() - start, 'failure': failure})
+    return rows
+
+
+#####################
+# REPORT FUNCTIONS #
+#####################
+
+def _file_names(keys):
+    """a file name for every key that is safe on any file system and unique within the report"""
+    names, used = {}, set()
+    for key in keys:
+        text = ' '.join(map(str, key)) if isinstance(key, tuple) else str(key)
+        base = re.sub(r'[^A-Za-z0-9._-]+', '_', text).strip('_')[:80] or 'series'
+
+        # a numbered name can itself be another key's name, so count up until one is free
+        # (compared without case, for case-insensitive file systems)
+        name, n = base, 1
+        while name.lower() in used:
+            name, n = f'{base}_{n}', n + 1
+        used.add(name.lower())
+        names[key] = name
+    return names
+
+
+def report_charts(series=None, variable='value', forecasts=None, growth=None, kinds=None):
+    """takes any of a dictionary of time series dataframes (or series) like the one get_time_series
+       returns, a forecast dataframe like the one batch_forecast returns (its 'series' keys match
+       'series') and a dataframe of growth rates like the one growth_rates fills in, and returns a
+       list of (kind, key, data) charts to draw: 'series' (the chosen 'variable'), 'yoy' (value and
+       YoY changes, when the dataframes have them), 'forecast' and 'growth'. 'kinds' keeps only
+       the listed kinds."""
+    charts = []
+    series = series or {}
+
+    for key, ts in series.items():
+        values = ts[variable] if isinstance(ts, pd.DataFrame) else ts
+        charts.append(('series', key, {'ts': values, 'variable': variable}))
+        if isinstance(ts, pd.DataFrame) and 'YoY_change' in ts:
+            charts.append(('yoy', key, {'df': ts}))
+
+    if forecasts is not None and len(forecasts):
+        for key, forecast in forecasts.groupby('series', sort=False):
+            if key not in series:
+                continue
+            observed = series[key]
+            observed = observed[variable] if isinstance(observed, pd.DataFrame) else observed
+            charts.append(('forecast', key, {'ts': observed,
+                                             'forecast': forecast.set_index('date')[['forecast', 'lower', 'upper']]}))
+
+    if growth is not None and len(growth):
+        columns = [c for c in GROWTH_COLUMNS if c in growth]
+        means = growth[columns].mean().to_numpy()
+        labels = [c.replace('_growth', '') for c in columns]
+        for key, rates in zip(growth['city_zipcode'], growth[columns].to_numpy()):
+            charts.append(('growth', key, {'rates': rates, 'means': means, 'labels': labels}))
+
+    return [c for c in charts if kinds is None or c[0] in kinds]
+
+
+def _index_page(rows, title, kinds):
+    """html page with one table row per series and a thumbnail of each of its charts"""
+    by_key = {}
+    for row in rows:
+        by_key.setdefault(row['series'], {})[row['kind']] = row
+
+    header = ''.join(f'<th>{html.escape(kind)}</th>' for kind in kinds)
+    body = []
+    for key, charts in by_key.items():
+        cells = []
+        for kind in kinds:
+            row = charts.get(kind)
+            if row is None:
+                cells.append('<td></td>')
+            elif row['failure']:
+                cells.append(f'<td class="failed">{html.escape(row["failure"])}</td>')
+            else:
+                src = html.escape(row['file'])
+                cells.append(f'<td><a href="{src}"><img src="{src}" loading="lazy"></a></td>')
+        body.append(f'<tr><th>{html.escape(str(key))}</th>{"".join(cells)}</tr>')
+
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{html.escape(title)}</title>
+<style>
+body {{ font-family: sans-serif; margin: 1em; }}
+table {{ border-collapse: collapse; }}
+th, td {{ border-bottom: 1px solid #ddd; padding: 4px; vertical-align: top; text-align: left; }}
+img {{ max-width: 480px; }}
+.failed {{ color: #b00; }}
+</style>
+</head>
+<body>
+<h1>{html.escape(title)}</h1>
+<p>{len(by_key)} series, generated {pd.Timestamp.now():%Y-%m-%d %H:%M}</p>
+<table>
+<tr><th>series</th>{header}</tr>
+{chr(10).join(body)}
+</table>
+</body>
+</html>
+"""
+
+
+def render_report(out_dir, series=None, variable='value', forecasts=None, growth=None, kinds=None,
+                  fmt='png', dpi=100, n_jobs=None, batch_size=32, title='NYC 311 series report',
+                  show=True):
+    """renders one chart file per series and chart kind (see report_charts for the inputs) into
+       'out_dir'/<kind>/ as 'fmt' ('png' or 'svg') and writes 'out_dir'/index.html linking them
+       all. Charts are drawn in a pool of 'n_jobs' processes, 'batch_size' charts per task, on
+       the non-interactive Agg canvas, and every worker reuses one figure per chart kind, so
+       memory stays flat however many series there are. Returns a dataframe with the file,
+       render time and failure reason of every chart."""
+
+    charts = report_charts(series, variable=variable, forecasts=forecasts, growth=growth, kinds=kinds)
+    names = _file_names(dict.fromkeys(key for _, key, _ in charts))
+
+    planned = []
+    for kind, key, data in charts:
+        os.makedirs(os.path.join(out_dir, kind), exist_ok=True)
+        planned.append((kind, key, os.path.join(out_dir, kind, f'{names[key]}.{fmt}'), data))
+
+    tasks = [{'charts': planned[i:i + batch_size], 'dpi': dpi} for i in range(0, len(planned), batch_size)]
+
+    start = time.perf_counter()
+    rows = [row for result in pool_map(_render_batch, tasks, n_jobs=n_jobs) for row in result]
+    wall_time = time.perf_counter() - start
+
+    for row in rows:
+        row['file'] = os.path.relpath(row['path'], out_dir).replace(os.sep, '/')
+    used_kinds = list(dict.fromkeys(kind for kind, _, _ in charts))
+    with open(os.path.join(out_dir, 'index.html'), 'w') as f:
+        f.write(_index_page(rows, title, used_kinds))
+
+    results = pd.DataFrame(rows, columns=['series', 'kind', 'path', 'file', 'render_time', 'failure'])
+    results.attrs['wall_time'] = wall_time
+
+    if show == True:
+        n_failed = results['failure'].notna().sum()
+        print(f'Rendered {len(results) - n_failed} of {len(results)} charts in {round(wall_time, 2)}s '
+              f'on {min(get_n_jobs(n_jobs), max(len(tasks), 1))} workers '
+              f'({os.path.join(out_dir, "index.html")})')
+
+    return results
@@ -0,0 +1,186 @@
+# import libraries
+import itertools
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor
+
+from nyc311.parallel_helpers import get_n_jobs, pool_map, time_limit
+
+
+############################
+# SARIMA GRID SEARCH ENGINE #
+############################
+
+def SARIMA_candidates(order=2, m=12):
+    """takes the end of the range of values for (p,d,q) and (P,D,Q) (default = 2) and the
+       seasonal period 'm' (default = 12) and returns a list of (pdq, pdqs) pairs,
+       the same grid SARIMA_iterator searches"""
+
+    # Define the p, d and q parameters to take any value between 0 and order
+    p = d = q = range(0, order)
+
+    # Generate all different combinations of p, d and q triplets
+    pdq = list(itertools.product(p, d, q))
+
+    # Generate all different combinations of seasonal P, D and Q triplets
+    pdqs = [(x[0], x[1], x[2], m) for x in pdq]
+
+    return list(itertools.product(pdq, pdqs))
+
+
+def _complexity(candidate):
+    """returns the number of ARMA terms (p + q + P + Q) in a (pdq, pdqs) pair"""
+    (p, d, q), (P, D, Q, m) = candidate
+    return p + q + P + Q
+
+
+def _parents(candidate):
+    """returns the (pdq, pdqs) pairs that have one less ARMA term than 'candidate'
+       and the same differencing, i.e. the neighbouring orders it can start from"""
+    (p, d, q), (P, D, Q, m) = candidate
+    parents = []
+    if p > 0:
+        parents.append(((p - 1, d, q), (P, D, Q, m)))
+    if q > 0:
+        parents.append(((p, d, q - 1), (P, D, Q, m)))
+    if P > 0:
+        parents.append(((p, d, q), (P - 1, D, Q, m)))
+    if Q > 0:
+        parents.append(((p, d, q), (P, D, Q - 1, m)))
+    return parents
+
+
+def _fit_candidate(task):
+    """worker function: fits one SARIMAX model described by 'task' and returns a dict
+       with the aic, fit time, fitted parameters and a failure reason (None on success)"""
+
+    # imported here so importing this module (and every helper built on it) stays cheap
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    result = {'pdq': task['pdq'], 'pdqs': task['pdqs'], 'aic': np.nan,
+              'fit_time': np.nan, 'warm_start': False, 'failure': None, 'params': None}
+    start = time.perf_counter()
+
+    try:
+        with warnings.catch_warnings(), time_limit(task['timeout']):
+            warnings.simplefilter('ignore')
+            mod = SARIMAX(task['ts'],
+                          order=task['pdq'],
+                          seasonal_order=task['pdqs'],
+                          trend=task['trend'],
+                          enforce_stationarity=False,
+                          enforce_invertibility=False)
+
+            # start from the parameters of a neighbouring fit when one is available;
+            # new terms start at 0 and the variance falls back to the sample variance
+            start_params = None
+            warm = task['warm_params']
+            if warm:
+                start_params = np.array([warm.get(name, 0.0) for name in mod.param_names])
+                if 'sigma2' in mod.param_names and 'sigma2' not in warm:
+                    start_params[mod.param_names.index('sigma2')] = np.nanvar(task['ts'])
+                result['warm_start'] = True
+
+            output = mod.fit(start_params=start_params, disp=False)
+
+        result['aic'] = output.aic
+        result['params'] = dict(zip(mod.param_names, np.asarray(output.params)))
+        if not np.isfinite(output.aic):
+            result['failure'] = 'non-finite aic'
+    except Exception as e:
+        result['failure'] = f'{type(e).__name__}: {e}'
+
+    result['fit_time'] = time.perf_counter() - start
+    return result
+
+
+def SARIMA_grid_search(ts, order=2, m=12, trend=None, n_jobs=None, timeout=None,
+                       warm_start=True, prune_aic=None, show=False):
+    """takes a time series and fits every (p,d,q)x(P,D,Q,m) combination with values up to
+       'order' (default = 2) over a pool of 'n_jobs' processes (default = every core) and
+       returns a DataFrame with one row per combination sorted by AIC: 'pdq', 'pdqs', 'aic',
+       'fit_time', 'warm_start' and 'failure' (the reason a fit did not produce an AIC).
+       Models are fitted in waves of increasing complexity (p+q+P+Q). 'timeout' limits the
+       seconds a single fit may take. 'warm_start' starts each fit from the parameters of an
+       already fitted neighbouring order. 'prune_aic', when set, skips a combination unless
+       one of its neighbours came within 'prune_aic' of the best AIC so far.
+       'show' prints each wave as it finishes."""
+
+    # group the grid into waves of equal complexity so simpler fits can seed harder ones
+    candidates = SARIMA_candidates(order=order, m=m)
+    waves = {}
+    for c in candidates:
+        waves.setdefault(_complexity(c), []).append(c)
+
+    fitted = {}
+    rows = []
+    best_aic = np.inf
+    n_jobs = min(get_n_jobs(n_jobs), len(candidates))
+    pool = ProcessPoolExecutor(max_workers=n_jobs) if n_jobs > 1 else None
+
+    try:
+        for level in sorted(waves):
+            tasks = []
+            for c in waves[level]:
+                parents = [fitted[p] for p in _parents(c) if p in fitted]
+
+                # prune combinations whose neighbours were all far from the best fit
+                if prune_aic is not None and level > 0:
+                    if not any(p['aic'] <= best_aic + prune_aic for p in parents):
+                        rows.append({'pdq': c[0], 'pdqs': c[1], 'aic': np.nan, 'fit_time': 0.0,
+                                     'warm_start': False, 'failure': 'pruned'})
+                        continue
+
+                # seed from the best neighbouring fit
+                warm_params = None
+                if warm_start and parents:
+                    warm_params = min(parents, key=lambda p: p['aic'])['params']
+
+                tasks.append({'ts': ts, 'pdq': c[0], 'pdqs': c[1], 'trend': trend,
+                              'timeout': timeout, 'warm_params': warm_params})
+
+            results = pool_map(_fit_candidate, tasks, n_jobs=1, pool=pool)
+
+            for r in results:
+                if r['failure'] is None:
+                    fitted[(r['pdq'], r['pdqs'])] = r
+                    best_aic = min(best_aic, r['aic'])
+                rows.append({k: v for k, v in r.items() if k != 'params'})
+
+            if show == True:
+                print(f'Wave {level}: fitted {len(tasks)} models, best AIC so far = {best_aic}')
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    results_df = pd.DataFrame(rows, columns=['pdq', 'pdqs', 'aic', 'fit_time', 'warm_start', 'failure'])
+    return results_df.sort_values('aic', na_position='last').reset_index(drop=True)
+
+
+def benchmark_grid_search(ts, cores=None, order=2, **kwargs):
+    """takes a time series and a list of worker counts (default = 1, 2, 4, ... up to every core)
+       and times SARIMA_grid_search with each, returning a DataFrame of 'n_jobs', 'wall_time',
+       'speedup' over one core and parallel 'efficiency'"""
+
+    # double the number of workers until every core is used
+    if cores is None:
+        cores = [1]
+        while cores[-1] * 2 < get_n_jobs():
+            cores.append(cores[-1] * 2)
+        if cores[-1] != get_n_jobs():
+            cores.append(get_n_jobs())
+
+    timings = []
+    for n in cores:
+        start = time.perf_counter()
+        SARIMA_grid_search(ts, order=order, n_jobs=n, **kwargs)
+        timings.append({'n_jobs': n, 'wall_time': time.perf_counter() - start})
+
+    bench = pd.DataFrame(timings)
+    bench['speedup'] = bench['wall_time'].iloc[0] / bench['wall_time']
+    bench['efficiency'] = bench['speedup'] / bench['n_jobs'] * bench['n_jobs'].iloc[0]
+    return bench
@@ -0,0 +1,156 @@
+# import libraries
+import hashlib
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from nyc311.parallel_helpers import get_n_jobs, pool_map
+
+
+# least recently used cache of adfuller results keyed by (transform name, hash of the tested
+# values), holding at most ADF_CACHE_SIZE results (about 40 per screened series)
+ADF_CACHE_SIZE = 50000
+_ADF_CACHE = OrderedDict()
+
+
+##################################
+# STATIONARITY SCREENING ENGINE #
+##################################
+
+def stationarity_transforms(ts, roll_periods=[3, 6, 8, 12], half_lifes=[1, 2, 3, 4],
+                            base_transforms=[None, 'log', 'sqrt']):
+    """takes a time series and returns a dataframe with one column per transformation checked by
+       stationarity_transformer: the base series ('Original', 'Log', 'Sqrt'), its first difference,
+       the series minus each rolling mean in 'roll_periods' and minus each weighted rolling mean in
+       'half_lifes', and the first difference of each of those. Every rolling and weighted mean
+       is computed once, for all base transforms at the same time."""
+
+    # stack the base transformations side by side so every window runs over all of them at once
+    names = {None: 'Original', 'log': 'Log', 'sqrt': 'Sqrt'}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        base = pd.DataFrame({names[t]: ts if t is None else getattr(np, t)(ts)
+                             for t in base_transforms}, index=ts.index)
+    base = base.replace([np.inf, -np.inf], np.nan)
+
+    columns = {}
+    for name in base.columns:
+        columns[name] = base[name]
+        columns[name + '_diff'] = base[name].diff(periods=1)
+
+    # subtract each rolling mean from the base values and from their difference
+    for i in roll_periods:
+        roll_minus = base - base.rolling(window=i).mean()
+        roll_minus_diff = roll_minus.diff(periods=1)
+        for name in base.columns:
+            columns[f'{name}_minus_roll_mean_{i}'] = roll_minus[name]
+            columns[f'{name}_minus_roll_mean_diff_{i}'] = roll_minus_diff[name]
+
+    # subtract each weighted rolling mean from the base values and from their difference
+    for h in half_lifes:
+        w_roll_minus = base - base.ewm(halflife=h).mean()
+        w_roll_minus_diff = w_roll_minus.diff(periods=1)
+        for name in base.columns:
+            columns[f'{name}_minus_w_roll_mean_{h}'] = w_roll_minus[name]
+            columns[f'{name}_minus_w_roll_mean_diff_{h}'] = w_roll_minus_diff[name]
+
+    return pd.DataFrame(columns, index=ts.index)
+
+
+def _adf_key(transform, values):
+    """returns the cache key for a transform's values"""
+    return transform, hashlib.sha1(np.ascontiguousarray(values).tobytes()).hexdigest()
+
+
+def _cache_get(key):
+    """returns a cached result (marking it as recently used) or None"""
+    result = _ADF_CACHE.get(key)
+    if result is not None:
+        _ADF_CACHE.move_to_end(key)
+    return result
+
+
+def _cache_put(key, result):
+    """stores a result, dropping the least recently used ones beyond ADF_CACHE_SIZE"""
+    _ADF_CACHE[key] = result
+    _ADF_CACHE.move_to_end(key)
+    while len(_ADF_CACHE) > ADF_CACHE_SIZE:
+        _ADF_CACHE.popitem(last=False)
+
+
+def _adf_batch(task):
+    """worker function: runs adfuller on each (transform, values) pair in a task and returns a
+       list of (transform, statistic, p-value, lags used, observations used) tuples. A transform
+       that can not be tested returns NaN values."""
+
+    # imported here so only workers that run tests load statsmodels
+    from statsmodels.tsa.stattools import adfuller
+
+    results = []
+    for transform, values in task:
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                stat, p, lags, nobs = adfuller(values)[:4]
+        except Exception:
+            stat = p = lags = nobs = np.nan
+        results.append((transform, stat, p, lags, nobs))
+    return results
+
+
+def screen_stationarity(series, alpha=.05, n_jobs=None, **transform_kwargs):
+    """takes a time series or a dictionary of time series (ex. one per complaint type) and runs the
+       Dickey-Fuller test on every transformation from stationarity_transforms, in a pool of 'n_jobs'
+       processes. A task holds the tests of one series, or a share of them when there are fewer
+       series than processes, so screening a single series is parallel too. Results are cached by
+       transform and values (the ADF_CACHE_SIZE most recently used), so repeated screens of the
+       same data skip the test. Returns a tidy dataframe with 'series', 'transform' (the column
+       names of stationarity_transforms, ex. 'Original_diff' or 'Log_minus_roll_mean_3'),
+       'statistic', 'p_value', 'n_lags', 'n_obs' and 'stationary' (p-value less than or equal
+       to 'alpha')."""
+
+    if isinstance(series, pd.Series):
+        series = {series.name if series.name is not None else 'series': series}
+
+    rows = []
+    tasks, task_series = [], []
+    for key, ts in series.items():
+        transforms = stationarity_transforms(ts, **transform_kwargs)
+        pending = []
+        for transform in transforms.columns:
+            values = transforms[transform].dropna().to_numpy(dtype='float64')
+            cache_key = _adf_key(transform, values)
+
+            # use the cached result when this exact test has been run before
+            cached = _cache_get(cache_key)
+            if cached is not None:
+                rows.append((key,) + cached)
+            else:
+                pending.append((transform, values))
+        if pending:
+            tasks.append(pending)
+            task_series.append(key)
+
+    # with fewer series than processes, split each series' tests so every process gets work
+    workers = get_n_jobs(n_jobs)
+    if tasks and len(tasks) < workers:
+        pieces = -(-workers // len(tasks))
+        split = [(key, task[i::pieces]) for key, task in zip(task_series, tasks) for i in range(pieces)]
+        split = [(key, task) for key, task in split if task]
+        task_series, tasks = [key for key, _ in split], [task for _, task in split]
+
+    # run the tests that are not cached
+    for key, task, results in zip(task_series, tasks, pool_map(_adf_batch, tasks, n_jobs=n_jobs)):
+        for (transform, values), result in zip(task, results):
+            _cache_put(_adf_key(transform, values), result)
+            rows.append((key,) + result)
+
+    screen = pd.DataFrame(rows, columns=['series', 'transform', 'statistic', 'p_value', 'n_lags', 'n_obs'])
+    screen['stationary'] = screen['p_value'] <= alpha
+    return screen
+
+
+def clear_adf_cache():
+    """empties the cache of Dickey-Fuller results used by screen_stationarity"""
+    _ADF_CACHE.clear()
@@ -0,0 +1,352 @@
+# import libraries
+import pandas as pd
+import numpy as np
+
+from nyc311.sarima_search import SARIMA_grid_search
+from nyc311.stationarity_screen import screen_stationarity
+from nyc311.model_registry import cached_forecast
+from nyc311.instrumentation import instrument_module
+
+from nyc311._lazy import lazy_module
+from nyc311.growth import (GROWTH_HORIZONS, average_change, growth_matrix, to_matrix,
+                           top_k_positions)
+
+# statsmodels is only imported when a test or model is first run
+sm = lazy_module('statsmodels.api')
+stattools = lazy_module('statsmodels.tsa.stattools')
+
+
+#######################################
+# EXPLORATORY DATA ANALYSIS FUNCTIONS #
+#######################################
+
+def growth_rates(df, horizons=GROWTH_HORIZONS, end=None):
+    """Add 4 growth rate columns ('total_growth', '5yr_growth', '3yr_growth', '1yr_growth') to a dataframe. 
+       Dataframe must have columns with monthly dates (ex. from 2009-01 to 2018-04); growth is measured
+       up to the last month, or 'end'. Other 'horizons' (name: months back, see growth_matrix) can be given."""
+    
+    # every horizon of every city in one array operation
+    ids, times, values = to_matrix(df)
+    rates, _, _ = growth_matrix(values, horizons, end=end, times=times)
+    for i, name in enumerate(horizons):
+        df[name] = rates[:, i]
+
+
+def top_growth_cities(df, k=5):
+    """Enter a dataframe with total, 5yr, 3yr, and 1yr growth rates and return a set of cities that
+       represent the top 5 (or 'k') for each growth period."""
+    
+    # partially select the top k of every growth period at once instead of sorting each one
+    columns = [c for c in GROWTH_HORIZONS if c in df.columns]
+    top = top_k_positions(df[columns].to_numpy(dtype='float64'), k)
+    
+    # return a dataframe that only includes cities in the top k of any period
+    rows = np.unique(top[top >= 0])
+    return df.iloc[rows]
+
+
+def melt_data(df):
+    """takes a dataframe and converts value data stored horizontally to a 
+       vertical time series and change the index to datetime"""
+
+    #drop unnecessary columns     
+    df = df.drop(columns=['SizeRank', 'total_growth', '5yr_growth', '3yr_growth', '1yr_growth']).copy()
+    
+    # melt data to covert to value to a vertical orientation
+    melted = pd.melt(df, id_vars=['city_zipcode', 'State', 'Metro', 'CountyName'], var_name='time')
+    # convert 'time' to datetime
+    
+    melted['time'] = pd.to_datetime(melted['time'], infer_datetime_format=True)
+    
+    # make 'time' the index
+    melted.set_index('time', inplace=True)
+    
+    # return the new time series dataframe
+    return melted
+
+
+def YoY_change(ts_dict):
+    """take a dictionary of monthly time series dataframes and
+       creates a column with the YoY change in value for
+       each key:value pair"""
+    
+    # iterate through each key and calculate the percent change in each value 
+    # over the last 12 month period
+    for v in ts_dict:
+        df = ts_dict[v]
+        df['YoY_change'] = df.value.pct_change(periods=12)
+
+
+def YoY_rate_o_change(ts_dict):
+    """take a dictionary of monthly time series dataframes and
+       creates a column with the YoY rate of change in value for
+       each key:value pair"""
+
+    # iterate through each key and calculate the differnce in each YoY change 
+    # over the last 3 periods
+    for v in ts_dict:
+        df = ts_dict[v]
+        df['YoY_rate_change'] = df.YoY_change.diff(periods=3)
+
+
+def melt_all(df, id_vars=['city_zipcode', 'State', 'Metro', 'CountyName'], periods=12, rate_periods=3):
+    """takes a wide dataframe with one row per key and one column per month and converts
+       every row to a vertical time series in a single pass. Returns a long dataframe indexed
+       by 'time' (sorted by key, then time) with the id columns, 'value', 'YoY_change'
+       (change over 'periods' months) and 'YoY_rate_change' (change in YoY_change over 'rate_periods')"""
+
+    # the value columns are the ones that are not ids or summary columns
+    summary = ['SizeRank', 'total_growth', '5yr_growth', '3yr_growth', '1yr_growth']
+    id_vars = [c for c in id_vars if c in df.columns]
+    value_cols = [c for c in df.columns if c not in id_vars and c not in summary]
+
+    # parse each column label once instead of once per row
+    times = pd.to_datetime(pd.Index(value_cols))
+    values = df[value_cols].to_numpy(dtype='float64')
+    n_keys, n_times = values.shape
+
+    # calculate YoY change and its rate of change for every key at once on the 2d array
+    yoy = np.full_like(values, np.nan)
+    rate = np.full_like(values, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        yoy[:, periods:] = values[:, periods:] / values[:, :-periods] - 1
+        rate[:, rate_periods:] = yoy[:, rate_periods:] - yoy[:, :-rate_periods]
+
+    # flatten row by row so each key's months stay together
+    melted = df[id_vars].iloc[np.repeat(np.arange(n_keys), n_times)].reset_index(drop=True)
+    melted['value'] = values.ravel()
+    melted['YoY_change'] = yoy.ravel()
+    melted['YoY_rate_change'] = rate.ravel()
+    melted.index = pd.DatetimeIndex(np.tile(times.values, n_keys), name='time')
+
+    return melted
+
+
+def get_time_series(df, columnar=False):
+    """takes a dataframe and returns a dictionary with unique city names as 
+       keys and a dataframe for that city as a value. Also calulates new values
+       'YoY_change' and 'YoY_rate_o_change' and adds new columns.
+       If 'columnar' is True returns the single long dataframe from melt_all instead."""
+    
+    # reshape every city and calculate YoY change and YoY rate of change in one pass
+    melted = melt_all(df)
+    if columnar:
+        return melted
+
+    # each city's rows are contiguous, so split the long frame into equal sized blocks
+    n_times = len(melted) // len(df) if len(df) else 0
+    time_series_dict = {}
+    for i, c in enumerate(df['city_zipcode']):
+        time_series_dict[c] = melted.iloc[i * n_times:(i + 1) * n_times].copy()
+    
+    # return a dictionary with cities and city data
+    return time_series_dict
+
+
+def avg_YoY_change(ts_dict):
+    """take a dictionary of time series data frames and calculate
+       the average YoY change for each one"""
+    
+    # average every city's YoY change at once and return a sorted list of (city, average)
+    averages = average_change(ts_dict, 'YoY_change')
+    order = np.argsort(averages.to_numpy(), kind='stable')
+    return list(zip(averages.index[order], averages.to_numpy()[order]))
+
+
+##########################
+# STATIONARITY FUNCTIONS #
+##########################
+
+def subtract_rollmean(ts, window=12):
+    """takes a takes a time series and window of periods (default = 12)
+       and subtracts the rolling mean and returns a new series"""
+    # calculate the rolling means and subtract them from the original time series
+    roll_mean = ts.rolling(window=window).mean()
+    ts_minus_rollmean = ts - roll_mean
+    
+    return ts_minus_rollmean
+
+
+def subtract_w_rollmean(ts, halflife=4):
+    """takes a time series and halflife (default = 4)
+       and subtracts the weighted rolling mean and returns a new series"""
+    # calculate the weighted rolling mean and subtract it from the original time series
+    w_roll_mean = ts.ewm(halflife=halflife).mean()
+    ts_minus_w_rollmean =  ts - w_roll_mean
+    
+    return ts_minus_w_rollmean
+
+
+def adf_test(ts):
+    """takes a time series and uses the advanced Dickey-Fuller Test
+       to determine if the series is stationary and prints results"""
+    
+    # drop missing values
+    ts = ts.dropna()
+    
+    print ('Results of Dickey-Fuller Test:')
+    dftest = stattools.adfuller(ts)
+
+    # Extract and display test results in a user friendly manner
+    dfoutput = pd.Series(dftest[0:4], index=['Test Statistic',
+                                             'p-value',
+                                             '#Lags Used',
+                                             'Number of Observations Used'])
+    for key,value in dftest[4].items():
+        dfoutput['Critical Value (%s)'%key] = value
+    print (dfoutput)
+
+
+def stationarity_transformer(ts, alpha=.05, transform=None):
+    """Takes a time series and iterates through a number of transformation techniques
+       and applies the adfuller test to return p-values below accepted levels for stationarity.
+       Also takes arguments 'alpha' (default = .05) and 'transform' (default= None).
+       'alpha' represents the maximum p-value allowed to be added to the final list.
+       'transform' represents base transformations to make such as 'log' or 'sqrt'.
+       The transformations keep their original labels (ex. 'Originaldiff: ' or
+       'Log_minus_roll_mean_3:'); screen_stationarity names them without the colons."""
+    
+    # compute every transformation in one pass and test them with cached adfuller results
+    screen = screen_stationarity(ts, alpha=alpha, base_transforms=[transform])
+    
+    # return (transformation, p-value) pairs for the stationary transformations
+    screen = screen[screen['stationary']]
+    return [(_transform_label(t), p) for t, p in zip(screen['transform'], screen['p_value'])]
+
+
+def _transform_label(transform):
+    """the label stationarity_transformer has always used for a screen_stationarity transform"""
+    if transform in ('Original', 'Log', 'Sqrt'):
+        return transform
+    if transform.endswith('_diff') and transform.count('_') == 1:
+        return transform[:-len('_diff')] + 'diff: '
+    return transform + ':'
+
+
+def all_stationarity(ts):
+    """takes a time series and checks stationarity with adfuller for multiple transformation types
+       and returns any transformation with a p-value less than or equal to .05"""
+    
+    # screen the original, log and sqrt transformations together
+    screen = screen_stationarity(ts)
+    display(screen[screen['stationary']])
+
+
+######################
+# MODELING FUNCTIONS #
+######################
+
+def SARIMA_iterator(ts, order=2, show=False, n_jobs=None, timeout=None):
+    """takes a time series and optional arguments 'order' and 'show' and returns
+       an optimal order and seasonal order for a SARIMAX model based on lowest AIC score.
+       'order' indicates the end of the range of values the function will iterate through
+       for values (p,d,q) and (P,D,Q) -- default = 2
+       'show' is a True/False value that determines if the function displays step-by-step iterations.
+       'n_jobs' and 'timeout' are passed to SARIMA_grid_search, which fits the grid in parallel.
+       Returns the full results table from SARIMA_grid_search. Raises a ValueError when no
+       combination could be fitted."""
+
+    # Run a parallel grid search over the pdq and seasonal pdq parameters
+    ans_df = SARIMA_grid_search(ts, order=order, n_jobs=n_jobs, timeout=timeout)
+
+    if show == True:
+        for row in ans_df.itertuples():
+            print('ARIMA {} x {}12 : AIC Calculated ={}'.format(row.pdq, row.pdqs, row.aic))
+
+    # every fit failing (or timing out) leaves no AIC to pick the best combination from
+    if ans_df['aic'].notna().sum() == 0:
+        reasons = ans_df['failure'].dropna().unique()[:3] if 'failure' in ans_df else []
+        raise ValueError(f'no SARIMA order could be fitted to this series ({len(ans_df)} tried), '
+                         f'ex. {"; ".join(reasons)}')
+
+    # display the combination with the best AIC value
+    display(ans_df.loc[ans_df['aic'].idxmin()])
+
+    return ans_df
+
+
+def SARIMA_modeler(ts, order, s_order, trend, start_params=None):
+    """takes a time series, a tuple (p,d,q) for 'order', a tuple (P,D,Q,m) for 's_order'
+       and string ‘n’,’c’,’t’,’ct’ for no trend, constant, linear, and constant with linear trend, respectively,
+       and returns a fitted SARIMAX model. 'start_params' (ex. the params of an earlier fit of the
+       same model) starts the optimizer from a warm start."""
+    
+    # create a SRAIMAX model based on inputs 'order', 's_order', and 'trend'
+    SARIMA_MODEL = sm.tsa.statespace.SARIMAX(ts,
+                                         order= order,
+                                         seasonal_order= s_order,
+                                         trend= trend,
+                                         enforce_stationarity=False,
+                                         enforce_invertibility=False)
+    output = SARIMA_MODEL.fit(start_params=start_params)
+    
+    return output
+
+
+def expected_growth(model, steps=36, name='this area', alpha=.05, show=True):
+    """take a model and default arguments 'steps' (number of steps to forcast forward, default = 36),
+       'name' (name of area under analysis), 'alpha' (determines confidence interval), and 'show' 
+       (dtermines wheter or not to print results) and returns upper, mean, and lower projected growth
+       based on the confidence interval of projected mean growth."""
+    
+    # forcast future values from fitted model for speficied number of steps, get confidence interval
+    # and get mean forcasted model results (reused if this model was already forecast)
+    model_results = cached_forecast(model, steps=steps, alpha=alpha)
+    ci = model_results[['lower', 'upper']]
+    mean_forecast = model_results['mean']
+    
+    # get confidence interval for printing
+    con_int = int((1-alpha)*100)
+    
+    # calculate the upper, mean, and lower potential growth based on confidence interval
+    upper_growth = (ci.iloc[-1,1] - ci.iloc[0,1]) / ci.iloc[0,1]
+    mean_growth = (mean_forecast.iloc[-1] - mean_forecast.iloc[0]) / mean_forecast.iloc[0]
+    lower_growth = (ci.iloc[-1,0] - ci.iloc[0,0]) / ci.iloc[0,0]
+    
+    # get the highest and lowest final values and show the range of potential outcomes
+    highest_final_value = ci.iloc[-1,1]
+    lowest_final_value = ci.iloc[-1,0]
+    range_of_growth_values = round((highest_final_value - lowest_final_value), 2)
+    
+    # if show is true print out the results
+    if show == True:
+        print(f'With a {con_int}% confidence interval {name} is forecasted to grow at the following rates after {steps} months: \n')
+        print(f'\t Upper Rate: {round((upper_growth*100),1)}%')
+        print(f'\t Mean Rate: {round((mean_growth*100),1)}%')
+        print(f'\t Lower Rate: {round((lower_growth*100),1)}%\n')
+        print(f'With a range of ${range_of_growth_values} between the higest and lowest projected values.')
+    
+    return upper_growth, mean_growth, lower_growth
+
+
+def ROI_calculator(model, ts, investment=10e6, steps=36, name='this area'):
+    """Takes a model and time series and default arguments for 'investment', 'steps', and 'name', 
+        and returns the amount of return projected over the time period specified"""
+    
+    # get the upper, mean, and lower growth projections based on confidence interval
+    upper, mean, lower = expected_growth(model=model,
+                                         steps = steps,
+                                         show = False)
+
+    # get the current median price of a property in the area under analysis
+    current_price = ts.iloc[-1]
+    
+    # determine how mant properties could be purched with the initial investment
+    n_properties = investment // current_price
+    
+    # calculate the amount of return we would get for the number of properties we purchased
+    upper_return = round(current_price * upper * n_properties, 2)
+    mean_return = round(current_price * mean * n_properties, 2)
+    lower_return = round(current_price * lower * n_properties, 2)
+    
+    # print the results
+    print(f'An initial investment of ${investment} in {name} would:\n')
+    print(f'\t Allow us to buy approximately {n_properties} properties.')
+    print(f'\t With a mean projected growth of {round((mean*100),1)}% over {steps} months we would net a ${mean_return} return')
+    print(f'\t or ${mean_return / n_properties} per property.\n')
+    print(f'\t With upper and lower growth rates at {round((upper*100),1)}% and {round((lower*100),1)}%,')
+    print(f'\t we can project a total return between ${lower_return} and ${upper_return}')
+
+
+# record every helper's calls while instrumentation is enabled
+instrument_module(globals())
@@ -0,0 +1,297 @@
+# import libraries
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+# the finest grain of the cube, besides the day
+CUBE_KEYS = ['Agency', 'Borough', 'Incident Zip', 'Complaint Type']
+
+# log spaced response time bins (in days) from one minute to 1000 days, used as a mergeable
+# quantile sketch: every bin spans about 11% so quantiles are within about 6% of the truth
+HIST_EDGES = np.geomspace(1 / 1440, 1000, 129)
+
+# additive measures of the cube and of the histogram
+CUBE_MEASURES = ['count', 'rt_count', 'rt_sum', 'rt_sumsq']
+HIST_MEASURES = ['n']
+
+
+##########################
+# CUBE BUILD FUNCTIONS #
+##########################
+
+def response_time(df, created='Created Date', closed='Closed Date'):
+    """returns the response time of each request in days (NaN while it is still open)"""
+    return (df[closed] - df[created]) / pd.Timedelta(days=1)
+
+
+def cube_cells(df, keys=CUBE_KEYS, date_col='Created Date'):
+    """takes cleaned 311 records and returns their aggregates at the finest grain (day x keys):
+       a cube with 'count', 'rt_count', 'rt_sum' and 'rt_sumsq' of the response time, and a
+       histogram with the number of response times in each HIST_EDGES bin for each cell"""
+
+    rt = response_time(df)
+    cells = pd.DataFrame({'date': df[date_col].dt.floor('D')})
+    for k in keys:
+        cells[k] = df[k].astype(str)
+    cells['count'] = 1
+    cells['rt_count'] = rt.notna().astype('int64')
+    cells['rt_sum'] = rt.fillna(0)
+    cells['rt_sumsq'] = rt.fillna(0) ** 2
+
+    # every additive measure of every cell in one grouped sum
+    group = ['date'] + keys
+    cube = cells.groupby(group, as_index=False, sort=False, dropna=False)[CUBE_MEASURES].sum()
+
+    # histogram bin counts of the response times that are known
+    known = rt.notna()
+    hist = cells.loc[known, group].assign(bin=np.searchsorted(HIST_EDGES, rt[known].to_numpy())
+                                          .astype('int16'), n=1)
+    hist = hist.groupby(group + ['bin'], as_index=False, sort=False, dropna=False)['n'].sum()
+
+    return cube, hist
+
+
+def _merge(frames, group, measures):
+    """adds up the measures of frames that share the 'group' columns. Returns an empty frame with
+       the group and measure columns when every frame is empty (ex. a month that only held open
+       requests) or there are none."""
+    nonempty = [f for f in frames if len(f)]
+    if not nonempty:
+        empty = frames[0].iloc[:0] if frames else pd.DataFrame(columns=group + measures)
+        return empty.astype({'date': 'datetime64[ns]'}) if 'date' in empty else empty
+    combined = pd.concat(nonempty, ignore_index=True)
+    return combined.groupby(group, as_index=False, sort=False, dropna=False).sum()
+
+
+def _month_paths(root, period):
+    """returns the cube and histogram files of one month"""
+    return (os.path.join(root, f'cube_{period}.parquet'),
+            os.path.join(root, f'hist_{period}.parquet'))
+
+
+def _empty_cells(keys=CUBE_KEYS):
+    """an empty cube and histogram with the columns cube_cells returns"""
+    dtypes = {'date': 'datetime64[ns]', **dict.fromkeys(keys, 'str')}
+    cube = pd.DataFrame(columns=['date'] + keys + CUBE_MEASURES).astype(
+        {**dtypes, 'count': 'int64', 'rt_count': 'int64', 'rt_sum': 'float64', 'rt_sumsq': 'float64'})
+    hist = pd.DataFrame(columns=['date'] + keys + ['bin'] + HIST_MEASURES).astype(
+        {**dtypes, 'bin': 'int16', 'n': 'int64'})
+    return cube, hist
+
+
+def _batch_key(df):
+    """hash of a batch of records, so the same batch is never added to a cube twice"""
+    hashed = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return hashlib.sha1(hashed.tobytes()).hexdigest()[:20]
+
+
+def update_cube(df, root, keys=CUBE_KEYS, date_col='Created Date', batch_key=None):
+    """takes cleaned 311 records (a whole frame, one chunk from stream_311_csv or the new day's
+       records) and adds them to the cube stored under 'root' (one cube and one histogram file per
+       month). Only the months present in the records are read and rewritten. Every applied batch
+       is recorded in 'root'/batches.json under 'batch_key' (default = a hash of the records), and
+       a batch that was already applied is skipped, so rerunning a day does not count it twice.
+       Records that overlap an earlier batch without being the same batch are still added; callers
+       must drop those themselves (as daily_update does). Returns True when the batch was added."""
+
+    os.makedirs(root, exist_ok=True)
+    batch_key = _batch_key(df) if batch_key is None else str(batch_key)
+    batches_path = os.path.join(root, 'batches.json')
+    batches = {}
+    if os.path.exists(batches_path):
+        with open(batches_path) as f:
+            batches = json.load(f)
+    if batch_key in batches:
+        return False
+
+    cube, hist = cube_cells(df, keys=keys, date_col=date_col)
+    group = ['date'] + keys
+
+    cube_months = cube['date'].dt.to_period('M')
+    hist_months = hist['date'].dt.to_period('M')
+    for period in cube_months.unique():
+        cube_path, hist_path = _month_paths(root, period)
+        new_cube = cube[cube_months == period]
+        new_hist = hist[hist_months == period]
+
+        # add to whatever this month already holds
+        if os.path.exists(cube_path):
+            new_cube = _merge([pd.read_parquet(cube_path), new_cube], group, CUBE_MEASURES)
+            new_hist = _merge([pd.read_parquet(hist_path), new_hist], group + ['bin'], HIST_MEASURES)
+        new_cube.to_parquet(cube_path, index=False)
+        new_hist.to_parquet(hist_path, index=False)
+
+    # recorded once every month is written, so a failed update is not marked as applied
+    batches[batch_key] = {'rows': len(df), 'applied': pd.Timestamp.now().isoformat(timespec='seconds')}
+    tmp_path = batches_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(batches, f, indent=1)
+    os.replace(tmp_path, batches_path)
+    return True
+
+
+def build_cube(chunks, root, keys=CUBE_KEYS, date_col='Created Date'):
+    """takes an iterable of cleaned 311 chunks (ex. stream_311_csv) and builds the cube under 'root'
+       from scratch. Chunk aggregates are merged in memory, which is much smaller than the records,
+       and written once per month."""
+
+    group = ['date'] + keys
+    cubes, hists = [], []
+    for chunk in chunks:
+        cube, hist = cube_cells(chunk, keys=keys, date_col=date_col)
+        cubes.append(cube)
+        hists.append(hist)
+
+    cube = _merge(cubes, group, CUBE_MEASURES)
+    hist = _merge(hists, group + ['bin'], HIST_MEASURES)
+
+    os.makedirs(root, exist_ok=True)
+    hist_months = hist['date'].dt.to_period('M')
+    for period, month_cube in cube.groupby(cube['date'].dt.to_period('M')):
+        cube_path, hist_path = _month_paths(root, period)
+        month_cube.to_parquet(cube_path, index=False)
+        hist[hist_months == period].to_parquet(hist_path, index=False)
+
+
+def load_cube(root, start=None, end=None, hist=False):
+    """takes the root of a cube and an optional 'start' and 'end' date and returns the cube cells
+       of the months in that range (and the histogram too, as a (cube, hist) pair, if 'hist').
+       Returns empty frames when no month is stored in the range."""
+
+    cubes, hists = [], []
+    for name in sorted(os.listdir(root)) if os.path.isdir(root) else []:
+        if not (name.startswith('cube_') and name.endswith('.parquet')):
+            continue
+        period = pd.Period(name[len('cube_'):-len('.parquet')], freq='M')
+        if start is not None and period.end_time < pd.Timestamp(start):
+            continue
+        if end is not None and period.start_time > pd.Timestamp(end):
+            continue
+        cube_path, hist_path = _month_paths(root, period)
+        cubes.append(pd.read_parquet(cube_path))
+        if hist:
+            hists.append(pd.read_parquet(hist_path))
+
+    if not cubes:
+        empty_cube, empty_hist = _empty_cells()
+        return (empty_cube, empty_hist) if hist else empty_cube
+
+    cube = pd.concat(cubes, ignore_index=True)
+    date_range = pd.Series(True, index=cube.index)
+    if start is not None:
+        date_range &= cube['date'] >= pd.Timestamp(start)
+    if end is not None:
+        date_range &= cube['date'] < pd.Timestamp(end)
+    cube = cube[date_range]
+
+    if not hist:
+        return cube
+
+    hist = pd.concat(hists, ignore_index=True)
+    hist = hist[(hist['date'] >= cube['date'].min()) & (hist['date'] <= cube['date'].max())]
+    return cube, hist
+
+
+##########################
+# CUBE ROLLUP FUNCTIONS #
+##########################
+
+def _group_keys(df, by, freq=None):
+    """returns groupby keys for 'by' columns, with 'date' binned to 'freq' when given"""
+    return [pd.Grouper(key='date', freq=freq) if col == 'date' and freq is not None else col
+            for col in by]
+
+
+def rollup(cube, by, freq=None, where=None):
+    """takes cube cells, the columns to roll up to (ex. ['date'] for city-wide daily volume,
+       ['date', 'Borough'] or ['Incident Zip']) and an optional 'freq' to coarsen 'date' (ex. 'MS'),
+       and returns the 'count', mean and standard deviation of response time for each group.
+       'where' is an optional dictionary of column: value (or list of values) filters."""
+
+    for col, value in (where or {}).items():
+        values = [value] if isinstance(value, str) else list(value)
+        cube = cube[cube[col].isin(values)]
+
+    sums = cube.groupby(_group_keys(cube, by, freq), dropna=False)[['count', 'rt_count', 'rt_sum', 'rt_sumsq']].sum()
+
+    # mean and sample standard deviation from the additive moments
+    n = sums['rt_count']
+    sums['rt_mean'] = sums['rt_sum'] / n
+    sums['rt_std'] = np.sqrt(((sums['rt_sumsq'] - n * sums['rt_mean'] ** 2) / (n - 1)).clip(lower=0))
+    return sums[['count', 'rt_count', 'rt_mean', 'rt_std']]
+
+
+def rollup_quantiles(hist, by, q=[.5, .9], freq=None):
+    """takes the cube histogram, the columns to roll up to and a list of quantiles and returns the
+       estimated response time quantiles (in days) for each group, by merging the histograms of
+       its cells and interpolating within the bin that holds each quantile"""
+
+    counts = (hist.groupby(_group_keys(hist, by, freq) + ['bin'], dropna=False)['n'].sum()
+                  .unstack('bin', fill_value=0)
+                  .reindex(columns=range(len(HIST_EDGES) + 1), fill_value=0))
+
+    # lower and upper edge of every bin (the outer bins are closed at the first/last edge)
+    lower = np.concatenate([[0], HIST_EDGES])
+    upper = np.concatenate([HIST_EDGES, [HIST_EDGES[-1]]])
+
+    cum = counts.to_numpy().cumsum(axis=1)
+    total = cum[:, -1:]
+    result = {}
+    for quantile in q:
+        target = quantile * total
+        b = (cum < target).sum(axis=1)
+        b = np.minimum(b, cum.shape[1] - 1)
+        before = np.where(b > 0, cum[np.arange(len(b)), b - 1], 0)
+        in_bin = counts.to_numpy()[np.arange(len(b)), b]
+        frac = np.divide(target[:, 0] - before, in_bin, out=np.zeros(len(b)), where=in_bin > 0)
+        result[f'rt_q{int(round(quantile * 100))}'] = lower[b] + frac * (upper[b] - lower[b])
+
+    return pd.DataFrame(result, index=counts.index)
+
+
+def top_by(cube, group='Incident Zip', item='Complaint Type', n=1, where=None):
+    """takes cube cells and returns the 'n' most frequent values of 'item' for every value of
+       'group' (ex. the top complaint type by zip) with their counts"""
+    counts = rollup(cube, [group, item], where=where)['count'].reset_index()
+    counts = counts.sort_values([group, 'count'], ascending=[True, False])
+    return counts.groupby(group, sort=False).head(n).reset_index(drop=True)
+
+
+def cube_series(cube, by=None, freq='D', measure='count', where=None):
+    """takes cube cells and returns 'measure' ('count', 'rt_mean' or 'rt_std') per period of 'freq'.
+       Without 'by' returns a single time series ready for SARIMA_modeler, otherwise a dictionary
+       like the one get_time_series returns, with each group as a key and a dataframe with a
+       'value' column as the value."""
+
+    by = [by] if isinstance(by, str) else (by or [])
+    rolled = rollup(cube, ['date'] + by, freq=freq, where=where)[measure]
+
+    if not by:
+        return rolled.asfreq(freq, fill_value=0 if measure == 'count' else np.nan).rename('value')
+
+    time_series_dict = {}
+    for key, ts in rolled.groupby(level=by):
+        ts = ts.droplevel(by).asfreq(freq, fill_value=0 if measure == 'count' else np.nan)
+        time_series_dict[key[0] if len(by) == 1 else key] = ts.to_frame('value')
+    return time_series_dict
+
+
+def cube_wide(cube, key='Incident Zip', freq='MS', measure='count', where=None):
+    """takes cube cells and returns a wide dataframe with one row per value of 'key' (in a
+       'city_zipcode' column) and one 'YYYY-MM' column per month, the layout get_time_series takes"""
+    rolled = rollup(cube, [key, 'date'], freq=freq, where=where)[measure].unstack('date', fill_value=0)
+    rolled.columns = rolled.columns.strftime('%Y-%m')
+    return rolled.rename_axis('city_zipcode').reset_index()
+
+
+def cube_group_summary(cube, group_col):
+    """takes cube cells and returns the size, mean and standard deviation of response time for each
+       value of 'group_col' in the layout pairwise_tests takes. Median based columns (Levene's test)
+       and Shapiro-Wilk p-values can not be recovered from the cube and are left as NaN."""
+    sums = rollup(cube, [group_col])
+    return pd.DataFrame({'n': sums['rt_count'], 'mean': sums['rt_mean'], 'std': sums['rt_std'],
+                         'dev_mean': np.nan, 'dev_ss': np.nan, 'shapiro_p': np.nan})
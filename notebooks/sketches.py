@@ -0,0 +1,215 @@
+# import libraries
+import copy
+
+import numpy as np
+import pandas as pd
+
+
+###########################
+# STREAMING MOMENT SKETCH #
+###########################
+
+class MomentSketch:
+    """running count, mean, variance, min and max of a stream of values (Welford's algorithm, with
+       Chan's formula to add a whole batch or merge another sketch at once). Holds no raw values."""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def _combine(self, n, mean, m2, lo, hi):
+        """folds in the moments of another batch of values"""
+        if n == 0:
+            return self
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta ** 2 * self.n * n / total
+        self.n = total
+        self.min = min(self.min, lo)
+        self.max = max(self.max, hi)
+        return self
+
+    def update(self, values):
+        """adds an array of values (NaN values are skipped)"""
+        values = np.asarray(values, dtype='float64')
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        mean = values.mean()
+        return self._combine(len(values), mean, ((values - mean) ** 2).sum(), values.min(), values.max())
+
+    def merge(self, other):
+        """adds the values summarized by another MomentSketch"""
+        return self._combine(other.n, other.mean, other.m2, other.min, other.max)
+
+    def variance(self, ddof=1):
+        return self.m2 / (self.n - ddof) if self.n > ddof else np.nan
+
+    def std(self, ddof=1):
+        return np.sqrt(self.variance(ddof=ddof))
+
+
+##############################
+# STREAMING QUANTILE SKETCH #
+##############################
+
+class TDigest:
+    """a merging t-digest: a mergeable summary of a stream of values as weighted centroids, dense
+       near the tails, so any percentile can be estimated without keeping the values. Memory is
+       about 'compression' centroids; larger values are more accurate."""
+
+    def __init__(self, compression=200, buffer_size=10000):
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+        self._buffer = []
+        self._buffered = 0
+
+    @property
+    def n(self):
+        self._flush()
+        return self.weights.sum()
+
+    def update(self, values):
+        """adds an array of values (NaN values are skipped). Values are buffered and compressed in
+           batches."""
+        values = np.asarray(values, dtype='float64')
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self._buffer.append(values)
+        self._buffered += len(values)
+        if self._buffered >= self.buffer_size:
+            self._flush()
+        return self
+
+    def merge(self, other):
+        """adds the values summarized by another TDigest"""
+        other._flush()
+        self._flush()
+        if len(other.weights) == 0:
+            return self
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(np.concatenate([self.means, other.means]),
+                       np.concatenate([self.weights, other.weights]))
+        return self
+
+    def _flush(self):
+        """compresses the buffered values into the centroids"""
+        if not self._buffer:
+            return
+        values = np.concatenate(self._buffer)
+        self._buffer, self._buffered = [], 0
+        self._compress(np.concatenate([self.means, values]),
+                       np.concatenate([self.weights, np.ones(len(values))]))
+
+    def _compress(self, means, weights):
+        """merges sorted centroids so that each new centroid covers at most one unit of the
+           arcsine scale function, done for all centroids at once with bincount"""
+        order = np.argsort(means, kind='mergesort')
+        means, weights = means[order], weights[order]
+
+        # quantile at the middle of each centroid, mapped to the scale function
+        total = weights.sum()
+        q_mid = (np.cumsum(weights) - weights / 2) / total
+        k = self.compression / np.pi * np.arcsin(2 * q_mid - 1)
+        group = np.floor(k - k.min()).astype('int64')
+
+        # weighted mean of every group of centroids
+        new_weights = np.bincount(group, weights=weights)
+        new_means = np.bincount(group, weights=means * weights)
+        keep = new_weights > 0
+        self.weights = new_weights[keep]
+        self.means = new_means[keep] / self.weights
+
+    def quantile(self, q):
+        """returns the estimated value at quantile(s) 'q' (between 0 and 1)"""
+        self._flush()
+        q = np.asarray(q, dtype='float64')
+        if len(self.weights) == 0:
+            return np.full(q.shape, np.nan)
+
+        # interpolate between centroid midpoints, pinned to the exact min and max at the ends
+        total = self.weights.sum()
+        positions = np.concatenate([[0], np.cumsum(self.weights) - self.weights / 2, [total]])
+        values = np.concatenate([[self.min], self.means, [self.max]])
+        return np.interp(q * total, positions, values)
+
+
+##################################
+# RESPONSE TIME SUMMARY FUNCTIONS #
+##################################
+
+class StreamSummary:
+    """moments and quantile sketch of one stream of values, updated per chunk and mergeable across
+       workers or partitions"""
+
+    def __init__(self, compression=200):
+        self.moments = MomentSketch()
+        self.digest = TDigest(compression=compression)
+
+    def update(self, values):
+        self.moments.update(values)
+        self.digest.update(values)
+        return self
+
+    def merge(self, other):
+        self.moments.merge(other.moments)
+        self.digest.merge(other.digest)
+        return self
+
+    def stats(self, q=[.5, .9]):
+        """returns a dictionary with n, mean, std, min, max and each quantile in 'q'"""
+        row = {'n': self.moments.n, 'mean': self.moments.mean if self.moments.n else np.nan,
+               'std': self.moments.std(), 'min': self.moments.min, 'max': self.moments.max}
+        for quantile, value in zip(q, self.digest.quantile(q)):
+            row[f'q{int(round(quantile * 100))}'] = value
+        return row
+
+
+def update_summaries(summaries, df, by, value_col, compression=200):
+    """takes a dictionary of StreamSummary objects keyed by slice, a chunk of records, the columns
+       that define a slice (ex. ['Borough', 'Complaint Type'], or [] for one overall summary) and the
+       column to summarize (ex. 'response_time'), and adds the chunk's values to each slice's summary.
+       Returns the dictionary, which can be kept across chunks."""
+
+    by = [by] if isinstance(by, str) else list(by)
+    groups = df.groupby(by, observed=True)[value_col] if by else [((), df[value_col])]
+
+    for key, values in groups:
+        key = key[0] if isinstance(key, tuple) and len(key) == 1 else key
+        if key not in summaries:
+            summaries[key] = StreamSummary(compression=compression)
+        summaries[key].update(values.to_numpy())
+
+    return summaries
+
+
+def merge_summaries(*summary_dicts):
+    """takes dictionaries of StreamSummary objects (ex. one from each worker or partition) and
+       returns one dictionary with the summaries of matching slices merged. The inputs are left
+       unchanged; every slice's summary is a copy of its first one, merged with the rest."""
+    merged = {}
+    for summaries in summary_dicts:
+        for key, summary in summaries.items():
+            if key in merged:
+                merged[key].merge(summary)
+            else:
+                merged[key] = copy.deepcopy(summary)
+    return merged
+
+
+def summary_stats(summaries, q=[.5, .9]):
+    """takes a dictionary of StreamSummary objects and returns a dataframe with the n, mean, std,
+       min, max and quantiles 'q' of every slice"""
+    return pd.DataFrame({key: s.stats(q=q) for key, s in summaries.items()}).T
@@ -0,0 +1,183 @@
+# import libraries
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from nyc311.cleaning import DATE_FORMAT
+from zip_geocoder import ZCTA_PATH
+
+
+AGENCIES = ['NYPD', 'HPD', 'DSNY', 'DOT', 'DEP', 'DPR']
+
+# a few real complaint types per agency; the rest of the 162 are numbered
+_KNOWN_TYPES = {'NYPD': ['Noise - Residential', 'Illegal Parking', 'Blocked Driveway', 'Noise - Street/Sidewalk'],
+                'HPD': ['HEAT/HOT WATER', 'PLUMBING', 'UNSANITARY CONDITION', 'PAINT/PLASTER'],
+                'DSNY': ['Missed Collection', 'Dirty Conditions', 'Derelict Vehicles'],
+                'DOT': ['Street Condition', 'Street Light Condition', 'Traffic Signal Condition'],
+                'DEP': ['Water System', 'Sewer', 'Noise'],
+                'DPR': ['Damaged Tree', 'Overgrown Tree/Branches', 'New Tree Request']}
+
+# median response time (days) of each agency
+_AGENCY_RESPONSE = {'NYPD': .15, 'HPD': 5, 'DSNY': 2, 'DOT': 4, 'DEP': 3, 'DPR': 20}
+
+_BOROUGH_PREFIXES = [('100', 'MANHATTAN'), ('101', 'MANHATTAN'), ('102', 'MANHATTAN'), ('103', 'STATEN ISLAND'),
+                     ('104', 'BRONX'), ('112', 'BROOKLYN'), ('11', 'QUEENS')]
+
+# NYC bounds, for synthetic coordinates when the ZCTA polygons are not available
+_NYC_BOUNDS = (-74.26, 40.49, -73.70, 40.92)
+
+
+#############################
+# GENERATOR SETUP FUNCTIONS #
+#############################
+
+def complaint_types(n_types=162, agencies=AGENCIES, seed=0):
+    """returns a dataframe of 'n_types' complaint types with their 'Agency', a Zipf-like share of
+       all requests ('weight'), a seasonal amplitude and the day of the year they peak"""
+    rng = np.random.default_rng(seed)
+    names, owners = [], []
+    for i in range(n_types):
+        agency = agencies[i % len(agencies)]
+        known = _KNOWN_TYPES.get(agency, [])
+        k = i // len(agencies)
+        names.append(known[k] if k < len(known) else f'{agency} Complaint {k:03d}')
+        owners.append(agency)
+
+    types = pd.DataFrame({'Complaint Type': names, 'Agency': owners})
+    types['weight'] = 1 / np.arange(1, n_types + 1) ** 1.1
+    types['weight'] /= types['weight'].sum()
+    types['amplitude'] = rng.uniform(.05, .6, n_types)
+    types['peak_day'] = rng.integers(0, 365, n_types)
+
+    # heat complaints peak in winter
+    types.loc[types['Complaint Type'] == 'HEAT/HOT WATER', ['amplitude', 'peak_day']] = [.9, 15]
+    return types
+
+
+def _borough(zip_code):
+    return next((borough for prefix, borough in _BOROUGH_PREFIXES if zip_code.startswith(prefix)),
+                'Unspecified')
+
+
+def zip_points(n_zips=184, points_per_zip=64, path=ZCTA_PATH, seed=0):
+    """returns a dataframe of 'n_zips' zips with their 'Borough', a share of requests ('weight')
+       and 'points_per_zip' candidate coordinates inside each zip (from the ZCTA polygons when
+       they and shapely are available, otherwise spread over the NYC bounds)"""
+    rng = np.random.default_rng(seed)
+    try:
+        import shapely
+        with open(path) as f:
+            features = json.load(f)['features']
+        boroughs = {f['properties']['postalcode']: f['properties'].get('borough') for f in features}
+        features = {f['properties']['postalcode']: f['geometry'] for f in features}
+    except (ImportError, OSError):
+        features = None
+
+    if features:
+        zips = sorted(rng.choice(sorted(features), size=min(n_zips, len(features)), replace=False))
+        lons, lats = [], []
+        for z in zips:
+            # rejection sample points inside the polygon
+            geom = shapely.from_geojson(json.dumps(features[z]))
+            minx, miny, maxx, maxy = geom.bounds
+            found = np.empty((0, 2))
+            while len(found) < points_per_zip:
+                xy = rng.uniform([minx, miny], [maxx, maxy], size=(points_per_zip * 4, 2))
+                found = np.vstack([found, xy[shapely.contains_xy(geom, xy[:, 0], xy[:, 1])]])
+            lons.append(found[:points_per_zip, 0])
+            lats.append(found[:points_per_zip, 1])
+        boroughs = [(boroughs[z] or _borough(z)).upper() for z in zips]
+    else:
+        zips = [str(z) for z in rng.choice(np.arange(10001, 11698), size=n_zips, replace=False)]
+        minx, miny, maxx, maxy = _NYC_BOUNDS
+        lons = list(rng.uniform(minx, maxx, (n_zips, points_per_zip)))
+        lats = list(rng.uniform(miny, maxy, (n_zips, points_per_zip)))
+        boroughs = [_borough(z) for z in zips]
+
+    weight = rng.lognormal(0, .7, len(zips))
+    return pd.DataFrame({'Incident Zip': zips, 'Borough': boroughs,
+                         'weight': weight / weight.sum(), 'lons': lons, 'lats': lats})
+
+
+##############################
+# RECORD GENERATOR FUNCTIONS #
+##############################
+
+def generate_311(n_rows=1000000, start='2015-01-01', end='2019-12-31', n_types=162, n_zips=184,
+                 missing_zip_rate=.03, open_rate=.05, seed=0, types=None, zips=None):
+    """returns 'n_rows' synthetic 311 records between 'start' and 'end' shaped like the cleaned
+       export (datetime 'Created Date' and 'Closed Date', categorical 'Agency', 'Complaint Type',
+       'Borough' and 'Incident Zip', 'Latitude', 'Longitude' and 'Status'). Complaint types and zips
+       follow skewed popularity, volume has a slow trend, a weekly cycle and per complaint type
+       yearly seasonality, and response times are lognormal around each agency's median.
+       'missing_zip_rate' of the zips are blank and 'open_rate' of the requests are still open."""
+    rng = np.random.default_rng(seed)
+    types = complaint_types(n_types, seed=seed) if types is None else types
+    zips = zip_points(n_zips, seed=seed) if zips is None else zips
+
+    days = pd.date_range(start, end, freq='D')
+    day_of_year = days.dayofyear.to_numpy()
+    trend = np.linspace(1, 1.3, len(days))
+    weekday = np.array([1.1, 1.05, 1.0, 1.0, .95, .8, .75])[days.dayofweek]
+
+    # complaint type per row, then the day from that type's seasonal profile
+    type_idx = rng.choice(len(types), size=n_rows, p=types['weight'].to_numpy())
+    day_idx = np.empty(n_rows, dtype='int64')
+    for t, rows in pd.Series(np.arange(n_rows)).groupby(type_idx):
+        season = 1 + types['amplitude'].iat[t] * np.cos(2 * np.pi * (day_of_year - types['peak_day'].iat[t]) / 365.25)
+        profile = trend * weekday * season
+        day_idx[rows.to_numpy()] = rng.choice(len(days), size=len(rows), p=profile / profile.sum())
+
+    created = (days.to_numpy()[day_idx]
+               + rng.integers(0, 86400, n_rows).astype('timedelta64[s]')).astype('datetime64[s]')
+
+    # response time in days, lognormal around the agency's median
+    agencies = types['Agency'].to_numpy()[type_idx]
+    medians = pd.Series(_AGENCY_RESPONSE).reindex(agencies).fillna(2).to_numpy()
+    response = medians * rng.lognormal(0, 1, n_rows)
+    closed = created + (response * 86400).astype('timedelta64[s]')
+    still_open = rng.random(n_rows) < open_rate
+    closed[still_open] = np.datetime64('NaT')
+
+    # zip and a point inside it
+    zip_idx = rng.choice(len(zips), size=n_rows, p=zips['weight'].to_numpy())
+    point_idx = rng.integers(0, len(zips['lons'].iat[0]), n_rows)
+    lons = np.stack(zips['lons'].to_numpy())[zip_idx, point_idx] + rng.normal(0, 1e-5, n_rows)
+    lats = np.stack(zips['lats'].to_numpy())[zip_idx, point_idx] + rng.normal(0, 1e-5, n_rows)
+
+    zip_codes = pd.Categorical.from_codes(zip_idx, categories=zips['Incident Zip'])
+    zip_codes[rng.random(n_rows) < missing_zip_rate] = np.nan
+
+    df = pd.DataFrame({'Unique Key': np.arange(n_rows, dtype='int64') + 10 ** 7,
+                       'Created Date': created,
+                       'Closed Date': closed,
+                       'Agency': pd.Categorical(agencies, categories=AGENCIES),
+                       'Complaint Type': pd.Categorical.from_codes(type_idx, categories=types['Complaint Type']),
+                       'Incident Zip': zip_codes,
+                       'Borough': pd.Categorical(zips['Borough'].to_numpy()[zip_idx]),
+                       'Latitude': lats,
+                       'Longitude': lons,
+                       'Status': np.where(still_open, 'Open', 'Closed')})
+    return df.sort_values('Created Date', kind='stable').reset_index(drop=True)
+
+
+def write_311_csv(path, n_rows=1000000, chunksize=1000000, seed=0, **kwargs):
+    """writes 'n_rows' synthetic records to 'path' as a csv in the raw export format (dates as
+       DATE_FORMAT text), generated 'chunksize' rows at a time so memory stays flat at any scale.
+       Takes the generate_311 keyword arguments. Returns the path."""
+    types = complaint_types(kwargs.pop('n_types', 162), seed=seed)
+    zips = zip_points(kwargs.pop('n_zips', 184), seed=seed)
+    seeds = np.random.SeedSequence(seed).spawn(int(np.ceil(n_rows / chunksize)))
+
+    if os.path.exists(path):
+        os.remove(path)
+    for i, chunk_seed in enumerate(seeds):
+        size = min(chunksize, n_rows - i * chunksize)
+        chunk = generate_311(size, seed=chunk_seed, types=types, zips=zips, **kwargs)
+        chunk['Unique Key'] += i * chunksize
+        for col in ['Created Date', 'Closed Date']:
+            chunk[col] = chunk[col].dt.strftime(DATE_FORMAT)
+        chunk.to_csv(path, mode='a', header=(i == 0), index=False)
+    return path
@@ -0,0 +1,191 @@
+# import libraries
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+
+
+# ZCTA polygons shipped with the project
+ZCTA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data',
+                         'nyc_zip_code_tabulation_areas_polygons.geojson')
+
+
+def require_shapely():
+    """imports shapely 2 (needed for the spatial index and the map tiles) on first use and returns it"""
+    try:
+        import shapely
+    except ImportError as e:
+        raise ImportError('zip geocoding and map tiles need shapely 2: pip install "shapely>=2"') from e
+    return shapely
+
+
+class ZCTAIndex:
+    """the ZCTA polygons with a grid index over them, for assigning zip codes to points. Each cell
+       of a 'grid_size' x 'grid_size' grid over the polygons' bounds knows either the one polygon
+       that covers it completely or the polygons that cross it (found with an STRtree), so most
+       points are assigned by arithmetic alone and the rest need only a few point in polygon tests."""
+
+    def __init__(self, zips, geoms, grid_size=512, grid=None):
+        shapely = require_shapely()
+        self.zips = np.asarray(zips, dtype=object)
+        self.geoms = geoms
+
+        # prepared geometries make each point in polygon test much cheaper
+        shapely.prepare(self.geoms)
+        self.grid = self._build_grid(grid_size) if grid is None else grid
+
+    def _build_grid(self, grid_size):
+        """returns the grid: its bounds and, per cell, the polygon covering it (or -1) and the
+           polygons crossing it in compressed (pointer, index) form"""
+        shapely = require_shapely()
+        tree = shapely.STRtree(self.geoms)
+        minx, miny, maxx, maxy = shapely.total_bounds(self.geoms)
+        xs = np.linspace(minx, maxx, grid_size + 1)
+        ys = np.linspace(miny, maxy, grid_size + 1)
+
+        # one box per cell, numbered row by row
+        ix, iy = np.meshgrid(np.arange(grid_size), np.arange(grid_size))
+        ix, iy = ix.ravel(), iy.ravel()
+        boxes = shapely.box(xs[ix], ys[iy], xs[ix + 1], ys[iy + 1])
+
+        # cells that lie completely inside one polygon
+        full = np.full(len(boxes), -1, dtype='int32')
+        cell_idx, geom_idx = tree.query(boxes, predicate='within')
+        full[cell_idx] = geom_idx
+
+        # the remaining cells keep the list of polygons that cross them
+        cell_idx, geom_idx = tree.query(boxes, predicate='intersects')
+        keep = full[cell_idx] < 0
+        cell_idx, geom_idx = cell_idx[keep], geom_idx[keep]
+        order = np.argsort(cell_idx, kind='stable')
+        counts = np.bincount(cell_idx, minlength=len(boxes))
+
+        return {'bounds': (minx, miny, maxx, maxy), 'size': grid_size, 'full': full,
+                'ptr': np.concatenate([[0], np.cumsum(counts)]).astype('int64'),
+                'candidates': geom_idx[order].astype('int32')}
+
+    def assign_index(self, lon, lat):
+        """takes arrays of longitude and latitude and returns the index of the polygon containing
+           each point (-1 for points outside every polygon or with missing coordinates)"""
+        shapely = require_shapely()
+        grid = self.grid
+        minx, miny, maxx, maxy = grid['bounds']
+        size = grid['size']
+        lon = np.asarray(lon, dtype='float64')
+        lat = np.asarray(lat, dtype='float64')
+        result = np.full(len(lon), -1, dtype='int32')
+
+        # find every point's cell with arithmetic
+        with np.errstate(invalid='ignore'):
+            cx = np.floor((lon - minx) / (maxx - minx) * size)
+            cy = np.floor((lat - miny) / (maxy - miny) * size)
+        inside = (cx >= 0) & (cx <= size) & (cy >= 0) & (cy <= size)
+        points = np.flatnonzero(inside)
+        cells = (np.minimum(cy[points], size - 1) * size + np.minimum(cx[points], size - 1)).astype('int64')
+
+        # points in cells covered by one polygon need no test
+        full = grid['full'][cells]
+        result[points[full >= 0]] = full[full >= 0]
+
+        # test the other points against each polygon crossing their cell
+        points, cells = points[full < 0], cells[full < 0]
+        starts, counts = grid['ptr'][cells], np.diff(grid['ptr'])[cells]
+        point_rep = np.repeat(np.arange(len(points)), counts)
+        offsets = np.arange(len(point_rep)) - np.repeat(np.cumsum(counts) - counts, counts)
+        geom_idx = grid['candidates'][np.repeat(starts, counts) + offsets]
+        hit = shapely.contains_xy(self.geoms[geom_idx], lon[points[point_rep]], lat[points[point_rep]])
+
+        # a point on a shared border keeps the first polygon it falls in
+        hit_points, first = np.unique(point_rep[hit], return_index=True)
+        result[points[hit_points]] = geom_idx[hit][first]
+
+        return result
+
+    def assign(self, lon, lat, batch_size=1000000):
+        """takes arrays of longitude and latitude and returns an array with the ZCTA containing each
+           point (None for points outside every ZCTA or with missing coordinates), processed in
+           vectorized batches of 'batch_size' points"""
+        lon = np.asarray(lon, dtype='float64')
+        lat = np.asarray(lat, dtype='float64')
+        result = np.full(len(lon), None, dtype=object)
+
+        for start in range(0, len(lon), batch_size):
+            idx = self.assign_index(lon[start:start + batch_size], lat[start:start + batch_size])
+            found = np.flatnonzero(idx >= 0)
+            result[start + found] = self.zips[idx[found]]
+
+        return result
+
+
+def _read_zcta_geojson(path):
+    """reads the zip codes and polygons from the ZCTA GeoJSON"""
+    shapely = require_shapely()
+    with open(path) as f:
+        features = json.load(f)['features']
+    zips = [feature['properties']['postalcode'] for feature in features]
+    geoms = shapely.from_geojson([json.dumps(feature['geometry']) for feature in features])
+    return zips, geoms
+
+
+def load_zcta_index(path=ZCTA_PATH, cache_path=None, grid_size=512):
+    """takes the path to the ZCTA GeoJSON and returns a ZCTAIndex. The parsed polygons (as WKB) and
+       the grid index are cached in 'cache_path' (default = the GeoJSON path + '.index.pkl') and
+       reused while the GeoJSON and grid size are unchanged, so later runs start without parsing
+       the GeoJSON or building the grid."""
+    shapely = require_shapely()
+    cache_path = path + '.index.pkl' if cache_path is None else cache_path
+    mtime = os.path.getmtime(path)
+
+    # reuse the cache when it was built from this version of the GeoJSON
+    if os.path.exists(cache_path):
+        with open(cache_path, 'rb') as f:
+            cached = pickle.load(f)
+        if cached['mtime'] == mtime and cached['grid']['size'] == grid_size:
+            return ZCTAIndex(cached['zips'], shapely.from_wkb(cached['wkb']), grid=cached['grid'])
+
+    zips, geoms = _read_zcta_geojson(path)
+    index = ZCTAIndex(zips, geoms, grid_size=grid_size)
+    try:
+        with open(cache_path, 'wb') as f:
+            pickle.dump({'mtime': mtime, 'zips': zips, 'wkb': shapely.to_wkb(geoms),
+                         'grid': index.grid}, f)
+    except OSError:
+        # a read only data directory just means no cache
+        pass
+
+    return index
+
+
+def fill_missing_zips(df, index=None, zip_col='Incident Zip', lat_col='Latitude',
+                      lon_col='Longitude', show=True):
+    """takes 311 records and replaces each missing or invalid zip (one that is not a ZCTA) with the
+       ZCTA its latitude and longitude fall in, in place. Returns the dataframe and the number of
+       zips recovered. 'show' prints the count and points per second."""
+
+    index = load_zcta_index() if index is None else index
+    valid_zips = set(index.zips)
+
+    # only geocode rows whose zip can not be matched to a ZCTA
+    zips = df[zip_col].astype(object)
+    needs_zip = ~zips.isin(valid_zips).to_numpy()
+    rows = np.flatnonzero(needs_zip)
+
+    start = time.perf_counter()
+    assigned = index.assign(pd.to_numeric(df[lon_col], errors='coerce').to_numpy(dtype='float64')[rows],
+                            pd.to_numeric(df[lat_col], errors='coerce').to_numpy(dtype='float64')[rows])
+    elapsed = time.perf_counter() - start
+
+    found = pd.notna(assigned)
+    zips.iloc[rows[found]] = assigned[found]
+    was_category = isinstance(df[zip_col].dtype, pd.CategoricalDtype)
+    df[zip_col] = zips.astype('category') if was_category else zips
+
+    if show == True:
+        rate = len(rows) / elapsed if elapsed > 0 else np.nan
+        print(f'Recovered {int(found.sum())} of {len(rows)} missing zips '
+              f'({round(rate):,} points per second)')
+
+    return df, int(found.sum())